@@ -1,9 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy import func, and_, case, select
 from datetime import datetime, timedelta
 from typing import Dict, Any
+import importlib.util
+import analytics_cache
+import columnar
+import exports
 import models
+import payroll
+import rollup
+import timeseries
 from database import SessionLocal
 
 router = APIRouter()
@@ -15,30 +22,151 @@ def get_db():
     finally:
         db.close()
 
-@router.get("/analytics/overview")
-def get_analytics_overview(db: Session = Depends(get_db)) -> Dict[str, Any]:
-    total_salons = db.query(models.Salon).count()
-    total_masters = db.query(models.Master).count()
-    total_clients = db.query(models.Client).count()
-    total_appointments = db.query(models.Appointment).count()
+def parse_range(start_date: str = None, end_date: str = None, detail="start_date and end_date must be ISO dates"):
+    """Даты из параметров запроса; неверный формат — 400, а не 500."""
+    try:
+        start_dt = datetime.fromisoformat(start_date) if start_date else None
+        end_dt = datetime.fromisoformat(end_date) if end_date else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail=detail)
+    return start_dt, end_dt
+
+DASHBOARD_SECTIONS = ("overview", "financial", "revenue_by_salon", "revenue_by_service", "master_earnings")
+
+def _aggregate(db: Session, group_by, start_dt=None, end_dt=None, statuses=None):
+    # ANALYTICS_ENGINE=columnar — из массивов в памяти вместо rollup
+    if columnar.ENABLED:
+        return columnar.aggregate(db, group_by, start_dt, end_dt, statuses)
+    return rollup.aggregate(db, group_by, start_dt, end_dt, statuses=statuses)
+
+def _total(db: Session, start_dt=None, end_dt=None, statuses=None):
+    """(count, revenue) без группировки — тем же движком, что и _aggregate."""
+    count, revenue = _aggregate(db, (), start_dt, end_dt, statuses).get((), (0, 0.0))
+    return count, revenue
+
+def _payroll_totals(db: Session, start_dt=None, end_dt=None):
+    if columnar.ENABLED:
+        return columnar.payroll_totals(db, start_dt, end_dt)
+    return payroll.totals(db, start_dt, end_dt)
+
+def _confirmed(db: Session, group_by, start_dt=None, end_dt=None):
+    return _aggregate(db, group_by, start_dt, end_dt, statuses=("confirmed",))
+
+def _project(breakdown, index, status="confirmed"):
+    """Сворачивает разбивку (salon_id, service, status) до одного измерения."""
+    totals = {}
+    for key, (count, revenue) in breakdown.items():
+        if key[-1] != status:
+            continue
+        entry = totals.setdefault((key[index],), [0, 0.0])
+        entry[0] += count
+        entry[1] += revenue
+    return totals
+
+def _financial(by_status):
+    total_appointments, total_revenue = by_status.get(("confirmed",), (0, 0.0))
+    cancelled_count, cancelled_revenue = by_status.get(("cancelled",), (0, 0.0))
+    avg_check = total_revenue / total_appointments if total_appointments else 0
     
-    thirty_days_ago = datetime.now() - timedelta(days=30)
-    recent_appointments = db.query(models.Appointment).filter(
-        models.Appointment.start_time >= thirty_days_ago
-    ).count()
+    return {
+        "total_revenue": round(total_revenue, 2),
+        "total_appointments": total_appointments,
+        "average_check": round(avg_check, 2),
+        "cancelled_count": cancelled_count,
+        "cancelled_revenue": round(cancelled_revenue, 2)
+    }
+
+def _money(value, rounded=True):
+    return round(value or 0, 2) if rounded else value or 0
+
+def _revenue_by_salon(db: Session, totals, rounded=True):
+    salon_names = dict(db.query(models.Salon.id, models.Salon.name).filter(
+        models.Salon.id.in_([salon_id for (salon_id,) in totals])
+    ).all())
+    
+    return [
+        {
+            "salon_name": salon_names[salon_id],
+            "revenue": _money(revenue, rounded),
+            "appointments_count": count
+        }
+        for (salon_id,), (count, revenue) in sorted(totals.items())
+        if salon_id in salon_names
+    ]
+
+def _revenue_by_service(totals, rounded=True):
+    return [
+        {
+            "service": service,
+            "revenue": _money(revenue, rounded),
+            "count": count
+        }
+        for (service,), (count, revenue) in sorted(
+            totals.items(), key=lambda item: item[1][1], reverse=True
+        )
+    ]
+
+def _master_earnings(db: Session, totals, rounded=True):
+    """Строки зарплаты из payroll.totals: часы по фактической длительности записей."""
+    masters = {
+        master_id: (name, hourly_rate, salon_name)
+        for master_id, name, hourly_rate, salon_name in db.query(
+            models.Master.id,
+            models.Master.name,
+            models.Master.hourly_rate,
+            models.Salon.name
+        ).join(
+            models.Salon, models.Master.salon_id == models.Salon.id
+        ).filter(
+            models.Master.id.in_(list(totals))
+        ).all()
+    }
     
-    upcoming_appointments = db.query(models.Appointment).filter(
-        models.Appointment.start_time > datetime.now()
-    ).count()
+    result = []
+    for master_id, (appointments_count, minutes, total_revenue, earnings) in sorted(
+        totals.items(), key=lambda item: item[1][2], reverse=True
+    ):
+        if master_id not in masters:
+            continue
+        name, hourly_rate, salon_name = masters[master_id]
+        result.append({
+            "master_id": master_id,
+            "master_name": name,
+            "salon_name": salon_name,
+            "hourly_rate": hourly_rate,
+            "appointments_count": appointments_count,
+            "worked_hours": _money(minutes / 60, rounded),
+            "total_revenue": _money(total_revenue, rounded),
+            "master_earnings": _money(earnings, rounded)
+        })
     
-    today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return result
+
+def _overview(db: Session):
+    now = datetime.now()
+    thirty_days_ago = now - timedelta(days=30)
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
     today_end = today_start + timedelta(days=1)
-    today_appointments = db.query(models.Appointment).filter(
-        and_(
-            models.Appointment.start_time >= today_start,
-            models.Appointment.start_time < today_end
-        )
-    ).count()
+    start_time = models.Appointment.start_time
+    
+    # Один запрос: счетчики справочников подзапросами, записи — условной агрегацией
+    (
+        total_salons,
+        total_masters,
+        total_clients,
+        total_appointments,
+        recent_appointments,
+        upcoming_appointments,
+        today_appointments
+    ) = db.query(
+        select(func.count(models.Salon.id)).scalar_subquery(),
+        select(func.count(models.Master.id)).scalar_subquery(),
+        select(func.count(models.Client.id)).scalar_subquery(),
+        func.count(models.Appointment.id),
+        func.count(case((start_time >= thirty_days_ago, models.Appointment.id))),
+        func.count(case((start_time > now, models.Appointment.id))),
+        func.count(case((and_(start_time >= today_start, start_time < today_end), models.Appointment.id)))
+    ).select_from(models.Appointment).one()
     
     return {
         "total_salons": total_salons,
@@ -50,6 +178,53 @@ def get_analytics_overview(db: Session = Depends(get_db)) -> Dict[str, Any]:
         "today_appointments": today_appointments
     }
 
+@router.get("/analytics/overview")
+def get_analytics_overview(db: Session = Depends(get_db)) -> Dict[str, Any]:
+    return _overview(db)
+
+def _dashboard_sections(db: Session, sections, start_dt=None, end_dt=None):
+    # Один проход по периоду: разрезы выручки собираются из общей разбивки, зарплата — из payroll
+    breakdown = _aggregate(
+        db, ("salon_id", "service", "status"), start_dt, end_dt,
+        statuses=("confirmed", "cancelled")
+    )
+    result = {}
+    if "financial" in sections:
+        by_status = {}
+        for key, (count, revenue) in breakdown.items():
+            entry = by_status.setdefault((key[-1],), [0, 0.0])
+            entry[0] += count
+            entry[1] += revenue
+        result["financial"] = _financial(by_status)
+    if "revenue_by_salon" in sections:
+        result["revenue_by_salon"] = _revenue_by_salon(db, _project(breakdown, 0))
+    if "revenue_by_service" in sections:
+        result["revenue_by_service"] = _revenue_by_service(_project(breakdown, 1))
+    if "master_earnings" in sections:
+        result["master_earnings"] = _master_earnings(db, _payroll_totals(db, start_dt, end_dt))
+    return result
+
+@router.get("/analytics/dashboard")
+def get_dashboard(start_date: str = None, end_date: str = None, sections: str = None, db: Session = Depends(get_db)) -> Dict[str, Any]:
+    requested = [name.strip() for name in sections.split(",") if name.strip()] if sections else list(DASHBOARD_SECTIONS)
+    unknown = [name for name in requested if name not in DASHBOARD_SECTIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown sections: {', '.join(unknown)}")
+    
+    result = {}
+    if "overview" in requested:
+        result["overview"] = _overview(db)
+    
+    range_sections = tuple(name for name in DASHBOARD_SECTIONS if name != "overview" and name in requested)
+    if range_sections:
+        start_dt, end_dt = parse_range(start_date, end_date)
+        result.update(analytics_cache.cached(
+            "dashboard", start_dt, end_dt,
+            lambda: _dashboard_sections(db, range_sections, start_dt, end_dt), range_sections
+        ))
+    
+    return result
+
 @router.get("/analytics/popular-services")
 def get_popular_services(db: Session = Depends(get_db)):
     services_stats = db.query(
@@ -133,25 +308,27 @@ def get_peak_hours(db: Session = Depends(get_db)):
 def get_appointments_by_day(days: int = 30, db: Session = Depends(get_db)):
     start_date = datetime.now() - timedelta(days=days)
     
-    appointments_by_day = db.query(
-        func.date(models.Appointment.start_time).label('date'),
-        func.count(models.Appointment.id).label('count')
-    ).filter(
-        models.Appointment.start_time >= start_date
-    ).group_by(
-        func.date(models.Appointment.start_time)
-    ).order_by(
-        func.date(models.Appointment.start_time)
-    ).all()
+    appointments_by_day = timeseries.series(db, "day", start_date, None)
     
     return [
         {
-            "date": str(date),
-            "count": count
+            "date": str(day),
+            "count": groups[None][0]
         }
-        for date, count in appointments_by_day
+        for day, groups in sorted(appointments_by_day.items())
     ]
 
+@router.get("/analytics/timeseries")
+def get_timeseries(granularity: str = "day", metric: str = "count", group_by: str = None,
+                   start_date: str = None, end_date: str = None, salon_id: int = None,
+                   db: Session = Depends(get_db)):
+    start_dt, end_dt = parse_range(start_date, end_date)
+    compute = lambda: timeseries.timeseries(db, granularity, metric, start_dt, end_dt, group_by, salon_id)
+    # Без end_date период отсчитывается от текущего момента — такой ответ не кэшируем
+    if end_dt is None:
+        return compute()
+    return analytics_cache.cached("timeseries", start_dt, end_dt, compute, granularity, metric, group_by, salon_id)
+
 @router.get("/analytics/financial-overview")
 def get_financial_overview(db: Session = Depends(get_db)):
     today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
@@ -159,41 +336,20 @@ def get_financial_overview(db: Session = Depends(get_db)):
     month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
     
     # Выручка за сегодня
-    today_revenue = db.query(func.sum(models.Appointment.price)).filter(
-        and_(
-            models.Appointment.start_time >= today_start,
-            models.Appointment.start_time < today_end,
-            models.Appointment.status == "confirmed"
-        )
-    ).scalar() or 0
+    _, today_revenue = _total(
+        db, today_start, today_end - timedelta(microseconds=1), statuses=("confirmed",)
+    )
     
     # Выручка за месяц
-    month_revenue = db.query(func.sum(models.Appointment.price)).filter(
-        and_(
-            models.Appointment.start_time >= month_start,
-            models.Appointment.status == "confirmed"
-        )
-    ).scalar() or 0
-    
-    # Общая выручка
-    total_revenue = db.query(func.sum(models.Appointment.price)).filter(
-        models.Appointment.status == "confirmed"
-    ).scalar() or 0
+    _, month_revenue = _total(db, month_start, statuses=("confirmed",))
     
-    # Количество отмененных записей
-    cancelled_count = db.query(models.Appointment).filter(
-        models.Appointment.status == "cancelled"
-    ).count()
-    
-    # Потерянная выручка от отмен
-    cancelled_revenue = db.query(func.sum(models.Appointment.price)).filter(
-        models.Appointment.status == "cancelled"
-    ).scalar() or 0
+    # Общая выручка и отмены
+    by_status = _aggregate(db, ("status",))
+    confirmed_count, total_revenue = by_status.get(("confirmed",), (0, 0.0))
+    cancelled_count, cancelled_revenue = by_status.get(("cancelled",), (0, 0.0))
     
     # Средний чек
-    avg_check = db.query(func.avg(models.Appointment.price)).filter(
-        models.Appointment.status == "confirmed"
-    ).scalar() or 0
+    avg_check = total_revenue / confirmed_count if confirmed_count else 0
     
     return {
         "today_revenue": round(today_revenue, 2),
@@ -206,104 +362,21 @@ def get_financial_overview(db: Session = Depends(get_db)):
 
 @router.get("/analytics/revenue-by-salon")
 def get_revenue_by_salon(db: Session = Depends(get_db)):
-    revenue_stats = db.query(
-        models.Salon.name,
-        func.sum(models.Appointment.price).label('revenue'),
-        func.count(models.Appointment.id).label('appointments_count')
-    ).join(
-        models.Master, models.Salon.id == models.Master.salon_id
-    ).join(
-        models.Appointment, models.Master.id == models.Appointment.master_id
-    ).filter(
-        models.Appointment.status == "confirmed"
-    ).group_by(
-        models.Salon.id, models.Salon.name
-    ).all()
-    
-    return [
-        {
-            "salon_name": name,
-            "revenue": round(revenue or 0, 2),
-            "appointments_count": count
-        }
-        for name, revenue, count in revenue_stats
-    ]
+    return _revenue_by_salon(db, _confirmed(db, ("salon_id",)))
 
 @router.get("/analytics/revenue-by-service")
 def get_revenue_by_service(db: Session = Depends(get_db)):
-    service_revenue = db.query(
-        models.Appointment.service,
-        func.sum(models.Appointment.price).label('revenue'),
-        func.count(models.Appointment.id).label('count')
-    ).filter(
-        models.Appointment.status == "confirmed"
-    ).group_by(
-        models.Appointment.service
-    ).order_by(
-        func.sum(models.Appointment.price).desc()
-    ).all()
-    
-    return [
-        {
-            "service": service,
-            "revenue": round(revenue or 0, 2),
-            "count": count
-        }
-        for service, revenue, count in service_revenue
-    ]
+    return _revenue_by_service(_confirmed(db, ("service",)))
 
 @router.get("/analytics/master-earnings")
 def get_master_earnings(db: Session = Depends(get_db)):
-    master_stats = db.query(
-        models.Master.name,
-        models.Master.hourly_rate,
-        models.Salon.name.label('salon_name'),
-        func.count(models.Appointment.id).label('appointments_count'),
-        func.sum(models.Appointment.price).label('total_revenue')
-    ).join(
-        models.Appointment, models.Master.id == models.Appointment.master_id
-    ).join(
-        models.Salon, models.Master.salon_id == models.Salon.id
-    ).filter(
-        models.Appointment.status == "confirmed"
-    ).group_by(
-        models.Master.id, models.Master.name, models.Master.hourly_rate, models.Salon.name
-    ).order_by(
-        func.sum(models.Appointment.price).desc()
-    ).all()
-    
-    result = []
-    for name, hourly_rate, salon_name, appointments_count, total_revenue in master_stats:
-        earnings = appointments_count * hourly_rate
-        result.append({
-            "master_name": name,
-            "salon_name": salon_name,
-            "hourly_rate": hourly_rate,
-            "appointments_count": appointments_count,
-            "total_revenue": round(total_revenue or 0, 2),
-            "master_earnings": round(earnings, 2)
-        })
-    
-    return result
+    return _master_earnings(db, _payroll_totals(db))
 
 @router.get("/analytics/daily-revenue")
 def get_daily_revenue(days: int = 30, db: Session = Depends(get_db)):
     start_date = datetime.now() - timedelta(days=days)
     
-    daily_revenue = db.query(
-        func.date(models.Appointment.start_time).label('date'),
-        func.sum(models.Appointment.price).label('revenue'),
-        func.count(models.Appointment.id).label('count')
-    ).filter(
-        and_(
-            models.Appointment.start_time >= start_date,
-            models.Appointment.status == "confirmed"
-        )
-    ).group_by(
-        func.date(models.Appointment.start_time)
-    ).order_by(
-        func.date(models.Appointment.start_time)
-    ).all()
+    daily_revenue = _aggregate(db, ("day",), start_date, statuses=("confirmed",))
     
     return [
         {
@@ -311,314 +384,135 @@ def get_daily_revenue(days: int = 30, db: Session = Depends(get_db)):
             "revenue": round(revenue or 0, 2),
             "count": count
         }
-        for date, revenue, count in daily_revenue
+        for (date,), (count, revenue) in sorted(daily_revenue.items())
     ]
 
 @router.get("/analytics/export-csv")
-def export_to_csv(db: Session = Depends(get_db)):
-    from fastapi.responses import StreamingResponse
-    import io
-    import csv
-    
-    appointments = db.query(
-        models.Appointment.id,
-        models.Appointment.start_time,
-        models.Appointment.service,
-        models.Appointment.price,
-        models.Appointment.status,
-        models.Master.name.label('master_name'),
-        models.Client.name.label('client_name'),
-        models.Salon.name.label('salon_name')
-    ).join(
-        models.Master, models.Appointment.master_id == models.Master.id
-    ).join(
-        models.Client, models.Appointment.client_id == models.Client.id
-    ).join(
-        models.Salon, models.Master.salon_id == models.Salon.id
-    ).all()
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    writer.writerow(['ID', 'Дата', 'Услуга', 'Цена', 'Статус', 'Мастер', 'Клиент', 'Салон'])
-    
-    for apt in appointments:
-        writer.writerow([
-            apt.id,
-            apt.start_time.strftime('%Y-%m-%d %H:%M'),
-            apt.service,
-            apt.price,
-            apt.status,
-            apt.master_name,
-            apt.client_name,
-            apt.salon_name
-        ])
-    
-    output.seek(0)
-    
-    return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=analytics.csv"}
+def export_to_csv(request: Request, start_date: str = None, end_date: str = None, salon_id: int = None, gzip: bool = True):
+    start_dt, end_dt = parse_range(start_date, end_date)
+    
+    return exports.stream_csv(
+        request,
+        exports.APPOINTMENT_EXPORT_HEADER,
+        lambda db: exports.appointment_csv_rows(db, start_dt, end_dt, salon_id),
+        "analytics.csv",
+        gzip
+    )
+
+@router.get("/analytics/export-ndjson")
+def export_to_ndjson(request: Request, start_date: str = None, end_date: str = None, salon_id: int = None, gzip: bool = True):
+    start_dt, end_dt = parse_range(start_date, end_date)
+    
+    return exports.stream(
+        exports.ndjson_chunks(lambda db: exports.appointment_rows(db, start_dt, end_dt, salon_id)),
+        "application/x-ndjson",
+        "analytics.ndjson",
+        compress=gzip and exports.accepts_gzip(request)
+    )
+
+@router.get("/analytics/export-parquet")
+def export_to_parquet(start_date: str = None, end_date: str = None, salon_id: int = None):
+    return _export_columnar(exports.parquet_chunks, "application/vnd.apache.parquet", "analytics.parquet", start_date, end_date, salon_id)
+
+@router.get("/analytics/export-arrow")
+def export_to_arrow(start_date: str = None, end_date: str = None, salon_id: int = None):
+    return _export_columnar(exports.arrow_ipc_chunks, "application/vnd.apache.arrow.stream", "analytics.arrow", start_date, end_date, salon_id)
+
+def _export_columnar(chunks, media_type, filename, start_date, end_date, salon_id):
+    if importlib.util.find_spec("pyarrow") is None:
+        raise HTTPException(status_code=501, detail="pyarrow is not installed")
+    start_dt, end_dt = parse_range(start_date, end_date)
+    
+    return exports.stream(
+        chunks(lambda db: exports.appointment_rows(db, start_dt, end_dt, salon_id)),
+        media_type,
+        filename
     )
 
+FINANCIAL_REPORT_HEADER = ['Салон', 'Выручка', 'Количество записей']
+MASTERS_REPORT_HEADER = ['Мастер', 'Салон', 'Ставка/час', 'Записей', 'Часов', 'Выручка', 'Зарплата']
+SERVICES_REPORT_HEADER = ['Услуга', 'Выручка', 'Количество']
+
+def financial_report_rows(start_dt=None, end_dt=None, salon_id=None):
+    """make_rows(db) для exports.csv_chunks: выручка по салонам."""
+    def rows(db):
+        totals = rollup.aggregate(db, ("salon_id",), start_dt, end_dt, statuses=("confirmed",), salon_id=salon_id)
+        for row in _revenue_by_salon(db, totals, rounded=False):
+            yield [row["salon_name"], row["revenue"], row["appointments_count"]]
+    return rows
+
+def masters_report_rows(start_dt=None, end_dt=None, salon_id=None):
+    """make_rows(db) для exports.csv_chunks: зарплата мастеров."""
+    def rows(db):
+        totals = payroll.totals(db, start_dt, end_dt, salon_id=salon_id)
+        for row in sorted(_master_earnings(db, totals, rounded=False), key=lambda row: row["master_id"]):
+            yield [
+                row["master_name"],
+                row["salon_name"],
+                row["hourly_rate"],
+                row["appointments_count"],
+                row["worked_hours"],
+                row["total_revenue"],
+                row["master_earnings"]
+            ]
+    return rows
+
+def services_report_rows(start_dt=None, end_dt=None, salon_id=None):
+    """make_rows(db) для exports.csv_chunks: выручка по услугам."""
+    def rows(db):
+        totals = rollup.aggregate(db, ("service",), start_dt, end_dt, statuses=("confirmed",), salon_id=salon_id)
+        for row in _revenue_by_service(totals, rounded=False):
+            yield [row["service"], row["revenue"], row["count"]]
+    return rows
+
 @router.get("/analytics/export-financial-csv")
-def export_financial_csv(db: Session = Depends(get_db)):
-    from fastapi.responses import StreamingResponse
-    import io
-    import csv
-    
-    data = db.query(
-        models.Salon.name.label('salon_name'),
-        func.sum(models.Appointment.price).label('revenue'),
-        func.count(models.Appointment.id).label('appointments_count')
-    ).join(
-        models.Master, models.Salon.id == models.Master.salon_id
-    ).join(
-        models.Appointment, models.Master.id == models.Appointment.master_id
-    ).filter(
-        models.Appointment.status == "confirmed"
-    ).group_by(
-        models.Salon.id, models.Salon.name
-    ).all()
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['Салон', 'Выручка', 'Количество записей'])
-    
-    for row in data:
-        writer.writerow([row.salon_name, row.revenue or 0, row.appointments_count])
+def export_financial_csv(request: Request, start_date: str = None, end_date: str = None, salon_id: int = None, gzip: bool = True):
+    start_dt, end_dt = parse_range(start_date, end_date)
     
-    output.seek(0)
-    return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=financial_report.csv"}
+    return exports.stream_csv(
+        request, FINANCIAL_REPORT_HEADER, financial_report_rows(start_dt, end_dt, salon_id), "financial_report.csv", gzip
     )
 
 @router.get("/analytics/export-masters-csv")
-def export_masters_csv(db: Session = Depends(get_db)):
-    from fastapi.responses import StreamingResponse
-    import io
-    import csv
+def export_masters_csv(request: Request, start_date: str = None, end_date: str = None, salon_id: int = None, gzip: bool = True):
+    start_dt, end_dt = parse_range(start_date, end_date)
     
-    data = db.query(
-        models.Master.name,
-        models.Master.hourly_rate,
-        models.Salon.name.label('salon_name'),
-        func.count(models.Appointment.id).label('appointments_count'),
-        func.sum(models.Appointment.price).label('total_revenue')
-    ).join(
-        models.Appointment, models.Master.id == models.Appointment.master_id
-    ).join(
-        models.Salon, models.Master.salon_id == models.Salon.id
-    ).filter(
-        models.Appointment.status == "confirmed"
-    ).group_by(
-        models.Master.id, models.Master.name, models.Master.hourly_rate, models.Salon.name
-    ).all()
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['Мастер', 'Салон', 'Ставка/час', 'Записей', 'Выручка', 'Зарплата'])
-    
-    for row in data:
-        earnings = row.appointments_count * row.hourly_rate
-        writer.writerow([
-            row.name,
-            row.salon_name,
-            row.hourly_rate,
-            row.appointments_count,
-            row.total_revenue or 0,
-            earnings
-        ])
-    
-    output.seek(0)
-    return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=masters_report.csv"}
+    return exports.stream_csv(
+        request, MASTERS_REPORT_HEADER, masters_report_rows(start_dt, end_dt, salon_id), "masters_report.csv", gzip
     )
 
 @router.get("/analytics/export-services-csv")
-def export_services_csv(db: Session = Depends(get_db)):
-    from fastapi.responses import StreamingResponse
-    import io
-    import csv
+def export_services_csv(request: Request, start_date: str = None, end_date: str = None, salon_id: int = None, gzip: bool = True):
+    start_dt, end_dt = parse_range(start_date, end_date)
     
-    data = db.query(
-        models.Appointment.service,
-        func.sum(models.Appointment.price).label('revenue'),
-        func.count(models.Appointment.id).label('count')
-    ).filter(
-        models.Appointment.status == "confirmed"
-    ).group_by(
-        models.Appointment.service
-    ).order_by(
-        func.sum(models.Appointment.price).desc()
-    ).all()
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['Услуга', 'Выручка', 'Количество'])
-    
-    for row in data:
-        writer.writerow([row.service, row.revenue or 0, row.count])
-    
-    output.seek(0)
-    return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=services_report.csv"}
+    return exports.stream_csv(
+        request, SERVICES_REPORT_HEADER, services_report_rows(start_dt, end_dt, salon_id), "services_report.csv", gzip
     )
 
 @router.get("/analytics/filtered-overview")
 def get_filtered_overview(start_date: str = None, end_date: str = None, db: Session = Depends(get_db)):
-    from datetime import datetime
-    
-    query_filter = [models.Appointment.status == "confirmed"]
-    
-    if start_date:
-        start_dt = datetime.fromisoformat(start_date)
-        query_filter.append(models.Appointment.start_time >= start_dt)
-    
-    if end_date:
-        end_dt = datetime.fromisoformat(end_date)
-        query_filter.append(models.Appointment.start_time <= end_dt)
-    
-    total_revenue = db.query(func.sum(models.Appointment.price)).filter(*query_filter).scalar() or 0
-    total_appointments = db.query(models.Appointment).filter(*query_filter).count()
-    avg_check = db.query(func.avg(models.Appointment.price)).filter(*query_filter).scalar() or 0
-    
-    cancelled_filter = [models.Appointment.status == "cancelled"]
-    if start_date:
-        cancelled_filter.append(models.Appointment.start_time >= start_dt)
-    if end_date:
-        cancelled_filter.append(models.Appointment.start_time <= end_dt)
-    
-    cancelled_count = db.query(models.Appointment).filter(*cancelled_filter).count()
-    cancelled_revenue = db.query(func.sum(models.Appointment.price)).filter(*cancelled_filter).scalar() or 0
-    
-    return {
-        "total_revenue": round(total_revenue, 2),
-        "total_appointments": total_appointments,
-        "average_check": round(avg_check, 2),
-        "cancelled_count": cancelled_count,
-        "cancelled_revenue": round(cancelled_revenue, 2)
-    }
+    start_dt, end_dt = parse_range(start_date, end_date)
+    return analytics_cache.cached("filtered-overview", start_dt, end_dt, lambda: _financial(
+        _aggregate(db, ("status",), start_dt, end_dt, statuses=("confirmed", "cancelled"))
+    ))
 
 @router.get("/analytics/filtered-revenue-by-salon")
 def get_filtered_revenue_by_salon(start_date: str = None, end_date: str = None, db: Session = Depends(get_db)):
-    from datetime import datetime
-    
-    query = db.query(
-        models.Salon.name,
-        func.sum(models.Appointment.price).label('revenue'),
-        func.count(models.Appointment.id).label('appointments_count')
-    ).join(
-        models.Master, models.Salon.id == models.Master.salon_id
-    ).join(
-        models.Appointment, models.Master.id == models.Appointment.master_id
-    ).filter(
-        models.Appointment.status == "confirmed"
-    )
-    
-    if start_date:
-        start_dt = datetime.fromisoformat(start_date)
-        query = query.filter(models.Appointment.start_time >= start_dt)
-    
-    if end_date:
-        end_dt = datetime.fromisoformat(end_date)
-        query = query.filter(models.Appointment.start_time <= end_dt)
-    
-    revenue_stats = query.group_by(models.Salon.id, models.Salon.name).all()
-    
-    return [
-        {
-            "salon_name": name,
-            "revenue": round(revenue or 0, 2),
-            "appointments_count": count
-        }
-        for name, revenue, count in revenue_stats
-    ]
+    start_dt, end_dt = parse_range(start_date, end_date)
+    return analytics_cache.cached("filtered-revenue-by-salon", start_dt, end_dt, lambda: _revenue_by_salon(
+        db, _confirmed(db, ("salon_id",), start_dt, end_dt)
+    ))
 
 @router.get("/analytics/filtered-revenue-by-service")
 def get_filtered_revenue_by_service(start_date: str = None, end_date: str = None, db: Session = Depends(get_db)):
-    from datetime import datetime
-    
-    query = db.query(
-        models.Appointment.service,
-        func.sum(models.Appointment.price).label('revenue'),
-        func.count(models.Appointment.id).label('count')
-    ).filter(
-        models.Appointment.status == "confirmed"
-    )
-    
-    if start_date:
-        start_dt = datetime.fromisoformat(start_date)
-        query = query.filter(models.Appointment.start_time >= start_dt)
-    
-    if end_date:
-        end_dt = datetime.fromisoformat(end_date)
-        query = query.filter(models.Appointment.start_time <= end_dt)
-    
-    service_revenue = query.group_by(
-        models.Appointment.service
-    ).order_by(
-        func.sum(models.Appointment.price).desc()
-    ).all()
-    
-    return [
-        {
-            "service": service,
-            "revenue": round(revenue or 0, 2),
-            "count": count
-        }
-        for service, revenue, count in service_revenue
-    ]
+    start_dt, end_dt = parse_range(start_date, end_date)
+    return analytics_cache.cached("filtered-revenue-by-service", start_dt, end_dt, lambda: _revenue_by_service(
+        _confirmed(db, ("service",), start_dt, end_dt)
+    ))
 
 @router.get("/analytics/filtered-master-earnings")
 def get_filtered_master_earnings(start_date: str = None, end_date: str = None, db: Session = Depends(get_db)):
-    from datetime import datetime
-    
-    query = db.query(
-        models.Master.name,
-        models.Master.hourly_rate,
-        models.Salon.name.label('salon_name'),
-        func.count(models.Appointment.id).label('appointments_count'),
-        func.sum(models.Appointment.price).label('total_revenue')
-    ).join(
-        models.Appointment, models.Master.id == models.Appointment.master_id
-    ).join(
-        models.Salon, models.Master.salon_id == models.Salon.id
-    ).filter(
-        models.Appointment.status == "confirmed"
-    )
-    
-    if start_date:
-        start_dt = datetime.fromisoformat(start_date)
-        query = query.filter(models.Appointment.start_time >= start_dt)
-    
-    if end_date:
-        end_dt = datetime.fromisoformat(end_date)
-        query = query.filter(models.Appointment.start_time <= end_dt)
-    
-    master_stats = query.group_by(
-        models.Master.id, models.Master.name, models.Master.hourly_rate, models.Salon.name
-    ).order_by(
-        func.sum(models.Appointment.price).desc()
-    ).all()
-    
-    result = []
-    for name, hourly_rate, salon_name, appointments_count, total_revenue in master_stats:
-        earnings = appointments_count * hourly_rate
-        result.append({
-            "master_name": name,
-            "salon_name": salon_name,
-            "hourly_rate": hourly_rate,
-            "appointments_count": appointments_count,
-            "total_revenue": round(total_revenue or 0, 2),
-            "master_earnings": round(earnings, 2)
-        })
-    
-    return result
\ No newline at end of file
+    start_dt, end_dt = parse_range(start_date, end_date)
+    return analytics_cache.cached("filtered-master-earnings", start_dt, end_dt, lambda: _master_earnings(
+        db, _payroll_totals(db, start_dt, end_dt)
+    ))
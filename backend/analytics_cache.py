@@ -0,0 +1,105 @@
+"""Кэш результатов аналитики по периоду.
+
+Ключ — (эндпоинт, начало, конец, доп. параметры) с нормализованными датами.
+Запись удаляется, когда после commit изменилась запись (Appointment), чье
+время начала попадает в период; изменения салонов и мастеров (имена,
+ставки, перевод мастера) сбрасывают весь кэш. Размер ограничен
+ANALYTICS_CACHE_SIZE (LRU).
+
+Инвалидация видит только commit своего процесса, поэтому под
+uvicorn --workers записи живут не дольше ANALYTICS_CACHE_TTL секунд
+(по умолчанию 60): на столько другой воркер может отставать от изменений.
+0 — без TTL, для одного процесса.
+
+Массовые вставки мимо ORM должны сами вызвать invalidate_times().
+"""
+import os
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+import models
+from cache import LRUCache
+
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", "256"))
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", "60"))
+
+results = LRUCache(max_entries=ANALYTICS_CACHE_SIZE, ttl=ANALYTICS_CACHE_TTL)
+
+_TOUCHED = "analytics_touched_times"
+_ALL = object()
+
+
+def _naive(value):
+    if value is not None and value.tzinfo is not None:
+        return value.replace(tzinfo=None)
+    return value
+
+
+def cached(endpoint, start_dt, end_dt, compute, *params):
+    """Результат compute() для периода; повторные запросы берутся из кэша."""
+    key = (endpoint, _naive(start_dt), _naive(end_dt)) + params
+    value = results.get(key)
+    if value is None:
+        snapshot = results.snapshot()
+        value = compute()
+        results.set(key, value, snapshot=snapshot)
+    return value
+
+
+def _covers(key, moment):
+    _, start_dt, end_dt = key[:3]
+    return (start_dt is None or start_dt <= moment) and (end_dt is None or moment <= end_dt)
+
+
+def invalidate_times(times):
+    moments = {_naive(moment) for moment in times if moment is not None}
+    if moments:
+        results.invalidate_where(lambda key: any(_covers(key, moment) for moment in moments))
+
+
+def invalidate_all():
+    results.clear()
+
+
+def _touch(target, *times):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_TOUCHED, set()).update(times)
+
+
+@event.listens_for(models.Appointment, "after_insert")
+@event.listens_for(models.Appointment, "after_delete")
+def _on_appointment_write(mapper, connection, target):
+    _touch(target, target.start_time)
+
+
+@event.listens_for(models.Appointment, "after_update")
+def _on_appointment_update(mapper, connection, target):
+    # Старое время тоже: запись могла уйти из закэшированного периода
+    history = inspect(target).attrs.start_time.history
+    _touch(target, target.start_time, *history.deleted)
+
+
+@event.listens_for(models.Salon, "after_update")
+@event.listens_for(models.Salon, "after_delete")
+@event.listens_for(models.Master, "after_update")
+@event.listens_for(models.Master, "after_delete")
+def _on_catalog_write(mapper, connection, target):
+    _touch(target, _ALL)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    touched = session.info.pop(_TOUCHED, None)
+    if not touched:
+        return
+    if _ALL in touched:
+        invalidate_all()
+    else:
+        invalidate_times(touched)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop(_TOUCHED, None)
@@ -0,0 +1,111 @@
+"""Асинхронный вариант API на AsyncSession.
+
+Запуск: uvicorn async_app:app --port 8080 (синхронный вариант — main:app).
+
+Маршруты строятся из main.app: каждый обработчик с зависимостью db выполняется
+через AsyncSession.run_sync, так что ввод-вывод БД идет через асинхронный
+драйвер (aiosqlite и т.п.) и не занимает поток из пула. Ответ сериализуется
+внутри run_sync, пока ленивые связи еще можно загрузить. Обработчики из
+SYNC_ROUTES, которые берут блокировки потоков или ходят в синхронный engine,
+остаются синхронными и выполняются в пуле потоков.
+"""
+import inspect
+
+from fastapi import Depends, FastAPI, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import database
+import main
+
+# Берут блокировки потоков и ходят в БД через синхронный engine — в event loop
+# это остановило бы все запросы, поэтому они остаются в пуле потоков:
+# запись (booking.locks, сон при повторах), зарплата (payroll.refresh в
+# payroll.totals) и аналитика через _aggregate (колоночный движок под _lock)
+SYNC_ROUTES = {
+    "create_appointment", "update_appointment_status",
+    "get_dashboard", "get_financial_overview", "get_revenue_by_salon", "get_revenue_by_service",
+    "get_master_earnings", "get_daily_revenue", "get_filtered_overview", "get_filtered_revenue_by_salon",
+    "get_filtered_revenue_by_service", "get_filtered_master_earnings",
+}
+
+
+async def get_async_db():
+    async with database.get_async_sessionmaker()() as db:
+        yield db
+
+
+def _asyncify(route: APIRoute):
+    original = route.endpoint
+    signature = inspect.signature(original)
+    if (
+        "db" not in signature.parameters
+        or inspect.iscoroutinefunction(original)
+        or original.__name__ in SYNC_ROUTES
+    ):
+        return original
+
+    adapter = TypeAdapter(route.response_model) if route.response_model is not None else None
+    status_code = route.status_code or 200
+
+    # Заголовки, выставленные обработчиком на внедренном Response (например, курсор)
+    response_parameter = next(
+        (name for name, parameter in signature.parameters.items() if parameter.annotation is Response),
+        None
+    )
+
+    def call(session, kwargs):
+        result = original(db=session, **kwargs)
+        if isinstance(result, Response):
+            return result
+        if adapter is not None:
+            content = adapter.dump_python(
+                adapter.validate_python(result, from_attributes=True), mode="json"
+            )
+        else:
+            content = jsonable_encoder(result)
+        response = JSONResponse(content=content, status_code=status_code)
+        if response_parameter is not None:
+            for key, value in kwargs[response_parameter].headers.items():
+                if key != "content-length":
+                    response.headers[key] = value
+        return response
+
+    async def endpoint(**kwargs):
+        db = kwargs.pop("db")
+        return await db.run_sync(call, kwargs)
+
+    endpoint.__name__ = original.__name__
+    endpoint.__doc__ = original.__doc__
+    endpoint.__signature__ = signature.replace(parameters=[
+        parameter.replace(annotation=AsyncSession, default=Depends(get_async_db))
+        if parameter.name == "db" else parameter
+        for parameter in signature.parameters.values()
+    ])
+    return endpoint
+
+
+def build_app(source: FastAPI = main.app) -> FastAPI:
+    async_app = FastAPI(title=f"{source.title} (async)")
+    async_app.user_middleware = list(source.user_middleware)
+    for route in source.routes:
+        if isinstance(route, APIRoute):
+            async_app.add_api_route(
+                route.path,
+                _asyncify(route),
+                methods=list(route.methods),
+                response_model=route.response_model,
+                status_code=route.status_code,
+                tags=route.tags,
+                name=route.name,
+            )
+        elif route.path not in {route.path for route in async_app.routes}:
+            # Статика (uploads) и прочие не-API маршруты переносятся как есть
+            async_app.router.routes.append(route)
+    return async_app
+
+
+app = build_app()
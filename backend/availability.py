@@ -0,0 +1,147 @@
+"""Расчет свободных слотов мастеров.
+
+Занятость берется одним запросом по индексу (master_id, start_time) с
+диапазонным условием на start_time и хранится как отсортированный список
+непересекающихся интервалов на каждого мастера.
+"""
+from bisect import bisect_right
+from datetime import date, datetime, time, timedelta
+import heapq
+
+from sqlalchemy.orm import Session
+
+import models
+
+WORK_START = time(9, 0)
+WORK_END = time(21, 0)
+
+# Запись, начавшаяся раньше этого срока до начала периода, не может его задеть;
+# более длинные записи не принимаются (interval_error)
+MAX_APPOINTMENT_DURATION = timedelta(hours=12)
+DEFAULT_DURATION = timedelta(hours=1)
+
+BUSY_STATUSES = ("confirmed",)
+
+# Поиск свободных окон салона: не больше стольких дней и окон за запрос
+MAX_SEARCH_DAYS = 31
+MAX_FREE_SLOTS = 100
+
+
+class MasterSchedule:
+    """Отсортированные непересекающиеся интервалы занятости одного мастера."""
+
+    def __init__(self, intervals=()):
+        self.starts = []
+        self.ends = []
+        for start, end in sorted(intervals):
+            if self.ends and start <= self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    def is_free(self, start, end):
+        index = bisect_right(self.starts, start) - 1
+        if index >= 0 and self.ends[index] > start:
+            return False
+        next_index = index + 1
+        return next_index >= len(self.starts) or self.starts[next_index] >= end
+
+    def add(self, start, end):
+        """Занимает интервал, который уже проверен через is_free."""
+        index = bisect_right(self.starts, start)
+        self.starts.insert(index, start)
+        self.ends.insert(index, end)
+
+
+def load_schedules(db: Session, master_ids, range_start, range_end):
+    """{master_id: MasterSchedule} с записями, пересекающими [range_start, range_end)."""
+    rows = db.query(
+        models.Appointment.master_id,
+        models.Appointment.start_time,
+        models.Appointment.end_time
+    ).filter(
+        models.Appointment.master_id.in_(list(master_ids)),
+        models.Appointment.start_time >= range_start - MAX_APPOINTMENT_DURATION,
+        models.Appointment.start_time < range_end,
+        models.Appointment.status.in_(BUSY_STATUSES)
+    ).all()
+
+    intervals = {master_id: [] for master_id in master_ids}
+    for master_id, start_time, end_time in rows:
+        end_time = end_time or start_time + DEFAULT_DURATION
+        if end_time > range_start:
+            intervals[master_id].append((start_time, end_time))
+    return {master_id: MasterSchedule(items) for master_id, items in intervals.items()}
+
+
+def interval_error(start: datetime, end: datetime):
+    """Почему интервал записи недопустим, или None."""
+    if end <= start:
+        return "end_time must be after start_time"
+    if end - start > MAX_APPOINTMENT_DURATION:
+        return f"Appointment cannot be longer than {MAX_APPOINTMENT_DURATION.total_seconds() / 3600:g} hours"
+    return None
+
+
+def find_conflict(db: Session, master_id: int, start: datetime, end: datetime, exclude_id: int = None):
+    """Первая занятая запись мастера, пересекающаяся с [start, end), или None."""
+    query = db.query(models.Appointment).filter(
+        models.Appointment.master_id == master_id,
+        models.Appointment.start_time >= start - MAX_APPOINTMENT_DURATION,
+        models.Appointment.start_time < end,
+        models.Appointment.status.in_(BUSY_STATUSES)
+    )
+    if exclude_id is not None:
+        query = query.filter(models.Appointment.id != exclude_id)
+    for appointment in query.order_by(models.Appointment.start_time).all():
+        if (appointment.end_time or appointment.start_time + DEFAULT_DURATION) > start:
+            return appointment
+    return None
+
+
+def _candidate_starts(day: date, granularity: timedelta, duration: timedelta):
+    current = datetime.combine(day, WORK_START)
+    day_end = datetime.combine(day, WORK_END)
+    while current + duration <= day_end:
+        yield current
+        current += granularity
+
+
+def day_slots(db: Session, master_id: int, day: date, granularity=DEFAULT_DURATION, duration=DEFAULT_DURATION):
+    """Все слоты рабочего дня мастера с признаком доступности."""
+    day_start = datetime.combine(day, time.min)
+    schedule = load_schedules(db, [master_id], day_start, day_start + timedelta(days=1))[master_id]
+    return [
+        (start, schedule.is_free(start, start + duration))
+        for start in _candidate_starts(day, granularity, duration)
+    ]
+
+
+def first_free_slots(db: Session, master_ids, start_day: date, end_day: date, limit: int,
+                     granularity=DEFAULT_DURATION, duration=DEFAULT_DURATION):
+    """Первые limit свободных слотов по нескольким мастерам за период дней (включительно)."""
+    master_ids = sorted(master_ids)
+    if not master_ids or limit <= 0:
+        return []
+    range_start = datetime.combine(start_day, time.min)
+    range_end = datetime.combine(end_day + timedelta(days=1), time.min)
+    schedules = load_schedules(db, master_ids, range_start, range_end)
+
+    def master_slots(master_id):
+        schedule = schedules[master_id]
+        day = start_day
+        while day <= end_day:
+            for start in _candidate_starts(day, granularity, duration):
+                if schedule.is_free(start, start + duration):
+                    yield start, master_id
+            day += timedelta(days=1)
+
+    # Слияние упорядоченных по времени потоков мастеров
+    merged = heapq.merge(*(master_slots(master_id) for master_id in master_ids))
+    result = []
+    for start, master_id in merged:
+        result.append((master_id, start, start + duration))
+        if len(result) >= limit:
+            break
+    return result
@@ -0,0 +1,107 @@
+"""Сравнение синхронного (main:app) и асинхронного (async_app:app) вариантов API.
+
+Каждый вариант запускается через uvicorn на копии salon.db, затем
+конкурентные клиенты httpx гоняют чтение по эндпоинтам; печатаются
+запросы/с и перцентили задержки.
+
+    python -m benchmarks.async_vs_sync --concurrency 200 --requests 5000
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+PATHS = [
+    "/salons/",
+    "/masters/",
+    "/salons/1",
+    "/clients/1",
+    "/masters/1/available-slots?date=2025-12-01",
+    "/api/analytics/dashboard",
+    "/api/analytics/filtered-master-earnings?start_date=2025-11-01&end_date=2025-12-01",
+]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+def start_server(app: str, port: int, database_path: str):
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{database_path}")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1, trust_env=False)
+            return process
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{app} did not start")
+
+
+async def load(port: int, total: int, concurrency: int):
+    latencies, errors = [], 0
+    queue = asyncio.Queue()
+    for index in range(total):
+        queue.put_nowait(PATHS[index % len(PATHS)])
+
+    async def worker(client):
+        nonlocal errors
+        while not queue.empty():
+            path = queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                response = await client.get(path)
+            except httpx.TransportError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    client = httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60, trust_env=False
+    )
+    async with client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return total / elapsed, latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default="salon.db")
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    print(f"{'вариант':<16} {'запр/с':>8} {'p50, мс':>9} {'p99, мс':>9} {'ошибок':>7}")
+    for app in ("main:app", "async_app:app"):
+        database_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+        shutil.copy(args.database, database_path)
+        process = start_server(app, args.port, database_path)
+        try:
+            rps, latencies, errors = asyncio.run(load(args.port, args.requests, args.concurrency))
+        finally:
+            process.terminate()
+            process.wait()
+        print(f"{app:<16} {rps:>8.0f} {percentile(latencies, 0.5) * 1000:>9.1f} "
+              f"{percentile(latencies, 0.99) * 1000:>9.1f} {errors:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Нагрузочный тест записи: тысячи параллельных бронирований одних и тех же слотов.
+
+Запуск из каталога backend:
+
+    python -m benchmarks.booking_concurrency --bookings 5000 --workers 64
+    python -m benchmarks.booking_concurrency --processes 4   # как uvicorn --workers 4
+    python -m benchmarks.booking_concurrency --naive   # старый путь без проверки
+
+С --processes запросы делятся между процессами, в каждом --workers потоков:
+threading-блокировка мастера там не помогает, двойные записи ловит только
+база. По умолчанию работает на временной базе SQLite, salon.db не трогает;
+--database задает другую (пустую) базу, например PostgreSQL.
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+from datetime import datetime, timedelta
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import insert, text
+from sqlalchemy.orm import sessionmaker
+
+import booking
+import models
+from database import build_engine
+import rollup  # подключает обновление rollup, как в рабочем приложении
+
+
+def setup(engine, masters: int):
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(insert(models.Salon).values(id=1, name="Bench", address="-"))
+        connection.execute(insert(models.Master), [
+            {"id": master_id, "name": f"Master {master_id}", "salon_id": 1}
+            for master_id in range(1, masters + 1)
+        ])
+        connection.execute(insert(models.Client).values(id=1, name="Bench", phone="-", salon_id=1))
+
+
+def count_double_bookings(engine):
+    with engine.connect() as connection:
+        return connection.execute(text("""
+            SELECT COUNT(*) FROM appointments a
+            JOIN appointments b
+              ON a.master_id = b.master_id AND a.id < b.id
+             AND a.start_time < b.end_time AND b.start_time < a.end_time
+            WHERE a.status = 'confirmed' AND b.status = 'confirmed'
+        """)).scalar()
+
+
+def book_all(url, requests, workers, naive):
+    """Бронирует requests в workers потоков; в режиме --processes вызывается в каждом процессе."""
+    engine = build_engine(url, pool_size=workers, max_overflow=0)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def attempt(request):
+        master_id, start = request
+        data = {
+            "master_id": master_id,
+            "client_id": 1,
+            "start_time": start,
+            "end_time": start + timedelta(hours=1),
+            "service": "Стрижка",
+            "price": 1500.0,
+            "status": "confirmed",
+        }
+        db = Session()
+        try:
+            if naive:
+                db.add(models.Appointment(**data))
+                db.commit()
+            else:
+                booking.book(db, data)
+            return "booked"
+        except booking.SlotConflict:
+            return "conflict"
+        except Exception:
+            db.rollback()
+            return "error"
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(attempt, requests))
+    engine.dispose()
+    return results
+
+
+def run(args):
+    url = args.database or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    engine = build_engine(url)
+    setup(engine, args.masters)
+
+    day = datetime(2030, 1, 1, 9, 0)
+    rng = random.Random(args.seed)
+    requests = [
+        (rng.randint(1, args.masters), day + timedelta(hours=rng.randrange(args.slots)))
+        for _ in range(args.bookings)
+    ]
+
+    started = time.perf_counter()
+    if args.processes > 1:
+        chunks = [requests[index::args.processes] for index in range(args.processes)]
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=args.processes, mp_context=context) as pool:
+            futures = [pool.submit(book_all, url, chunk, args.workers, args.naive) for chunk in chunks]
+            results = [result for future in futures for result in future.result()]
+    else:
+        results = book_all(url, requests, args.workers, args.naive)
+    elapsed = time.perf_counter() - started
+
+    double_bookings = count_double_bookings(engine)
+    print(f"Путь:              {'naive' if args.naive else 'booking.book'}")
+    print(f"Запросов:          {len(results)} ({args.masters} мастеров x {args.slots} слотов)")
+    print(f"Процессов:         {args.processes} x {args.workers} потоков")
+    print(f"Создано:           {results.count('booked')}")
+    print(f"Конфликтов (409):  {results.count('conflict')}")
+    print(f"Ошибок:            {results.count('error')}")
+    print(f"Время:             {elapsed:.2f} с, {len(results) / elapsed:.0f} запросов/с")
+    print(f"Двойных записей:   {double_bookings}")
+    engine.dispose()
+    return double_bookings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bookings", type=int, default=2000)
+    parser.add_argument("--masters", type=int, default=5)
+    parser.add_argument("--slots", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=32, help="потоков в каждом процессе")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--database", help="URL пустой базы; по умолчанию временная SQLite")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--naive", action="store_true", help="вставка без проверки, как до исправления")
+    args = parser.parse_args()
+    double_bookings = run(args)
+    if double_bookings and not args.naive:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Скорость загрузки записей: POST /appointments/ по одной против /appointments/bulk.
+
+Запросы идут через TestClient в приложение main на временной базе SQLite,
+salon.db не трогается. Слоты не пересекаются, так что все строки валидны.
+
+    python -m benchmarks.bulk_insert --single 2000 --bulk 100000 --masters 50
+"""
+import argparse
+from datetime import datetime, timedelta
+import json
+import os
+import tempfile
+import time
+
+
+def appointments(count: int, masters: int, offset: int = 0):
+    base = datetime(2031, 1, 1, 9, 0)
+    for number in range(offset, offset + count):
+        # Каждый мастер получает последовательные часовые слоты
+        slot = number // masters
+        start = base + timedelta(hours=slot)
+        yield {
+            "master_id": number % masters + 1,
+            "client_id": 1,
+            "service": "Стрижка",
+            "price": 1500,
+            "start_time": start.isoformat(),
+            "end_time": (start + timedelta(hours=1)).isoformat(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--single", type=int, default=2000, help="записей по одной")
+    parser.add_argument("--bulk", type=int, default=100_000, help="записей пачкой")
+    parser.add_argument("--masters", type=int, default=50)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bulk.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import func, insert
+    import database
+    import main as api
+    import models
+    import rollup
+
+    with database.engine.begin() as connection:
+        connection.execute(insert(models.Salon).values(id=1, name="Bench", address="-"))
+        connection.execute(insert(models.Master), [
+            {"id": master_id, "name": f"Master {master_id}", "salon_id": 1}
+            for master_id in range(1, args.masters + 1)
+        ])
+        connection.execute(insert(models.Client).values(id=1, name="Bench", phone="-", salon_id=1))
+
+    client = TestClient(api.app)
+    results = []
+
+    started = time.perf_counter()
+    for item in appointments(args.single, args.masters):
+        response = client.post("/appointments/", json=item)
+        if response.status_code != 200:
+            raise SystemExit(f"POST /appointments/: HTTP {response.status_code} {response.text}")
+    results.append(("по одной", args.single, time.perf_counter() - started))
+
+    offset = args.single
+    for label, content_type, encode in (
+        ("bulk JSON", "application/json", lambda items: json.dumps(items)),
+        ("bulk NDJSON", "application/x-ndjson", lambda items: "\n".join(json.dumps(item) for item in items)),
+    ):
+        body = encode(list(appointments(args.bulk, args.masters, offset)))
+        offset += args.bulk
+        started = time.perf_counter()
+        response = client.post("/appointments/bulk", content=body, headers={"Content-Type": content_type})
+        elapsed = time.perf_counter() - started
+        report = response.json()
+        if response.status_code != 200 or report["failed"]:
+            raise SystemExit(f"{label}: HTTP {response.status_code} {report}")
+        results.append((label, report["inserted"], elapsed))
+
+    print(f"{'способ':<12} {'строк':>8} {'сек':>8} {'строк/с':>10}")
+    for label, rows, elapsed in results:
+        print(f"{label:<12} {rows:>8} {elapsed:>8.2f} {rows / elapsed:>10.0f}")
+
+    with database.SessionLocal() as db:
+        total = db.query(func.count(models.Appointment.id)).scalar()
+        mismatches = rollup.check_consistency(db)
+    print(f"записей в базе: {total}, расхождений rollup: {len(mismatches)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Аналитика: SQL (rollup + payroll) против колоночного движка в памяти.
+
+База генерируется generate_data.py во временный каталог. Для --queries
+случайных периодов (с неполными крайними днями, как у date-picker)
+каждая разбивка считается обоими путями; результаты сверяются, время —
+медиана на запрос.
+
+    python -m benchmarks.columnar --appointments 1M --queries 50
+"""
+import argparse
+from datetime import timedelta
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Разбивки дашборда и filtered-*: (название, группировка, статусы)
+BREAKDOWNS = [
+    ("filtered-overview", ("status",), ("confirmed", "cancelled")),
+    ("revenue-by-salon", ("salon_id",), ("confirmed",)),
+    ("revenue-by-service", ("service",), ("confirmed",)),
+    ("dashboard", ("salon_id", "service", "status"), ("confirmed", "cancelled")),
+]
+
+
+def random_ranges(count, first, last, seed):
+    generator = random.Random(seed)
+    span = int((last - first).total_seconds())
+    ranges = []
+    for _ in range(count):
+        start = first + timedelta(seconds=generator.randrange(span))
+        end = start + timedelta(days=generator.choice((1, 7, 30, 90, 365)), hours=generator.randrange(24))
+        ranges.append((start.replace(minute=0, second=0), end.replace(minute=0, second=0)))
+    return ranges
+
+
+def same(expected, actual, tolerance=0.01):
+    if set(expected) != set(actual):
+        return False
+    return all(
+        len(expected[key]) == len(actual[key]) and all(
+            abs(a - b) <= tolerance * max(1.0, abs(a)) for a, b in zip(expected[key], actual[key])
+        )
+        for key in expected
+    )
+
+
+def timed(function):
+    started = time.perf_counter()
+    result = function()
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--appointments", default="1M")
+    parser.add_argument("--masters", default="5000")
+    parser.add_argument("--salons", default="250")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "columnar.db")
+    subprocess.run([
+        sys.executable, os.path.join(BACKEND_DIR, "generate_data.py"),
+        "--database", f"sqlite:///{path}", "--salons", args.salons, "--masters", args.masters,
+        "--appointments", args.appointments, "--seed", str(args.seed),
+    ], check=True, cwd=BACKEND_DIR)
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ["PAYROLL_WORKER"] = "0"
+
+    from sqlalchemy import func
+    import columnar
+    import database
+    import models
+    import payroll
+    import rollup
+
+    if not columnar.HAS_NUMPY:
+        raise SystemExit("numpy не установлен")
+
+    with database.SessionLocal() as db:
+        store = columnar.ColumnStore()
+        load_time, _ = timed(lambda: store.load(db.connection()))
+        print(f"Загрузка: {store.size} записей за {load_time:.2f} с, {store.nbytes / 1e6:.1f} МБ в колонках")
+
+        first, last = db.query(func.min(models.Appointment.start_time), func.max(models.Appointment.start_time)).one()
+        ranges = random_ranges(args.queries, first, last - timedelta(days=1), args.seed)
+
+        print(f"{'разбивка':<24} {'SQL, мс':>9} {'NumPy, мс':>10} {'ускорение':>10}")
+        cases = [
+            (name, lambda start, end, group=group, statuses=statuses: rollup.aggregate(db, group, start, end, statuses=statuses),
+             lambda start, end, group=group, statuses=statuses: store.aggregate(group, start, end, statuses))
+            for name, group, statuses in BREAKDOWNS
+        ]
+        cases.append((
+            "master-earnings",
+            lambda start, end: payroll.totals(db, start, end),
+            lambda start, end: store.payroll_totals(start, end),
+        ))
+        for name, sql_path, numpy_path in cases:
+            sql_times, numpy_times = [], []
+            for start, end in ranges:
+                sql_time, expected = timed(lambda: sql_path(start, end))
+                numpy_time, actual = timed(lambda: numpy_path(start, end))
+                if not same(expected, actual):
+                    raise SystemExit(f"{name} {start} - {end}: результаты SQL и NumPy различаются")
+                sql_times.append(sql_time)
+                numpy_times.append(numpy_time)
+            sql_ms = statistics.median(sql_times) * 1000
+            numpy_ms = statistics.median(numpy_times) * 1000
+            print(f"{name:<24} {sql_ms:>9.2f} {numpy_ms:>10.2f} {sql_ms / numpy_ms:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
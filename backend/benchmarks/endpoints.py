@@ -0,0 +1,563 @@
+"""Бенчмарк всех эндпоинтов API с порогами регрессии.
+
+Два прогона на копии базы (salon.db или сгенерированной generate_data.py):
+
+1. ASGI: каждый маршрут main.app вызывается --requests раз через
+   httpx.ASGITransport в этом же процессе; меряются задержки p50/p95/p99,
+   запросы/с и число SQL-запросов на вызов. Кэши ответов перед каждым
+   вызовом сбрасываются (--warm-cache оставляет их), чтобы мерить сами
+   обработчики.
+2. Нагрузка: uvicorn с --workers процессами, --concurrency клиентов в
+   течение --seconds гоняют GET-сценарии (кроме выгрузок).
+
+Результат пишется в JSON (--output) и сравнивается с базовым файлом
+(--baseline, в репозитории — benchmarks/baseline.json для параметров по
+умолчанию и salon.db). Нет базового файла или параметры прогона с ним не
+совпадают — выход с ошибкой (--no-compare — только замер); другое число
+CPU только выводит предупреждение. Регрессия — рост числа SQL-запросов или
+ошибок, рост p50 (ASGI) больше чем на --tolerance, рост p95 или падение
+запросов/с под нагрузкой больше чем на --load-tolerance или рост пикового
+RSS — выход с кодом 1. Нагрузка сравнивается только по итоговой строке
+_total: по маршрутам выборки малы. Допуск нагрузки шире, потому что
+клиенты и воркеры делят одну машину: на 1 CPU запросы/с и p95 одинаковых
+прогонов расходятся на 40–50%; на выделенной машине его стоит сузить.
+
+    python -m benchmarks.endpoints
+    python -m benchmarks.endpoints --generate --masters 2000 --appointments 1M --no-compare
+    python -m benchmarks.endpoints --update-baseline
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.async_vs_sync import percentile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_OUTPUT = os.path.join(BACKEND_DIR, "benchmarks", "last_run.json")
+DEFAULT_BASELINE = os.path.join(BACKEND_DIR, "benchmarks", "baseline.json")
+
+# Абсолютный запас к порогу задержки: шум таймера на быстрых эндпоинтах
+LATENCY_SLACK_MS = 2.0
+
+# Поля meta, которые должны совпасть с базовым файлом, чтобы сравнение имело смысл;
+# параметры нагрузки — только если в базовом файле есть нагрузочный прогон
+COMPARABLE_META = ("sizes", "requests", "warm_cache")
+COMPARABLE_LOAD_META = ("workers", "concurrency", "seconds")
+
+
+class Context:
+    """Id и даты из тестовой базы, подставляемые в сценарии."""
+
+    def __init__(self, connection):
+        from sqlalchemy import text
+
+        def first(table):
+            return connection.execute(text(f"SELECT MIN(id) FROM {table}")).scalar()
+
+        self.salon_id = first("salons")
+        self.master_id = first("masters")
+        self.client_id = first("clients")
+        self.user_id = first("users")
+        last = connection.execute(text("SELECT MAX(start_time) FROM appointments")).scalar()
+        self.end = datetime.fromisoformat(str(last)) if last else datetime.now()
+        self.start = self.end - timedelta(days=30)
+        self.lat, self.lon = connection.execute(
+            text("SELECT lat, lon FROM salons WHERE id = :id"), {"id": self.salon_id}
+        ).one()
+
+    @property
+    def range(self):
+        return {"start_date": self.start.date().isoformat(), "end_date": self.end.date().isoformat()}
+
+
+def _get(url, **params):
+    return lambda ctx, i: ("GET", url.format(ctx=ctx), {"params": params})
+
+
+def _get_range(url, **params):
+    return lambda ctx, i: ("GET", url.format(ctx=ctx), {"params": {**ctx.range, **params}})
+
+
+def _future_slot(ctx, i, offset_hours=0):
+    start = datetime(2040, 1, 1, 9) + timedelta(hours=offset_hours + i)
+    return start.isoformat(), (start + timedelta(minutes=30)).isoformat()
+
+
+def _appointment(ctx, i, offset_hours=0):
+    start, end = _future_slot(ctx, i, offset_hours)
+    return {
+        "master_id": ctx.master_id, "client_id": ctx.client_id, "service": "Стрижка",
+        "price": 1500, "start_time": start, "end_time": end,
+    }
+
+
+def _salon_body(ctx, i):
+    return {"name": f"Bench {i}", "address": "-", "lat": ctx.lat, "lon": ctx.lon}
+
+
+def _master_body(ctx, i):
+    return {"name": f"Bench {i}", "salon_id": ctx.salon_id}
+
+
+# Служебные маршруты без сценария
+SKIPPED = {
+    "get_profile",  # держит запрос seconds секунд и требует PROFILING_TOKEN
+}
+
+# Имя маршрута -> (ctx, номер вызова) -> (метод, путь, аргументы httpx)
+SCENARIOS = {
+    "root": _get("/"),
+    "read_salons": _get("/salons/"),
+    "read_nearby_salons": lambda ctx, i: ("GET", "/salons/nearby", {"params": {"lat": ctx.lat, "lon": ctx.lon, "radius": 10}}),
+    "read_salons_in_bbox": lambda ctx, i: ("GET", "/salons/bbox", {"params": {
+        "min_lat": ctx.lat - 0.1, "min_lon": ctx.lon - 0.1, "max_lat": ctx.lat + 0.1, "max_lon": ctx.lon + 0.1,
+    }}),
+    "read_salon": _get("/salons/{ctx.salon_id}"),
+    "read_masters": _get("/masters/", limit=100),
+    "read_master": _get("/masters/{ctx.master_id}"),
+    "read_clients": _get("/clients/", limit=100),
+    "read_client": _get("/clients/{ctx.client_id}"),
+    "read_appointments": _get("/appointments/", limit=100),
+    "get_user": _get("/users/{ctx.user_id}"),
+    "get_user_client": _get("/users/{ctx.user_id}/client"),
+    "get_cache_stats": _get("/cache/stats"),
+    "get_metrics": _get("/metrics"),
+    "get_services_with_prices": _get("/services-with-prices/"),
+    "get_available_slots": lambda ctx, i: ("GET", f"/masters/{ctx.master_id}/available-slots", {
+        "params": {"date": ctx.end.date().isoformat()},
+    }),
+    "get_salon_free_slots": _get_range("/salons/{ctx.salon_id}/free-slots", limit=20),
+    "get_analytics_overview": _get("/api/analytics/overview"),
+    "get_dashboard": _get_range("/api/analytics/dashboard"),
+    "get_popular_services": _get("/api/analytics/popular-services"),
+    "get_salons_stats": _get("/api/analytics/salons-stats"),
+    "get_masters_workload": _get("/api/analytics/masters-workload"),
+    "get_peak_hours": _get("/api/analytics/peak-hours"),
+    "get_appointments_by_day": _get("/api/analytics/appointments-by-day"),
+    "get_financial_overview": _get("/api/analytics/financial-overview"),
+    "get_revenue_by_salon": _get("/api/analytics/revenue-by-salon"),
+    "get_revenue_by_service": _get("/api/analytics/revenue-by-service"),
+    "get_master_earnings": _get("/api/analytics/master-earnings"),
+    "get_daily_revenue": _get("/api/analytics/daily-revenue"),
+    "get_timeseries": _get_range("/api/analytics/timeseries", granularity="day", metric="revenue", group_by="salon"),
+    "get_filtered_overview": _get_range("/api/analytics/filtered-overview"),
+    "get_filtered_revenue_by_salon": _get_range("/api/analytics/filtered-revenue-by-salon"),
+    "get_filtered_revenue_by_service": _get_range("/api/analytics/filtered-revenue-by-service"),
+    "get_filtered_master_earnings": _get_range("/api/analytics/filtered-master-earnings"),
+    # Выгрузки — за неделю, чтобы время не зависело целиком от размера базы
+    "export_to_csv": lambda ctx, i: ("GET", "/api/analytics/export-csv", {"params": {
+        "start_date": (ctx.end - timedelta(days=7)).isoformat(), "end_date": ctx.end.isoformat(), "gzip": False,
+    }}),
+    "export_to_ndjson": lambda ctx, i: ("GET", "/api/analytics/export-ndjson", {"params": {
+        "start_date": (ctx.end - timedelta(days=7)).isoformat(), "end_date": ctx.end.isoformat(), "gzip": False,
+    }}),
+    "export_to_parquet": lambda ctx, i: ("GET", "/api/analytics/export-parquet", {"params": {
+        "start_date": (ctx.end - timedelta(days=7)).isoformat(), "end_date": ctx.end.isoformat(),
+    }}),
+    "export_to_arrow": lambda ctx, i: ("GET", "/api/analytics/export-arrow", {"params": {
+        "start_date": (ctx.end - timedelta(days=7)).isoformat(), "end_date": ctx.end.isoformat(),
+    }}),
+    "export_financial_csv": _get_range("/api/analytics/export-financial-csv", gzip=False),
+    "export_masters_csv": _get_range("/api/analytics/export-masters-csv", gzip=False),
+    "export_services_csv": _get_range("/api/analytics/export-services-csv", gzip=False),
+    # Запись
+    "create_salon": lambda ctx, i: ("POST", "/salons/", {"json": _salon_body(ctx, i)}),
+    "update_salon": lambda ctx, i: ("PUT", f"/salons/{ctx.bench_salon_id}", {"json": _salon_body(ctx, i)}),
+    "create_master": lambda ctx, i: ("POST", "/masters/", {"json": _master_body(ctx, i)}),
+    "update_master": lambda ctx, i: ("PUT", f"/masters/{ctx.bench_master_id}", {
+        "json": {"name": f"Bench {i}", "salon_id": ctx.bench_salon_id},
+    }),
+    "create_client": lambda ctx, i: ("POST", "/clients/", {
+        "json": {"name": f"Bench {i}", "phone": "-", "salon_id": ctx.salon_id},
+    }),
+    "create_appointment": lambda ctx, i: ("POST", "/appointments/", {"json": _appointment(ctx, i)}),
+    "update_appointment_status": lambda ctx, i: ("PUT", f"/appointments/{ctx.appointment_id}/status", {
+        "json": {"status": "cancelled" if i % 2 == 0 else "confirmed"},
+    }),
+    "register": lambda ctx, i: ("POST", "/register/", {
+        "json": {"username": f"bench-{i}", "name": "Bench", "password": "bench"},
+    }),
+    "login": lambda ctx, i: ("POST", "/login/", {"json": {"username": "bench", "password": "bench"}}),
+    "update_user": lambda ctx, i: ("PUT", f"/users/{ctx.user_id}", {
+        "json": {"username": "bench", "name": f"Bench {i}", "role": "client"},
+    }),
+    "submit_job": lambda ctx, i: ("POST", "/jobs/", {"json": {
+        "kind": "financial-csv", "start_date": (ctx.end - timedelta(days=7)).isoformat(), "end_date": ctx.end.isoformat(),
+    }}),
+    "get_job": _get("/jobs/{ctx.job_id}"),
+    "download_job": _get("/jobs/{ctx.job_id}/download"),
+    "upload_file": lambda ctx, i: ("POST", "/upload/", {
+        "files": {"file": (f"bench-{i}.txt", b"x" * 1024, "text/plain")},
+    }),
+    "bulk_create_appointments": lambda ctx, i: ("POST", "/appointments/bulk", {
+        "json": [_appointment(ctx, i * 100 + n, offset_hours=500_000) for n in range(100)],
+    }),
+    "bulk_create_clients": lambda ctx, i: ("POST", "/clients/bulk", {
+        "json": [{"name": f"Bench {n}", "phone": "-", "salon_id": ctx.salon_id} for n in range(100)],
+    }),
+    "bulk_create_masters": lambda ctx, i: ("POST", "/masters/bulk", {
+        "json": [_master_body(ctx, n) for n in range(100)],
+    }),
+}
+
+
+def prepare_database(args, workdir):
+    path = os.path.join(workdir, "bench.db")
+    if args.generate:
+        subprocess.run([
+            sys.executable, os.path.join(BACKEND_DIR, "generate_data.py"),
+            "--database", f"sqlite:///{path}",
+            "--salons", str(args.salons), "--masters", str(args.masters),
+            "--appointments", str(args.appointments), "--seed", str(args.seed),
+        ], check=True, cwd=workdir)
+    else:
+        shutil.copy(args.database, path)
+    return path
+
+
+def seed_fixtures(engine):
+    """Пользователь bench, его клиент и отдельные салон/мастер/запись для сценариев изменения."""
+    from sqlalchemy.orm import sessionmaker
+    import jobs
+    import models
+
+    with sessionmaker(bind=engine)() as db:
+        salon_id = db.query(models.Salon.id).order_by(models.Salon.id).first()[0]
+        user = models.User(username="bench", password="bench", name="Bench", role="client")
+        salon = models.Salon(name="Bench", address="-")
+        db.add_all([user, salon])
+        db.flush()
+        client = models.Client(name="Bench", phone="-", salon_id=salon_id, user_id=user.id)
+        master = models.Master(name="Bench", salon_id=salon.id)
+        db.add_all([client, master])
+        db.flush()
+        appointment = models.Appointment(
+            master_id=master.id, client_id=client.id, service="Стрижка", price=1500,
+            start_time=datetime(2045, 1, 1, 10), end_time=datetime(2045, 1, 1, 11)
+        )
+        # Готовая задача для сценариев статуса и скачивания; выполняется здесь же, без пула
+        job = models.Job(
+            id="bench", kind="financial-csv", status="queued", created_at=datetime.now(),
+            params=json.dumps({"start_date": None, "end_date": None, "salon_id": None, "gzip": False}),
+        )
+        db.add_all([appointment, job])
+        db.commit()
+        os.makedirs(jobs.JOBS_DIR, exist_ok=True)
+        jobs.run_job(job.id)
+        with engine.connect() as connection:
+            context = Context(connection)
+        context.user_id = user.id
+        context.bench_salon_id = salon.id
+        context.bench_master_id = master.id
+        context.appointment_id = appointment.id
+        context.job_id = job.id
+    return context
+
+
+def summarize(latencies, queries, errors, elapsed):
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        **({"queries": max(queries)} if queries else {}),
+    }
+
+
+async def run_asgi(app, context, requests, warm_cache, counter, reset_caches, settle):
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for name, scenario in SCENARIOS.items():
+            # Прогрев: первый вызов платит за компиляцию запросов и импорт
+            method, url, kwargs = scenario(context, requests)
+            await client.request(method, url, **kwargs)
+            latencies, queries, errors = [], [], 0
+            started = time.perf_counter()
+            for i in range(requests):
+                if not warm_cache:
+                    reset_caches()
+                method, url, kwargs = scenario(context, i)
+                counter["statements"] = 0
+                request_started = time.perf_counter()
+                response = await client.request(method, url, **kwargs)
+                latencies.append(time.perf_counter() - request_started)
+                queries.append(counter["statements"])
+                # 501 — не установлена необязательная зависимость (pyarrow)
+                if response.status_code >= 400 and response.status_code != 501:
+                    errors += 1
+            results[name] = summarize(latencies, queries, errors, time.perf_counter() - started)
+            settle()
+    return results
+
+
+def start_server(database_path, port, workers):
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{database_path}", PAYROLL_WORKER="1")
+    # Рабочий каталог — каталог прогона: там результаты задач из seed_fixtures и загрузки
+    process = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND_DIR, "--port", str(port),
+        "--workers", str(workers), "--log-level", "warning",
+    ], env=env, cwd=os.getcwd())
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1, trust_env=False)
+            return process
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("uvicorn did not start")
+
+
+async def run_load(port, context, seconds, concurrency):
+    names = [
+        name for name, scenario in SCENARIOS.items()
+        if scenario(context, 0)[0] == "GET" and not name.startswith("export_")
+    ]
+    stats = {name: ([], [0]) for name in names}
+    deadline = time.perf_counter() + seconds
+
+    async def worker(client, offset):
+        i = offset
+        while time.perf_counter() < deadline:
+            name = names[i % len(names)]
+            method, url, kwargs = SCENARIOS[name](context, i)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                failed = response.status_code >= 400
+            except httpx.TransportError:
+                failed = True
+            stats[name][0].append(time.perf_counter() - started)
+            stats[name][1][0] += failed
+            i += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    started = time.perf_counter()
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60, trust_env=False
+    ) as client:
+        await asyncio.gather(*(worker(client, offset) for offset in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    results = {name: summarize(latencies, [], errors[0], elapsed) for name, (latencies, errors) in stats.items()}
+    everything = [latency for latencies, _ in stats.values() for latency in latencies]
+    results["_total"] = summarize(everything, [], sum(errors[0] for _, errors in stats.values()), elapsed)
+    return results
+
+
+def peak_rss_mb(pid):
+    """Наибольший пиковый RSS (VmHWM) среди процесса и его дочерних — самый тяжелый воркер."""
+    def children(parent):
+        try:
+            with open(f"/proc/{parent}/task/{parent}/children") as file:
+                return [int(child) for child in file.read().split()]
+        except OSError:
+            return []
+
+    peak = 0
+    for process in [pid] + children(pid):
+        try:
+            with open(f"/proc/{process}/status") as file:
+                for line in file:
+                    if line.startswith("VmHWM:"):
+                        peak = max(peak, int(line.split()[1]))
+        except OSError:
+            continue
+    return round(peak / 1024, 1)
+
+
+def compare(current, baseline, tolerance, load_tolerance):
+    failures = []
+    for section in ("asgi", "load"):
+        allowed = tolerance if section == "asgi" else load_tolerance
+        for name, base in baseline.get(section, {}).items():
+            now = current.get(section, {}).get(name)
+            # Под нагрузкой на маршрут приходится по десятку запросов — сравнивается только итог
+            if now is None or (section == "load" and name != "_total"):
+                continue
+            if "queries" in base and now.get("queries", 0) > base["queries"]:
+                failures.append(f"{section}/{name}: SQL-запросов {now['queries']} > {base['queries']}")
+            # В ASGI-прогоне выборки малы и хвост шумит — сравнивается медиана
+            metric = "p50_ms" if section == "asgi" else "p95_ms"
+            if now[metric] > base[metric] * (1 + allowed) + LATENCY_SLACK_MS:
+                failures.append(f"{section}/{name}: {metric} {now[metric]} > {base[metric]}")
+            if section == "load" and now["rps"] < base["rps"] * (1 - allowed):
+                failures.append(f"{section}/{name}: {now['rps']} запросов/с < {base['rps']}")
+            if now["errors"] > base["errors"]:
+                failures.append(f"{section}/{name}: ошибок {now['errors']} > {base['errors']}")
+    for name, base in baseline.get("peak_rss_mb", {}).items():
+        now = current.get("peak_rss_mb", {}).get(name)
+        if now is not None and now > base * (1 + tolerance):
+            failures.append(f"peak_rss_mb/{name}: {now} МБ > {base} МБ")
+    return failures
+
+
+def print_table(title, results):
+    print(f"\n{title}")
+    print(f"{'маршрут':<34} {'запр/с':>9} {'p50 мс':>8} {'p95 мс':>8} {'p99 мс':>8} {'SQL':>5} {'ошибок':>7}")
+    for name, row in results.items():
+        print(
+            f"{name:<34} {row['rps']:>9} {row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} "
+            f"{row.get('queries', '-'):>5} {row['errors']:>7}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default=os.path.join(BACKEND_DIR, "salon.db"))
+    parser.add_argument("--generate", action="store_true", help="сгенерировать базу через generate_data.py")
+    parser.add_argument("--salons", default="50")
+    parser.add_argument("--masters", default="1000")
+    parser.add_argument("--appointments", default="200k")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--requests", type=int, default=30, help="вызовов на маршрут в ASGI-прогоне")
+    parser.add_argument("--warm-cache", action="store_true")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10, help="0 — без нагрузочного прогона")
+    parser.add_argument("--port", type=int, default=8091)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument(
+        "--load-tolerance", type=float, default=0.5,
+        help="допуск для нагрузочного прогона: клиенты и воркеры делят одну машину"
+    )
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--no-compare", action="store_true", help="только замер, без сравнения с базовым файлом")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    database_path = prepare_database(args, workdir)
+    os.environ["DATABASE_URL"] = f"sqlite:///{database_path}"
+    # Фоновый пересчет зарплаты исказил бы счетчик запросов; в ASGI-прогоне он идет при чтении
+    os.environ["PAYROLL_WORKER"] = "0"
+
+    from fastapi.routing import APIRoute
+    from sqlalchemy import event, text
+    import analytics_cache
+    import cache
+    import database
+    import main as api
+
+    # Загрузки и прочие относительные пути — во временный каталог
+    os.chdir(workdir)
+    os.makedirs("uploads", exist_ok=True)
+
+    missing = [
+        route.name for route in api.app.routes
+        if isinstance(route, APIRoute) and route.name not in SCENARIOS and route.name not in SKIPPED
+    ]
+    if missing:
+        raise SystemExit(f"Нет сценариев для маршрутов: {', '.join(missing)}")
+
+    counter = {"statements": 0}
+
+    @event.listens_for(database.engine, "before_cursor_execute")
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith("PRAGMA"):
+            counter["statements"] += 1
+
+    def reset_caches():
+        cache.catalog_cache.clear()
+        analytics_cache.invalidate_all()
+
+    pending_jobs = text("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')")
+
+    def settle():
+        # Задачи из submit_job считаются в процессах пула и отнимали бы CPU у следующих маршрутов
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            with database.engine.connect() as connection:
+                if not connection.execute(pending_jobs).scalar():
+                    return
+            time.sleep(0.05)
+
+    context = seed_fixtures(database.engine)
+    with database.engine.connect() as connection:
+        sizes = {
+            table: connection.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+            for table in ("salons", "masters", "clients", "appointments")
+        }
+
+    result = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "sizes": sizes,
+            "requests": args.requests,
+            "warm_cache": args.warm_cache,
+            "workers": args.workers,
+            "concurrency": args.concurrency,
+            "seconds": args.seconds,
+        },
+    }
+    result["asgi"] = asyncio.run(run_asgi(
+        api.app, context, args.requests, args.warm_cache, counter, reset_caches, settle
+    ))
+    result["peak_rss_mb"] = {"asgi": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+    print_table("ASGI, один процесс", result["asgi"])
+
+    if args.seconds > 0:
+        server = start_server(database_path, args.port, args.workers)
+        try:
+            result["load"] = asyncio.run(run_load(args.port, context, args.seconds, args.concurrency))
+            result["peak_rss_mb"]["worker"] = peak_rss_mb(server.pid)
+        finally:
+            server.terminate()
+            server.wait()
+        print_table(f"uvicorn --workers {args.workers}, {args.concurrency} клиентов", result["load"])
+    print(f"\nПиковый RSS, МБ: {result['peak_rss_mb']}")
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(result, file, ensure_ascii=False, indent=2)
+    print(f"Результат: {args.output}")
+
+    if args.update_baseline:
+        shutil.copy(args.output, args.baseline)
+        print(f"Базовый файл обновлен: {args.baseline}")
+        return
+    if args.no_compare:
+        return
+    # Без базового файла порог ничего не проверяет — это ошибка, а не зеленый прогон
+    if not os.path.exists(args.baseline):
+        raise SystemExit(f"Нет базового файла {args.baseline}: сохраните его через --update-baseline")
+    with open(args.baseline, encoding="utf-8") as file:
+        baseline = json.load(file)
+    keys = COMPARABLE_META + (COMPARABLE_LOAD_META if "load" in baseline else ())
+    mismatched = [key for key in keys if baseline.get("meta", {}).get(key) != result["meta"][key]]
+    if mismatched:
+        raise SystemExit(
+            f"Параметры прогона отличаются от базового ({', '.join(mismatched)}): "
+            "запустите с параметрами базового файла или --no-compare"
+        )
+    if baseline.get("meta", {}).get("cpu_count") != result["meta"]["cpu_count"]:
+        print(
+            f"\nВнимание: базовый файл снят на {baseline.get('meta', {}).get('cpu_count')} CPU, "
+            f"прогон — на {result['meta']['cpu_count']}; задержки и запросы/с сравнимы лишь приблизительно"
+        )
+    failures = compare(result, baseline, args.tolerance, args.load_tolerance)
+    if failures:
+        print("\nРегрессии:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nРегрессий нет")
+
+
+if __name__ == "__main__":
+    main()
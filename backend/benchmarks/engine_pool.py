@@ -0,0 +1,127 @@
+"""Сравнение настроек движка: исходные (DB_SQLITE_TUNED=0) против настроенных.
+
+Смешанная нагрузка из потоков: чтение аналитических агрегатов и списков
+плюс вставки записей, каждая со своим commit — как в обработчиках API.
+
+    python -m benchmarks.engine_pool --appointments 50000 --workers 16 --seconds 10
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from sqlalchemy import func, insert
+from sqlalchemy.orm import sessionmaker
+
+import models
+from database import build_engine
+
+
+def seed(engine, appointments: int, masters: int = 50):
+    models.Base.metadata.create_all(bind=engine)
+    rng = random.Random(1)
+    base = datetime(2025, 1, 1, 9, 0)
+    with engine.begin() as connection:
+        connection.execute(insert(models.Salon).values(id=1, name="Bench", address="-"))
+        connection.execute(insert(models.Master), [
+            {"id": master_id, "name": f"Master {master_id}", "salon_id": 1}
+            for master_id in range(1, masters + 1)
+        ])
+        connection.execute(insert(models.Client).values(id=1, name="Bench", phone="-", salon_id=1))
+        rows = []
+        for _ in range(appointments):
+            start = base + timedelta(days=rng.randrange(365), hours=rng.randrange(12))
+            rows.append({
+                "master_id": rng.randint(1, masters), "client_id": 1,
+                "start_time": start, "end_time": start + timedelta(hours=1),
+                "service": rng.choice(["Стрижка", "Маникюр", "Окрашивание"]),
+                "price": 1500.0, "status": "confirmed",
+            })
+        connection.execute(insert(models.Appointment), rows)
+
+
+def read_op(db, rng, masters):
+    db.query(
+        models.Appointment.service, func.sum(models.Appointment.price)
+    ).group_by(models.Appointment.service).all()
+    db.query(models.Appointment).filter(
+        models.Appointment.master_id == rng.randint(1, masters)
+    ).limit(100).all()
+
+
+def write_op(db, rng, masters):
+    start = datetime(2026, 1, 1, 9) + timedelta(minutes=rng.randrange(10 ** 6))
+    db.add(models.Appointment(
+        master_id=rng.randint(1, masters), client_id=1, start_time=start,
+        end_time=start + timedelta(hours=1), service="Стрижка", price=1500.0,
+    ))
+    db.commit()
+
+
+def measure(tuned: bool, args):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    url = f"sqlite:///{path}"
+    seed(build_engine(url, tuned=False), args.appointments)
+    engine = build_engine(url, tuned=tuned)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    deadline = time.perf_counter() + args.seconds
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def worker(index):
+        rng = random.Random(index)
+        local, failed = [], 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            db = Session()
+            try:
+                if rng.random() < args.write_ratio:
+                    write_op(db, rng, 50)
+                else:
+                    read_op(db, rng, 50)
+                local.append(time.perf_counter() - started)
+            except Exception:
+                db.rollback()
+                failed += 1
+            finally:
+                db.close()
+        with lock:
+            latencies.extend(local)
+            errors.append(failed)
+
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        list(pool.map(worker, range(args.workers)))
+    engine.dispose()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0
+    return {
+        "ops_per_sec": len(latencies) / args.seconds,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0,
+        "p99_ms": p99 * 1000,
+        "errors": sum(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--appointments", type=int, default=50000)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+
+    print(f"{'настройки':<10} {'оп/с':>10} {'p50, мс':>10} {'p99, мс':>10} {'ошибок':>8}")
+    for label, tuned in (("исходные", False), ("tuned", True)):
+        result = measure(tuned, args)
+        print(f"{label:<10} {result['ops_per_sec']:>10.0f} {result['p50_ms']:>10.2f} "
+              f"{result['p99_ms']:>10.2f} {result['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
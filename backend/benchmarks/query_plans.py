@@ -0,0 +1,192 @@
+"""Аудит планов запросов: полные проходы по большим таблицам.
+
+Каждый сценарий benchmarks.endpoints вызывается один раз на копии базы
+(после migrations.upgrade); все SELECT/UPDATE/DELETE, дошедшие до SQLite,
+прогоняются через EXPLAIN QUERY PLAN. Строка плана SCAN <таблица> для
+таблиц из WATCHED — проход по всей таблице (в том числе по всему индексу),
+и если сценарию он не разрешен в ALLOWED — выход с кодом 1.
+
+Разрешения выдаются сценарию, а не маршруту: к сценариям бенчмарка
+добавлены те же списки с фильтрами (клиент, мастер, салон, период), а
+дашборд разделен на сводку за все время и разделы за период — так полный
+проход в отфильтрованном запросе не прячется за разрешением для
+нефильтрованного.
+
+    python -m benchmarks.query_plans [--database salon.db] [--verbose]
+    python -m benchmarks.query_plans --generate --appointments 200k
+"""
+import argparse
+import asyncio
+from datetime import timedelta
+import os
+import re
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+
+import httpx
+
+from benchmarks.endpoints import BACKEND_DIR, SCENARIOS as ENDPOINT_SCENARIOS, seed_fixtures
+
+RANGE_SECTIONS = "financial,revenue_by_salon,revenue_by_service,master_earnings"
+
+
+def _list(url, **params):
+    # Значения параметров — имена атрибутов контекста
+    return lambda ctx, i: ("GET", url, {"params": {
+        "limit": 100, **{name: getattr(ctx, attribute) for name, attribute in params.items()},
+    }})
+
+
+def _period(url):
+    return lambda ctx, i: ("GET", url, {"params": {
+        "limit": 100, "start_date": (ctx.end - timedelta(days=7)).isoformat(), "end_date": ctx.end.isoformat(),
+    }})
+
+
+# Сценарии бенчмарка эндпоинтов плюс варианты с фильтрами
+SCENARIOS = {
+    **ENDPOINT_SCENARIOS,
+    "get_dashboard": lambda ctx, i: ("GET", "/api/analytics/dashboard", {
+        "params": {**ctx.range, "sections": RANGE_SECTIONS},
+    }),
+    "get_dashboard:overview": lambda ctx, i: ("GET", "/api/analytics/dashboard", {"params": {"sections": "overview"}}),
+    "read_masters:salon": _list("/masters/", salon_id="salon_id"),
+    "read_clients:salon": _list("/clients/", salon_id="salon_id"),
+    "read_appointments:client": _list("/appointments/", client_id="client_id"),
+    "read_appointments:master": _list("/appointments/", master_id="master_id"),
+    "read_appointments:salon": _list("/appointments/", salon_id="salon_id"),
+    "read_appointments:period": _period("/appointments/"),
+}
+
+# Таблицы, которые растут вместе с бизнесом
+WATCHED = {"appointments", "clients", "masters", "appointment_daily_rollup", "master_payroll", "jobs"}
+
+# Сценарий -> таблицы, которые он по смыслу читает целиком
+ALLOWED = {
+    # Списки без фильтра: страница по первичному ключу
+    "read_masters": {"masters"},
+    "read_clients": {"clients"},
+    "read_appointments": {"appointments"},
+    # Счетчики и разбивки за все время
+    "get_analytics_overview": {"appointments", "masters", "clients"},
+    "get_dashboard:overview": {"appointments", "masters", "clients"},
+    "get_popular_services": {"appointments"},
+    "get_salons_stats": {"appointments"},
+    "get_masters_workload": {"masters"},
+    "get_peak_hours": {"appointments"},
+    "get_financial_overview": {"appointment_daily_rollup"},
+    "get_revenue_by_salon": {"appointment_daily_rollup"},
+    "get_revenue_by_service": {"appointment_daily_rollup"},
+    "get_master_earnings": {"master_payroll"},
+}
+
+# SQLite до 3.36 пишет SCAN TABLE <таблица>
+_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)")
+
+
+def query_plan(connection, statement, parameters):
+    """[(detail)] плана запроса."""
+    return [row[3] for row in connection.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+
+
+def scanned_tables(plan):
+    return {match.group(1) for detail in plan if (match := _SCAN.match(detail)) and match.group(1) in WATCHED}
+
+
+async def collect(app, context, statements, reset_caches):
+    """{сценарий: [(statement, parameters)]} — по одному вызову каждого сценария."""
+    captured = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://audit", timeout=None) as client:
+        for name, scenario in SCENARIOS.items():
+            method, url, kwargs = scenario(context, 0)
+            # Ответ из кэша не дошел бы до базы
+            reset_caches()
+            statements.clear()
+            response = await client.request(method, url, **kwargs)
+            if response.status_code >= 400 and response.status_code != 501:
+                print(f"{name}: HTTP {response.status_code}", file=sys.stderr)
+            captured[name] = list(statements)
+    return captured
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default=os.path.join(BACKEND_DIR, "salon.db"))
+    parser.add_argument("--generate", action="store_true", help="сгенерировать базу через generate_data.py")
+    parser.add_argument("--salons", default="50")
+    parser.add_argument("--masters", default="1000")
+    parser.add_argument("--appointments", default="50k")
+    parser.add_argument("--verbose", action="store_true", help="печатать планы всех запросов")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    database_path = os.path.join(workdir, "plans.db")
+    if args.generate:
+        subprocess.run([
+            sys.executable, os.path.join(BACKEND_DIR, "generate_data.py"), "--database", f"sqlite:///{database_path}",
+            "--salons", args.salons, "--masters", args.masters, "--appointments", args.appointments,
+        ], check=True, cwd=workdir)
+    else:
+        shutil.copy(args.database, database_path)
+    os.environ["DATABASE_URL"] = f"sqlite:///{database_path}"
+    os.environ["PAYROLL_WORKER"] = "0"
+
+    from sqlalchemy import event
+    import analytics_cache
+    import cache
+    import database
+    import main as api
+
+    os.chdir(workdir)
+    os.makedirs("uploads", exist_ok=True)
+    context = seed_fixtures(database.engine)
+
+    statements = []
+
+    @event.listens_for(database.engine, "before_cursor_execute")
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().split(None, 1)[0].upper() in ("SELECT", "WITH", "UPDATE", "DELETE"):
+            # executemany: план один на все наборы параметров
+            statements.append((statement, parameters[0] if executemany else parameters))
+
+    def reset_caches():
+        cache.catalog_cache.clear()
+        analytics_cache.invalidate_all()
+
+    captured = asyncio.run(collect(api.app, context, statements, reset_caches))
+
+    # Отдельное соединение: EXPLAIN не должен вмешиваться в транзакции приложения
+    connection = sqlite3.connect(database_path)
+    failures = []
+    for name, queries in captured.items():
+        allowed = ALLOWED.get(name, set())
+        seen = set()
+        for statement, parameters in queries:
+            if statement in seen:
+                continue
+            seen.add(statement)
+            plan = query_plan(connection, statement, parameters)
+            unexpected = scanned_tables(plan) - allowed
+            if unexpected:
+                failures.append((name, unexpected, statement, plan))
+            if args.verbose or unexpected:
+                mark = "!!" if unexpected else "  "
+                print(f"{mark} {name}: {' '.join(statement.split())[:200]}")
+                for detail in plan:
+                    print(f"       {detail}")
+    connection.close()
+
+    total = sum(len({statement for statement, _ in queries}) for queries in captured.values())
+    print(f"\nСценариев: {len(captured)}, разных запросов: {total}, с неразрешенным SCAN: {len(failures)}")
+    for name, tables, _, _ in failures:
+        print(f"  {name}: SCAN {', '.join(sorted(tables))}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
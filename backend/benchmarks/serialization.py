@@ -0,0 +1,121 @@
+"""Сериализация списков: ORM + Pydantic (до) против кортежей Core + orjson (после).
+
+Оба варианта идут через listing.list_page на одной временной базе: "до" —
+ORM-объекты и response_model=List[схема], "после" — schema=схема. Ответы
+сравниваются на равенство, время — медиана из --repeat прогонов.
+
+    python -m benchmarks.serialization --appointments 100000 --repeat 5
+"""
+import argparse
+from datetime import datetime, timedelta
+import json
+import os
+import statistics
+import tempfile
+import time
+from typing import List
+
+
+def seed(engine, appointments: int, masters: int, clients: int):
+    from sqlalchemy import insert
+    import models
+
+    models.Base.metadata.create_all(bind=engine)
+    base = datetime(2025, 1, 1, 9, 0)
+    with engine.begin() as connection:
+        connection.execute(insert(models.Salon), [
+            {"id": salon_id, "name": f"Salon {salon_id}", "address": "-", "lat": 55.75, "lon": 37.6}
+            for salon_id in range(1, 11)
+        ])
+        connection.execute(insert(models.Master), [
+            {"id": master_id, "name": f"Master {master_id}", "salon_id": master_id % 10 + 1, "hourly_rate": 300.0}
+            for master_id in range(1, masters + 1)
+        ])
+        connection.execute(insert(models.Client), [
+            {"id": client_id, "name": f"Client {client_id}", "phone": "-", "salon_id": client_id % 10 + 1}
+            for client_id in range(1, clients + 1)
+        ])
+        connection.execute(insert(models.Appointment), [
+            {
+                "master_id": number % masters + 1,
+                "client_id": number % clients + 1,
+                "service": "Стрижка",
+                "price": 1500.0,
+                "status": "completed",
+                "start_time": base + timedelta(hours=number // masters),
+                "end_time": base + timedelta(hours=number // masters, minutes=45),
+            }
+            for number in range(appointments)
+        ])
+
+
+def build_app(endpoints):
+    from fastapi import Depends, FastAPI, Response
+    from sqlalchemy.orm import Session
+    import listing
+    from main import get_db
+
+    def endpoint(model, schema=None):
+        def read(response: Response, db: Session = Depends(get_db)):
+            return listing.list_page(db, model, response, limit=None, schema=schema)
+        return read
+
+    app = FastAPI()
+    for path, model, schema in endpoints:
+        app.get(f"/before{path}", response_model=List[schema])(endpoint(model))
+        app.get(f"/after{path}", response_model=List[schema])(endpoint(model, schema))
+    return app
+
+
+def measure(client, url, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(url)
+        timings.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise SystemExit(f"{url}: HTTP {response.status_code}")
+    return statistics.median(timings), response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--appointments", type=int, default=100_000)
+    parser.add_argument("--masters", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "serialization.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+
+    from fastapi.testclient import TestClient
+    import database
+    import listing
+    import models
+    import schemas
+
+    seed(database.engine, args.appointments, args.masters, args.clients)
+    endpoints = [
+        ("/salons/", models.Salon, schemas.Salon),
+        ("/masters/", models.Master, schemas.Master),
+        ("/clients/", models.Client, schemas.Client),
+        ("/appointments/", models.Appointment, schemas.Appointment),
+    ]
+    client = TestClient(build_app(endpoints))
+    print(f"orjson: {'да' if listing.HAS_ORJSON else 'нет (jsonable_encoder)'}")
+    print(f"{'эндпоинт':<16} {'строк':>8} {'до, мс':>9} {'после, мс':>10} {'ускорение':>10}")
+    for path, _, _ in endpoints:
+        # Прогрев: компиляция запросов и схем
+        client.get(f"/before{path}")
+        client.get(f"/after{path}")
+        before, old = measure(client, f"/before{path}", args.repeat)
+        after, new = measure(client, f"/after{path}", args.repeat)
+        if json.loads(old.content) != json.loads(new.content):
+            raise SystemExit(f"{path}: ответы до и после различаются")
+        rows = len(new.json())
+        print(f"{path:<16} {rows:>8} {before * 1000:>9.1f} {after * 1000:>10.1f} {before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
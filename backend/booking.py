@@ -0,0 +1,136 @@
+"""Бронирование без двойных записей.
+
+Внутри процесса записи к одному мастеру идут под threading-блокировкой.
+Между процессами гарантию дает база:
+
+- на серверных СУБД транзакция записи начинается с SELECT ... FOR UPDATE
+  строки мастера, так что бронирования одного мастера из разных воркеров
+  выполняются по очереди, и проверка видит уже закоммиченную запись
+  соседа (нужен уровень изоляции READ COMMITTED — по умолчанию в PostgreSQL);
+- в SQLite писатель один: после flush транзакция держит блокировку записи,
+  и повторная проверка видит все закоммиченные записи; если снимок устарел,
+  SQLite отвечает SQLITE_BUSY_SNAPSHOT, и запись повторяется с backoff.
+
+Массовая загрузка (bulk.py) пользуется теми же блокировками и повторами.
+"""
+from contextlib import contextmanager
+import random
+import threading
+import time
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+import availability
+import models
+
+MAX_RETRIES = 5
+RETRY_BACKOFF = 0.01
+
+
+class SlotConflict(Exception):
+    """Интервал пересекается с уже подтвержденной записью мастера."""
+
+    def __init__(self, appointment):
+        super().__init__(f"Master {appointment.master_id} is busy at {appointment.start_time}")
+        self.appointment = appointment
+
+
+class MasterLockManager:
+    """Отдельная блокировка на каждого мастера, записи к разным мастерам не ждут друг друга."""
+
+    def __init__(self):
+        self._guard = threading.Lock()
+        self._locks = {}
+
+    @contextmanager
+    def lock(self, master_id):
+        with self._guard:
+            master_lock = self._locks.setdefault(master_id, threading.Lock())
+        with master_lock:
+            yield
+
+
+locks = MasterLockManager()
+
+
+def _is_busy(status):
+    return status in availability.BUSY_STATUSES
+
+
+def lock_masters(db: Session, master_ids):
+    """SELECT ... FOR UPDATE строк мастеров в порядке id; начинает транзакцию записи к ним."""
+    master_ids = sorted({master_id for master_id in master_ids if master_id is not None})
+    # SQLite не знает FOR UPDATE, там порядок обеспечивает блокировка записи после flush
+    if master_ids and db.get_bind().dialect.name != "sqlite":
+        db.query(models.Master.id).filter(
+            models.Master.id.in_(master_ids)
+        ).order_by(models.Master.id).with_for_update().all()
+
+
+def is_retryable(error):
+    """Блокировка или устаревший снимок SQLite: транзакцию стоит повторить."""
+    return isinstance(error, OperationalError) and "locked" in str(error).lower()
+
+
+def backoff(attempt):
+    time.sleep(RETRY_BACKOFF * (2 ** attempt) * (1 + random.random()))
+
+
+def _check(db: Session, appointment):
+    conflict = availability.find_conflict(
+        db, appointment.master_id, appointment.start_time, appointment.end_time,
+        exclude_id=appointment.id
+    )
+    if conflict is not None:
+        raise SlotConflict(conflict)
+
+
+def _with_retries(db: Session, master_id, action):
+    for attempt in range(MAX_RETRIES):
+        try:
+            with locks.lock(master_id):
+                return action()
+        except OperationalError as error:
+            db.rollback()
+            if not is_retryable(error) or attempt == MAX_RETRIES - 1:
+                raise
+            backoff(attempt)
+        except SlotConflict:
+            db.rollback()
+            raise
+
+
+def book(db: Session, data: dict):
+    """Создает запись или бросает SlotConflict."""
+    def action():
+        appointment = models.Appointment(**data)
+        if _is_busy(appointment.status):
+            lock_masters(db, [appointment.master_id])
+            _check(db, appointment)
+        db.add(appointment)
+        db.flush()
+        if _is_busy(appointment.status):
+            # Повторная проверка под блокировкой записи SQLite: запись из другого процесса
+            _check(db, appointment)
+        db.commit()
+        db.refresh(appointment)
+        return appointment
+
+    return _with_retries(db, data.get("master_id"), action)
+
+
+def change_status(db: Session, appointment, status: str):
+    """Меняет статус; возврат в подтвержденные проверяет пересечения."""
+    def action():
+        if _is_busy(status):
+            lock_masters(db, [appointment.master_id])
+        appointment.status = status
+        if _is_busy(status):
+            db.flush()
+            _check(db, appointment)
+        db.commit()
+        db.refresh(appointment)
+        return appointment
+
+    return _with_retries(db, appointment.master_id, action)
@@ -0,0 +1,365 @@
+"""Массовая загрузка записей, клиентов и мастеров.
+
+POST /appointments/bulk, /clients/bulk, /masters/bulk принимают JSON-массив
+или поток NDJSON (Content-Type: application/x-ndjson) объектов *Create.
+Строки проверяются и вставляются пачками по BULK_CHUNK_SIZE одним
+executemany, каждая пачка — в своей транзакции. Ошибочные строки не
+прерывают загрузку и возвращаются в errors с индексом строки во входных
+данных.
+
+Записи к мастерам сериализуются так же, как в booking.book: блокировки
+мастеров в процессе, FOR UPDATE на серверных СУБД и повторная проверка
+пересечений после вставки; если параллельная запись успела занять
+интервал, пачка проверяется и вставляется заново.
+
+Вставка идет мимо ORM, поэтому rollup, пометки пересчета зарплаты, кэш
+аналитики и кэш справочников обновляются здесь явно.
+"""
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack
+import json
+import os
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+
+import analytics_cache
+import availability
+import booking
+import cache
+import models
+import payroll
+import rollup
+import schemas
+from database import SessionLocal
+
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+MAX_REPORTED_ERRORS = 1000
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+router = APIRouter()
+
+
+def _is_ndjson(request: Request):
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    return content_type in NDJSON_TYPES
+
+
+async def _raw_items(request: Request):
+    """Сырые объекты из тела запроса; NDJSON читается потоком, построчно."""
+    if not _is_ndjson(request):
+        try:
+            data = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+        if not isinstance(data, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+        for item in data:
+            yield item
+        return
+
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+
+def _describe(error: ValidationError):
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}" if detail["loc"] else detail["msg"]
+        for detail in error.errors()
+    )
+
+
+class BulkResult:
+    def __init__(self):
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+
+    def fail(self, index, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"index": index, "error": message})
+
+    def merge(self, other):
+        self.inserted += other.inserted
+        for error in other.errors:
+            self.fail(error["index"], error["error"])
+        self.failed += other.failed - len(other.errors)
+
+    def as_dict(self):
+        return {
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "errors": sorted(self.errors, key=lambda error: error["index"]),
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+class ConcurrentChange(Exception):
+    """Пока пачка проверялась, параллельная запись заняла проверенное — пачку нужно проверить заново."""
+
+
+class BulkLoader:
+    """Проверка и вставка пачки строк одной модели; наследники задают правила."""
+    model = None
+    schema = None
+
+    def check(self, db, rows, result):
+        """Возвращает допустимые (index, row), об остальных пишет в result."""
+        return rows
+
+    def locks(self, rows):
+        return []
+
+    def before_commit(self, db, rows):
+        pass
+
+    def recheck(self, db, rows):
+        """Проверка после вставки, под блокировкой записи; бросает ConcurrentChange."""
+
+    def after_commit(self, rows):
+        pass
+
+    def insert_chunk(self, rows, result: BulkResult):
+        for attempt in range(booking.MAX_RETRIES):
+            # Ошибки строк неудачной попытки не должны попасть в ответ дважды
+            attempt_result = BulkResult()
+            try:
+                self._insert_chunk(rows, attempt_result)
+            except (OperationalError, ConcurrentChange) as error:
+                if isinstance(error, OperationalError) and not booking.is_retryable(error):
+                    raise
+                if attempt < booking.MAX_RETRIES - 1:
+                    booking.backoff(attempt)
+                    continue
+                for index, _ in rows:
+                    result.fail(index, "Conflicted with concurrent writes, retry the row")
+                return
+            result.merge(attempt_result)
+            return
+
+    def _insert_chunk(self, rows, result: BulkResult):
+        db = SessionLocal()
+        try:
+            with ExitStack() as stack:
+                for lock in self.locks(rows):
+                    stack.enter_context(lock)
+                accepted = self.check(db, rows, result)
+                if not accepted:
+                    return
+                try:
+                    db.execute(insert(self.model), [row for _, row in accepted])
+                    self.before_commit(db, accepted)
+                    self.recheck(db, accepted)
+                    db.commit()
+                except SQLAlchemyError as error:
+                    # Блокировку и устаревший снимок повторяет insert_chunk всей пачкой
+                    if booking.is_retryable(error):
+                        raise
+                    db.rollback()
+                    accepted = self._insert_one_by_one(db, accepted, result)
+            result.inserted += len(accepted)
+            if accepted:
+                self.after_commit(accepted)
+        finally:
+            db.close()
+
+    def _insert_one_by_one(self, db, rows, result):
+        # Пачка не прошла целиком — ищем виноватые строки через savepoint
+        inserted = []
+        for index, row in rows:
+            try:
+                with db.begin_nested():
+                    db.execute(insert(self.model), [row])
+                    self.before_commit(db, [(index, row)])
+                inserted.append((index, row))
+            except SQLAlchemyError as error:
+                if booking.is_retryable(error):
+                    raise
+                result.fail(index, str(error.orig if hasattr(error, "orig") else error))
+        self.recheck(db, inserted)
+        db.commit()
+        return inserted
+
+    async def load(self, request: Request):
+        result = BulkResult()
+        chunk = []
+        index = -1
+        async for item in _raw_items(request):
+            index += 1
+            try:
+                if isinstance(item, bytes):
+                    validated = self.schema.model_validate_json(item)
+                else:
+                    validated = self.schema.model_validate(item)
+            except ValidationError as error:
+                result.fail(index, _describe(error))
+                continue
+            chunk.append((index, validated.model_dump()))
+            if len(chunk) >= BULK_CHUNK_SIZE:
+                await run_in_threadpool(self.insert_chunk, chunk, result)
+                chunk = []
+        if chunk:
+            await run_in_threadpool(self.insert_chunk, chunk, result)
+        return result.as_dict()
+
+
+def _existing_ids(db, model, ids):
+    ids = {value for value in ids if value is not None}
+    if not ids:
+        return set()
+    return {row_id for (row_id,) in db.query(model.id).filter(model.id.in_(ids)).all()}
+
+
+class AppointmentLoader(BulkLoader):
+    model = models.Appointment
+    schema = schemas.AppointmentCreate
+
+    def locks(self, rows):
+        # Те же блокировки мастеров, что и у одиночной записи; по порядку id — без взаимоблокировок
+        return [booking.locks.lock(master_id) for master_id in sorted({row["master_id"] for _, row in rows})]
+
+    def check(self, db, rows, result):
+        # Как booking.book: FOR UPDATE мастеров на серверных СУБД до проверки
+        booking.lock_masters(db, (row["master_id"] for _, row in rows))
+        master_salons = dict(db.query(models.Master.id, models.Master.salon_id).filter(
+            models.Master.id.in_({row["master_id"] for _, row in rows})
+        ).all())
+        clients = _existing_ids(db, models.Client, (row["client_id"] for _, row in rows))
+        busy = [row for _, row in rows if row["status"] in availability.BUSY_STATUSES]
+        schedules = availability.load_schedules(
+            db,
+            {row["master_id"] for row in busy if row["master_id"] in master_salons},
+            min(row["start_time"] for row in busy),
+            max(row["end_time"] for row in busy)
+        ) if busy else {}
+
+        accepted = []
+        for index, row in rows:
+            error = availability.interval_error(row["start_time"], row["end_time"])
+            if error:
+                result.fail(index, error)
+            elif row["master_id"] not in master_salons:
+                result.fail(index, f"Master {row['master_id']} not found")
+            elif row["client_id"] not in clients:
+                result.fail(index, f"Client {row['client_id']} not found")
+            elif row["status"] in availability.BUSY_STATUSES and not schedules[row["master_id"]].is_free(
+                row["start_time"], row["end_time"]
+            ):
+                result.fail(index, f"Master {row['master_id']} is busy at {row['start_time']}")
+            else:
+                if row["status"] in availability.BUSY_STATUSES:
+                    schedules[row["master_id"]].add(row["start_time"], row["end_time"])
+                accepted.append((index, row))
+        self.master_salons = master_salons
+        return accepted
+
+    def before_commit(self, db, rows):
+        deltas = defaultdict(lambda: [0, 0.0])
+        for _, row in rows:
+            key = (
+                row["start_time"].date(), self.master_salons[row["master_id"]],
+                row["master_id"], row["service"], row["status"]
+            )
+            deltas[key][0] += 1
+            deltas[key][1] += row["price"] or 0.0
+        rollup.apply_deltas(db.connection(), deltas)
+        payroll.mark_dirty(db.connection(), {
+            (row["master_id"], row["start_time"].date())
+            for _, row in rows if row["status"] in payroll.PAYROLL_STATUSES
+        })
+
+    def recheck(self, db, rows):
+        # Повторная проверка, как в booking.book: запись из другого процесса могла
+        # закоммититься между check и вставкой; своя строка пересекает саму себя
+        busy = [row for _, row in rows if row["status"] in availability.BUSY_STATUSES]
+        if not busy:
+            return
+        first_start = min(row["start_time"] for row in busy) - availability.MAX_APPOINTMENT_DURATION
+        intervals = defaultdict(list)
+        for master_id, start_time, end_time in db.query(
+            models.Appointment.master_id, models.Appointment.start_time, models.Appointment.end_time
+        ).filter(
+            models.Appointment.master_id.in_({row["master_id"] for row in busy}),
+            models.Appointment.start_time >= first_start,
+            models.Appointment.start_time < max(row["end_time"] for row in busy),
+            models.Appointment.status.in_(availability.BUSY_STATUSES)
+        ).order_by(models.Appointment.start_time):
+            intervals[master_id].append((start_time, end_time or start_time + availability.DEFAULT_DURATION))
+        starts = {master_id: [start for start, _ in items] for master_id, items in intervals.items()}
+        for row in busy:
+            master_starts = starts[row["master_id"]]
+            candidates = intervals[row["master_id"]][
+                bisect_left(master_starts, row["start_time"] - availability.MAX_APPOINTMENT_DURATION):
+                bisect_left(master_starts, row["end_time"])
+            ]
+            if sum(end > row["start_time"] for _, end in candidates) > 1:
+                raise ConcurrentChange()
+
+    def after_commit(self, rows):
+        analytics_cache.invalidate_times(row["start_time"] for _, row in rows)
+        payroll.wake()
+
+
+class ClientLoader(BulkLoader):
+    model = models.Client
+    schema = schemas.ClientCreate
+
+    def check(self, db, rows, result):
+        salons = _existing_ids(db, models.Salon, (row["salon_id"] for _, row in rows))
+        users = _existing_ids(db, models.User, (row["user_id"] for _, row in rows))
+        accepted = []
+        for index, row in rows:
+            if row["salon_id"] not in salons:
+                result.fail(index, f"Salon {row['salon_id']} not found")
+            elif row["user_id"] is not None and row["user_id"] not in users:
+                result.fail(index, f"User {row['user_id']} not found")
+            else:
+                accepted.append((index, row))
+        return accepted
+
+
+class MasterLoader(BulkLoader):
+    model = models.Master
+    schema = schemas.MasterCreate
+
+    def check(self, db, rows, result):
+        salons = _existing_ids(db, models.Salon, (row["salon_id"] for _, row in rows))
+        accepted = []
+        for index, row in rows:
+            if row["salon_id"] not in salons:
+                result.fail(index, f"Salon {row['salon_id']} not found")
+            else:
+                accepted.append((index, row))
+        return accepted
+
+    def after_commit(self, rows):
+        cache.catalog_cache.invalidate(
+            "masters", *{f"salon:{row['salon_id']}" for _, row in rows}
+        )
+
+
+@router.post("/appointments/bulk")
+async def bulk_create_appointments(request: Request):
+    return await AppointmentLoader().load(request)
+
+
+@router.post("/clients/bulk")
+async def bulk_create_clients(request: Request):
+    return await ClientLoader().load(request)
+
+
+@router.post("/masters/bulk")
+async def bulk_create_masters(request: Request):
+    return await MasterLoader().load(request)
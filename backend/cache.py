@@ -0,0 +1,181 @@
+"""Кэш в памяти процесса: LRU + TTL с инвалидацией по тегам.
+
+Ответы справочных эндпоинтов кэшируются middleware целиком (тело и
+заголовки) и отдаются с ETag/Cache-Control; If-None-Match дает 304.
+Пишущие эндпоинты после commit вызывают invalidate(тег).
+"""
+from collections import OrderedDict
+import hashlib
+import os
+import re
+import threading
+import time
+
+from starlette.responses import Response
+
+
+class LRUCache:
+    """LRU с необязательным TTL и тегами для точечной инвалидации."""
+
+    def __init__(self, max_entries=1024, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._generations = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "expired": 0}
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self.stats["misses"] += 1
+                return None
+            value, tags, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return value
+
+    def snapshot(self, tags=()):
+        """Поколения тегов до вычисления значения — см. set()."""
+        with self._lock:
+            return self._epoch, {tag: self._generations.get(tag, 0) for tag in tags}
+
+    def set(self, key, value, tags=(), snapshot=None, ttl=None):
+        """Сохраняет значение; если теги инвалидированы после snapshot — не сохраняет."""
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            if snapshot is not None and self._is_stale(snapshot):
+                return False
+            if key in self._entries:
+                self._remove(key)
+            expires_at = time.monotonic() + ttl if ttl else None
+            self._entries[key] = (value, tuple(tags), expires_at)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+            return True
+
+    def invalidate(self, *tags):
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+                    self.stats["invalidations"] += 1
+
+    def invalidate_where(self, predicate):
+        """Удаляет записи, для ключа которых predicate(key) истинен."""
+        with self._lock:
+            self._epoch += 1
+            for key in [key for key in self._entries if predicate(key)]:
+                self._remove(key)
+                self.stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._tags.clear()
+
+    def info(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), max_entries=self.max_entries)
+
+    def _is_stale(self, snapshot):
+        epoch, generations = snapshot
+        return epoch != self._epoch or any(
+            self._generations.get(tag, 0) != generation for tag, generation in generations.items()
+        )
+
+    def _remove(self, key):
+        _, tags, _ = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "300"))
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "1024"))
+CATALOG_CLIENT_MAX_AGE = int(os.getenv("CATALOG_CLIENT_MAX_AGE", "0"))
+
+catalog_cache = LRUCache(max_entries=CATALOG_CACHE_SIZE, ttl=CATALOG_CACHE_TTL)
+
+
+class ResponseCacheRule:
+    """Путь (регулярное выражение) -> теги; группы подставляются в теги через format."""
+
+    def __init__(self, pattern, *tags):
+        self.pattern = re.compile(pattern)
+        self.tags = tags
+
+    def match(self, path):
+        found = self.pattern.fullmatch(path)
+        if found is None:
+            return None
+        return tuple(tag.format(*found.groups()) for tag in self.tags)
+
+
+def _etag(body: bytes):
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def _not_modified(request, etag):
+    candidates = request.headers.get("if-none-match")
+    if not candidates:
+        return False
+    return candidates.strip() == "*" or etag in [value.strip() for value in candidates.split(",")]
+
+
+def _cached_response(request, entry):
+    status_code, body, headers, etag = entry
+    headers = dict(headers)
+    headers["ETag"] = etag
+    headers["Cache-Control"] = f"public, max-age={CATALOG_CLIENT_MAX_AGE}, must-revalidate"
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={
+            "ETag": etag, "Cache-Control": headers["Cache-Control"]
+        })
+    return Response(content=body, status_code=status_code, headers=headers)
+
+
+def response_cache_middleware(cache: LRUCache, rules):
+    """Middleware для app.middleware("http"): кэширует успешные GET по правилам."""
+    async def middleware(request, call_next):
+        if request.method != "GET":
+            return await call_next(request)
+        tags = next((found for found in (rule.match(request.url.path) for rule in rules) if found), None)
+        if tags is None:
+            return await call_next(request)
+
+        key = f"{request.url.path}?{'&'.join(sorted(request.url.query.split('&')))}"
+        entry = cache.get(key)
+        if entry is not None:
+            return _cached_response(request, entry)
+
+        snapshot = cache.snapshot(tags)
+        response = await call_next(request)
+        if response.status_code != 200:
+            return response
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        headers = [
+            (name, value) for name, value in response.headers.items()
+            if name.lower() not in ("content-length", "etag", "cache-control")
+        ]
+        entry = (response.status_code, body, headers, _etag(body))
+        cache.set(key, entry, tags, snapshot)
+        return _cached_response(request, entry)
+
+    return middleware
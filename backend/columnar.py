@@ -0,0 +1,452 @@
+"""Колоночный движок аналитики в памяти (NumPy).
+
+ANALYTICS_ENGINE=columnar переключает разбивки выручки, filtered-* и
+зарплату на массивы в памяти процесса: записи загружаются один раз
+(время, мастер, коды услуги и статуса, цена, минуты), салон берется из
+таблицы мастер -> салон, а выборка за период — векторные маски и
+bincount без запроса к БД на каждую смену дат в дашборде.
+
+Синхронизация:
+- новые записи дочитываются перед каждым запросом (id > последнего
+  загруженного) — это ловит и ORM, и bulk, и другие процессы. На серверных
+  СУБД id из последовательности коммитятся не по порядку, поэтому там
+  перечитываются и последние COLUMNAR_SYNC_WINDOW id: запись, закоммиченная
+  позже соседки с большим id, вставляется на свое место;
+- изменения и удаления через ORM этого процесса применяются после commit;
+- мастера (салон, ставка) перечитываются после их изменения;
+- раз в COLUMNAR_RELOAD_SECONDS все перечитывается целиком. Новый набор
+  массивов строится вне блокировки — запросы тем временем идут по старому.
+
+Между воркерами движок согласован в конечном счете: изменения и удаления,
+сделанные другими процессами, и записи, опоздавшие больше чем на окно,
+видны после очередной полной перезагрузки.
+
+Без numpy движок не включается (предупреждение в лог, работает SQL).
+"""
+from datetime import date
+import importlib.util
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import String, event, select, type_coerce
+from sqlalchemy.orm import Session
+
+import models
+
+ANALYTICS_ENGINE = os.getenv("ANALYTICS_ENGINE", "sql")
+COLUMNAR_RELOAD_SECONDS = float(os.getenv("COLUMNAR_RELOAD_SECONDS", "300"))
+COLUMNAR_SYNC_WINDOW = int(os.getenv("COLUMNAR_SYNC_WINDOW", "1000"))
+LOAD_CHUNK_SIZE = 100_000
+
+HAS_NUMPY = importlib.util.find_spec("numpy") is not None
+ENABLED = ANALYTICS_ENGINE == "columnar" and HAS_NUMPY
+
+log = logging.getLogger("columnar")
+if ANALYTICS_ENGINE == "columnar" and not HAS_NUMPY:
+    log.warning("ANALYTICS_ENGINE=columnar requires numpy; falling back to SQL")
+
+_CHANGES = "columnar_changes"
+
+
+class Categories:
+    """Словарь значение <-> код для категориальной колонки."""
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class ColumnStore:
+    """Записи в колонках NumPy; ёмкость растет удвоением, как у списка."""
+
+    def __init__(self):
+        import numpy as np
+
+        self.np = np
+        self.size = 0
+        self.last_id = 0
+        self.services = Categories()
+        self.statuses = Categories()
+        self.columns = {
+            "id": np.zeros(0, dtype=np.int64),
+            "start": np.zeros(0, dtype="datetime64[us]"),
+            "master": np.zeros(0, dtype=np.int32),
+            "service": np.zeros(0, dtype=np.int32),
+            "status": np.zeros(0, dtype=np.int32),
+            "price": np.zeros(0, dtype=np.float64),
+            "minutes": np.zeros(0, dtype=np.float64),
+            "alive": np.zeros(0, dtype=bool),
+        }
+        self.master_salon = np.zeros(1, dtype=np.int32)
+        self.master_rate = np.zeros(1, dtype=np.float64)
+        self.master_known = np.zeros(1, dtype=bool)
+        self.masters_stale = True
+        self.loaded_at = 0.0
+
+    def __getattr__(self, name):
+        # self.start, self.price, ... — заполненная часть колонки
+        columns = self.__dict__.get("columns")
+        if columns is not None and name in columns:
+            return columns[name][:self.size]
+        raise AttributeError(name)
+
+    # Загрузка
+
+    def _query(self):
+        appointment = models.Appointment
+        # Строки времени без разбора в datetime: NumPy разбирает их сам и быстрее
+        return select(
+            appointment.id,
+            type_coerce(appointment.start_time, String),
+            type_coerce(appointment.end_time, String),
+            appointment.master_id,
+            appointment.service,
+            appointment.status,
+            appointment.price,
+        ).order_by(appointment.id)
+
+    def _reserve(self, extra):
+        needed = self.size + extra
+        capacity = len(self.columns["id"])
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 1024)
+        for name, column in self.columns.items():
+            grown = self.np.zeros(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self.columns[name] = grown
+
+    def _append(self, rows):
+        np = self.np
+        count = len(rows)
+        if not count:
+            return
+        self._reserve(count)
+        ids, starts, ends, masters, services, statuses, prices = zip(*rows)
+        start = np.array(starts, dtype="datetime64[us]")
+        end = np.array(ends, dtype="datetime64[us]")
+        minutes = (end - start).astype("timedelta64[us]").astype(np.float64) / 60e6
+        chunk = {
+            "id": np.array(ids, dtype=np.int64),
+            "start": start,
+            "master": np.array([master or 0 for master in masters], dtype=np.int32),
+            "service": np.fromiter((self.services.code(value) for value in services), dtype=np.int32, count=count),
+            "status": np.fromiter((self.statuses.code(value) for value in statuses), dtype=np.int32, count=count),
+            "price": np.array([price or 0.0 for price in prices], dtype=np.float64),
+            # Пустые и перевернутые интервалы — 0 минут, как в payroll
+            "minutes": np.nan_to_num(np.clip(minutes, 0, None)),
+            "alive": np.ones(count, dtype=bool),
+        }
+        for name, values in chunk.items():
+            self.columns[name][self.size:self.size + count] = values
+        self.size += count
+        self.last_id = max(self.last_id, int(chunk["id"].max()))
+        if int(chunk["master"].max()) >= len(self.master_known):
+            self.masters_stale = True
+
+    def _load_masters(self, connection):
+        np = self.np
+        rows = connection.execute(select(models.Master.id, models.Master.salon_id, models.Master.hourly_rate)).all()
+        length = max([master_id for master_id, _, _ in rows] + [int(self.master.max()) if self.size else 0]) + 1
+        self.master_salon = np.zeros(length, dtype=np.int32)
+        self.master_rate = np.zeros(length, dtype=np.float64)
+        self.master_known = np.zeros(length, dtype=bool)
+        for master_id, salon_id, hourly_rate in rows:
+            self.master_salon[master_id] = salon_id or 0
+            self.master_rate[master_id] = hourly_rate or 0.0
+            self.master_known[master_id] = True
+        self.masters_stale = False
+
+    def load(self, connection):
+        result = connection.execution_options(yield_per=LOAD_CHUNK_SIZE).execute(self._query())
+        for rows in result.partitions():
+            self._append(rows)
+        self._load_masters(connection)
+        self.loaded_at = time.monotonic()
+
+    def sync(self, connection, window=0):
+        """Дочитывает новые записи и, если надо, таблицу мастеров.
+
+        window — сколько последних загруженных id перечитать: пропущенные
+        среди них (закоммиченные позже записей с большим id) вставляются по порядку.
+        """
+        np = self.np
+        rows = connection.execute(self._query().where(models.Appointment.id > self.last_id - window)).all()
+        if window and rows:
+            ids = np.array([row[0] for row in rows], dtype=np.int64)
+            positions = np.minimum(np.searchsorted(self.id, ids), max(self.size - 1, 0))
+            known = (self.id[positions] == ids) if self.size else np.zeros(len(ids), dtype=bool)
+            late = (ids <= self.last_id) & ~known
+            rows = [row for row, old in zip(rows, known) if not old]
+            self._append(rows)
+            if late.any():
+                # Редкий случай: восстанавливаем порядок id, на нем держится _position
+                order = np.argsort(self.id, kind="stable")
+                for name, column in self.columns.items():
+                    column[:self.size] = column[:self.size][order]
+        else:
+            self._append(rows)
+        if self.masters_stale:
+            self._load_masters(connection)
+
+    # Изменения из ORM
+
+    def _position(self, appointment_id):
+        position = int(self.np.searchsorted(self.id, appointment_id))
+        if position < self.size and self.id[position] == appointment_id:
+            return position
+        return None
+
+    def apply(self, changes):
+        np = self.np
+        for kind, appointment_id, values in changes:
+            position = self._position(appointment_id)
+            # Еще не загружена — дочитается из БД уже в новом виде
+            if position is None:
+                continue
+            if kind == "delete":
+                self.columns["alive"][position] = False
+                continue
+            start_time, end_time, master_id, service, status, price = values
+            start = np.datetime64(_naive(start_time), "us")
+            self.columns["start"][position] = start
+            minutes = (np.datetime64(_naive(end_time), "us") - start).astype(np.float64) / 60e6 if end_time else 0.0
+            self.columns["minutes"][position] = max(minutes, 0.0)
+            self.columns["master"][position] = master_id or 0
+            self.columns["service"][position] = self.services.code(service)
+            self.columns["status"][position] = self.statuses.code(status)
+            self.columns["price"][position] = price or 0.0
+            if (master_id or 0) >= len(self.master_known):
+                self.masters_stale = True
+
+    # Запросы
+
+    def _mask(self, start_dt=None, end_dt=None, statuses=None, salon_id=None):
+        np = self.np
+        mask = self.alive.copy()
+        if start_dt is not None:
+            mask &= self.start >= np.datetime64(_naive(start_dt), "us")
+        if end_dt is not None:
+            mask &= self.start <= np.datetime64(_naive(end_dt), "us")
+        if statuses is not None:
+            codes = [self.statuses.codes[status] for status in statuses if status in self.statuses.codes]
+            mask &= np.isin(self.status, codes)
+        if salon_id is not None:
+            mask &= self.master_salon[self.master] == salon_id
+        return mask
+
+    def _key_column(self, name, mask):
+        if name == "master_id":
+            return self.master[mask]
+        if name == "salon_id":
+            return self.master_salon[self.master[mask]]
+        if name == "service":
+            return self.service[mask]
+        if name == "status":
+            return self.status[mask]
+        # Номер дня от 1970-01-01
+        return self.start[mask].astype("datetime64[D]").astype(self.np.int64)
+
+    def _decode(self, name, value):
+        if name in ("master_id", "salon_id"):
+            return int(value) or None
+        if name == "service":
+            return self.services.values[value]
+        if name == "status":
+            return self.statuses.values[value]
+        return date.fromordinal(date(1970, 1, 1).toordinal() + int(value))
+
+    def aggregate(self, group_by=(), start_dt=None, end_dt=None, statuses=None, salon_id=None):
+        """То же, что rollup.aggregate: {ключ группировки: [count, revenue]}."""
+        np = self.np
+        group_by = tuple(group_by)
+        mask = self._mask(start_dt, end_dt, statuses, salon_id)
+        if "day" in group_by:
+            mask &= ~np.isnat(self.start)
+        prices = self.price[mask]
+        if not group_by:
+            count = int(mask.sum())
+            return {(): [count, float(prices.sum())]} if count else {}
+
+        combined = np.zeros(len(prices), dtype=np.int64)
+        offsets, sizes = [], []
+        for name in group_by:
+            values = self._key_column(name, mask).astype(np.int64)
+            offset = int(values.min()) if len(values) else 0
+            size = int(values.max()) - offset + 1 if len(values) else 1
+            combined = combined * size + (values - offset)
+            offsets.append(offset)
+            sizes.append(size)
+
+        # Плотные ключи — прямой bincount, разреженные — через np.unique
+        if np.prod(sizes, dtype=np.float64) <= 1 << 20:
+            counts = np.bincount(combined, minlength=1)
+            revenue = np.bincount(combined, weights=prices, minlength=1)
+            present = np.flatnonzero(counts)
+            keys, counts, revenue = present, counts[present], revenue[present]
+        else:
+            keys, inverse = np.unique(combined, return_inverse=True)
+            counts = np.bincount(inverse)
+            revenue = np.bincount(inverse, weights=prices)
+
+        result = {}
+        for key, count, total in zip(keys.tolist(), counts.tolist(), revenue.tolist()):
+            parts = []
+            for name, offset, size in zip(reversed(group_by), reversed(offsets), reversed(sizes)):
+                key, code = divmod(key, size)
+                parts.append(self._decode(name, code + offset))
+            result[tuple(reversed(parts))] = [count, total]
+        return result
+
+    def payroll_totals(self, start_dt=None, end_dt=None, salon_id=None, statuses=("confirmed",)):
+        """То же, что payroll.totals: {master_id: [записей, минут, выручка, начислено]}."""
+        np = self.np
+        mask = self._mask(start_dt, end_dt, statuses, salon_id)
+        mask &= self.master_known[self.master]
+        masters = self.master[mask]
+        length = len(self.master_known)
+        counts = np.bincount(masters, minlength=length)
+        minutes = np.bincount(masters, weights=self.minutes[mask], minlength=length)
+        revenue = np.bincount(masters, weights=self.price[mask], minlength=length)
+        earnings = minutes / 60 * self.master_rate
+        return {
+            master_id: [int(counts[master_id]), float(minutes[master_id]), float(revenue[master_id]), float(earnings[master_id])]
+            for master_id in np.flatnonzero(counts).tolist()
+        }
+
+    @property
+    def nbytes(self):
+        return sum(column[:self.size].nbytes for column in self.columns.values())
+
+
+_store = None
+# _lock — доступ к массивам _store; _reload_lock — не больше одной полной загрузки
+_lock = threading.Lock()
+_reload_lock = threading.Lock()
+# Изменения, закоммиченные во время полной загрузки: применяются к новому набору
+_pending = None
+
+
+def _naive(value):
+    if value is not None and value.tzinfo is not None:
+        return value.replace(tzinfo=None)
+    return value
+
+
+def _apply_changes(target, changes):
+    if any(kind == "masters" for kind, _, _ in changes):
+        target.masters_stale = True
+    target.apply([change for change in changes if change[0] != "masters"])
+
+
+def _reload(db: Session, current):
+    """Загружает таблицу целиком в новый ColumnStore и подменяет им current."""
+    global _store, _pending
+    with _reload_lock:
+        # Пока ждали, другой поток уже перезагрузил
+        if _store is not current:
+            return
+        with _lock:
+            _pending = []
+        try:
+            fresh = ColumnStore()
+            fresh.load(db.connection())
+        except BaseException:
+            with _lock:
+                _pending = None
+            raise
+        with _lock:
+            _apply_changes(fresh, _pending)
+            _pending = None
+            _store = fresh
+    log.info("columnar store loaded: %d appointments, %.1f MB", fresh.size, fresh.nbytes / 1e6)
+
+
+def store(db: Session):
+    """Актуальный ColumnStore процесса; вызывать под _lock.
+
+    Первый вызов загружает таблицу целиком, просроченный набор
+    перезагружается вне _lock (см. _reload), дальше — дочитывание.
+    """
+    window = 0 if db.get_bind().dialect.name == "sqlite" else COLUMNAR_SYNC_WINDOW
+    _store.sync(db.connection(), window)
+    return _store
+
+
+def _ensure_loaded(db: Session):
+    current = _store
+    if current is None or time.monotonic() - current.loaded_at > COLUMNAR_RELOAD_SECONDS:
+        _reload(db, current)
+
+
+def aggregate(db: Session, group_by=(), start_dt=None, end_dt=None, statuses=None, salon_id=None):
+    _ensure_loaded(db)
+    with _lock:
+        return store(db).aggregate(group_by, start_dt, end_dt, statuses, salon_id)
+
+
+def payroll_totals(db: Session, start_dt=None, end_dt=None, salon_id=None):
+    _ensure_loaded(db)
+    with _lock:
+        return store(db).payroll_totals(start_dt, end_dt, salon_id)
+
+
+def reset():
+    global _store
+    with _reload_lock, _lock:
+        _store = None
+
+
+def _record(target, kind):
+    session = Session.object_session(target)
+    if session is None or (_store is None and _pending is None):
+        return
+    values = None
+    if kind != "delete":
+        values = (target.start_time, target.end_time, target.master_id, target.service, target.status, target.price)
+    session.info.setdefault(_CHANGES, []).append((kind, target.id, values))
+
+
+@event.listens_for(models.Appointment, "after_update")
+def _on_appointment_update(mapper, connection, target):
+    _record(target, "update")
+
+
+@event.listens_for(models.Appointment, "after_delete")
+def _on_appointment_delete(mapper, connection, target):
+    _record(target, "delete")
+
+
+@event.listens_for(models.Master, "after_insert")
+@event.listens_for(models.Master, "after_update")
+@event.listens_for(models.Master, "after_delete")
+def _on_master_change(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None and (_store is not None or _pending is not None):
+        session.info.setdefault(_CHANGES, []).append(("masters", None, None))
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    changes = session.info.pop(_CHANGES, None)
+    if not changes:
+        return
+    with _lock:
+        if _pending is not None:
+            _pending.extend(changes)
+        if _store is not None:
+            _apply_changes(_store, changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop(_CHANGES, None)
@@ -1,11 +1,106 @@
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./salon.db")
+
+# Асинхронные драйверы по умолчанию для async_app; ASYNC_DATABASE_URL задает URL явно
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+# Настройки пула соединений (для серверных СУБД)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") not in ("0", "false", "False")
+
+# PRAGMA для SQLite; DB_SQLITE_TUNED=0 возвращает настройки по умолчанию
+SQLITE_TUNED = os.getenv("DB_SQLITE_TUNED", "1") not in ("0", "false", "False")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("DB_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("DB_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("DB_SQLITE_CACHE_SIZE_KB", "65536"))
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./salon.db"
+def build_engine(url=SQLALCHEMY_DATABASE_URL, tuned=SQLITE_TUNED, asynchronous=False, **overrides):
+    """Создает движок под указанный URL: PRAGMA для SQLite, QueuePool для серверных БД."""
+    if asynchronous:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        factory = create_async_engine
+    else:
+        factory = create_engine
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite":
+        options = {"connect_args": {"check_same_thread": False}}
+        file_database = parsed.database not in (None, "", ":memory:")
+        if tuned and file_database:
+            options["connect_args"]["timeout"] = SQLITE_BUSY_TIMEOUT_MS / 1000
+            options["poolclass"] = AsyncAdaptedQueuePool if asynchronous else QueuePool
+            options["pool_size"] = DB_POOL_SIZE
+            options["max_overflow"] = DB_MAX_OVERFLOW
+            options["pool_timeout"] = DB_POOL_TIMEOUT
+        options.update(overrides)
+        sqlite_engine = factory(url, **options)
+        if tuned and file_database:
+            sync_engine = sqlite_engine.sync_engine if asynchronous else sqlite_engine
+            event.listen(sync_engine, "connect", _set_sqlite_pragmas)
+        return sqlite_engine
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+    options = {
+        "poolclass": AsyncAdaptedQueuePool if asynchronous else QueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    options.update(overrides)
+    return factory(url, **options)
+
+
+def async_database_url(url=SQLALCHEMY_DATABASE_URL):
+    explicit = os.getenv("ASYNC_DATABASE_URL")
+    if explicit:
+        return explicit
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver known for {parsed.drivername}, set ASYNC_DATABASE_URL")
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+engine = build_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
+
+_async_sessionmaker = None
+
+
+def get_async_sessionmaker():
+    """Асинхронная фабрика сессий; создается лениво, чтобы sync-режим не требовал aiosqlite."""
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+        async_engine = build_engine(async_database_url(), asynchronous=True)
+        _async_sessionmaker = async_sessionmaker(
+            async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=True
+        )
+    return _async_sessionmaker
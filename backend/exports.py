@@ -0,0 +1,261 @@
+"""Потоковая выгрузка данных аналитики.
+
+Строки читаются из БД порциями (yield_per) в отдельной сессии генератора —
+сессия из зависимости get_db закрывается до отправки тела ответа — и
+отдаются блоками фиксированного размера, так что память не растет с
+числом строк. При Accept-Encoding: gzip поток сжимается на лету.
+
+Колоночные форматы (Parquet, Arrow IPC) требуют pyarrow и пишутся
+пакетами по BATCH_ROWS строк: каждый пакет — отдельная row group.
+"""
+import csv
+import io
+import json
+import zlib
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+import models
+from database import SessionLocal
+
+CHUNK_SIZE = 64 * 1024
+YIELD_PER = 1000
+BATCH_ROWS = 50_000
+
+APPOINTMENT_EXPORT_HEADER = ['ID', 'Дата', 'Услуга', 'Цена', 'Статус', 'Мастер', 'Клиент', 'Салон']
+
+
+def appointment_export_query(db, start_dt=None, end_dt=None, salon_id=None):
+    """Записи с именами мастера, клиента и салона — общий набор для всех форматов выгрузки."""
+    query = db.query(
+        models.Appointment.id,
+        models.Appointment.start_time,
+        models.Appointment.end_time,
+        models.Appointment.service,
+        models.Appointment.price,
+        models.Appointment.status,
+        models.Master.name.label('master_name'),
+        models.Client.name.label('client_name'),
+        models.Salon.name.label('salon_name')
+    ).join(
+        models.Master, models.Appointment.master_id == models.Master.id
+    ).join(
+        models.Client, models.Appointment.client_id == models.Client.id
+    ).join(
+        models.Salon, models.Master.salon_id == models.Salon.id
+    )
+    if start_dt is not None:
+        query = query.filter(models.Appointment.start_time >= start_dt)
+    if end_dt is not None:
+        query = query.filter(models.Appointment.start_time <= end_dt)
+    if salon_id is not None:
+        query = query.filter(models.Master.salon_id == salon_id)
+    return query.order_by(models.Appointment.id).yield_per(YIELD_PER)
+
+
+def appointment_csv_rows(db, start_dt=None, end_dt=None, salon_id=None):
+    for apt in appointment_export_query(db, start_dt, end_dt, salon_id):
+        yield [
+            apt.id,
+            apt.start_time.strftime('%Y-%m-%d %H:%M'),
+            apt.service,
+            apt.price,
+            apt.status,
+            apt.master_name,
+            apt.client_name,
+            apt.salon_name
+        ]
+
+
+# Имена колонок колоночных выгрузок; service/status/salon_name — словарные
+COLUMNS = [
+    "id", "start_time", "end_time", "service", "price", "status",
+    "master_name", "client_name", "salon_name",
+]
+DICTIONARY_COLUMNS = ("service", "status", "salon_name")
+
+
+def _with_session(make_rows):
+    db = SessionLocal()
+    try:
+        yield from make_rows(db)
+    finally:
+        db.close()
+
+
+def ndjson_chunks(make_rows):
+    """NDJSON блоками по CHUNK_SIZE байт: по одному JSON-объекту на запись."""
+    buffer = io.StringIO()
+    for row in _with_session(make_rows):
+        record = dict(zip(COLUMNS, row))
+        for name in ("start_time", "end_time"):
+            if record[name] is not None:
+                record[name] = record[name].isoformat()
+        buffer.write(json.dumps(record, ensure_ascii=False))
+        buffer.write("\n")
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _DrainSink:
+    """Файлоподобный приемник: накопленные writer'ом байты забираются после каждого пакета."""
+
+    def __init__(self):
+        self._buffer = io.BytesIO()
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        self._buffer.write(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+
+def arrow_schema():
+    import pyarrow as pa
+
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ("id", pa.int64()),
+        ("start_time", pa.timestamp("us")),
+        ("end_time", pa.timestamp("us")),
+        ("service", dictionary),
+        ("price", pa.float64()),
+        ("status", dictionary),
+        ("master_name", pa.string()),
+        ("client_name", pa.string()),
+        ("salon_name", dictionary),
+    ])
+
+
+def arrow_batches(make_rows, schema):
+    """RecordBatch по BATCH_ROWS строк; словари растут от пакета к пакету (только добавление)."""
+    import pyarrow as pa
+
+    vocabularies = {name: {} for name in DICTIONARY_COLUMNS}
+
+    def build(columns):
+        arrays = []
+        for name, values in zip(COLUMNS, columns):
+            field = schema.field(name)
+            if name in vocabularies:
+                vocabulary = vocabularies[name]
+                codes = [
+                    None if value is None else vocabulary.setdefault(value, len(vocabulary))
+                    for value in values
+                ]
+                arrays.append(pa.DictionaryArray.from_arrays(
+                    pa.array(codes, type=pa.int32()), pa.array(list(vocabulary), type=pa.string())
+                ))
+            else:
+                arrays.append(pa.array(values, type=field.type))
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    columns = [[] for _ in COLUMNS]
+    for row in _with_session(make_rows):
+        for column, value in zip(columns, row):
+            column.append(value)
+        if len(columns[0]) >= BATCH_ROWS:
+            yield build(columns)
+            columns = [[] for _ in COLUMNS]
+    if columns[0]:
+        yield build(columns)
+
+
+def parquet_chunks(make_rows):
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema()
+    sink = _DrainSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    for batch in arrow_batches(make_rows, schema):
+        writer.write_batch(batch)
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+def arrow_ipc_chunks(make_rows):
+    import pyarrow as pa
+
+    schema = arrow_schema()
+    sink = _DrainSink()
+    options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+    writer = pa.ipc.new_stream(sink, schema, options=options)
+    for batch in arrow_batches(make_rows, schema):
+        writer.write_batch(batch)
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+def appointment_rows(db, start_dt=None, end_dt=None, salon_id=None):
+    for apt in appointment_export_query(db, start_dt, end_dt, salon_id):
+        yield (
+            apt.id, apt.start_time, apt.end_time, apt.service, apt.price, apt.status,
+            apt.master_name, apt.client_name, apt.salon_name
+        )
+
+
+def csv_chunks(header, make_rows):
+    """CSV блоками по CHUNK_SIZE байт; make_rows(db) получает собственную сессию."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for row in _with_session(make_rows):
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def accepts_gzip(request: Request):
+    return "gzip" in request.headers.get("accept-encoding", "").lower()
+
+
+def stream(chunks, media_type, filename, compress=False):
+    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+    if compress:
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    return StreamingResponse(chunks, media_type=media_type, headers=headers)
+
+
+def stream_csv(request: Request, header, make_rows, filename, gzip=True):
+    return stream(
+        csv_chunks(header, make_rows), "text/csv", filename,
+        compress=gzip and accepts_gzip(request)
+    )
@@ -0,0 +1,306 @@
+"""Генератор синтетических данных для нагрузочного тестирования.
+
+Данные строятся векторно на NumPy и пишутся пачками: для SQLite — напрямую
+executemany драйвера, для остальных СУБД — Core insert. Распределения
+приближены к реальным: часы пик, будни/выходные, доля услуг, цены по
+уровню салона, доля отмен. Один и тот же --seed с тем же --start дает
+одинаковую базу.
+
+    python generate_data.py --salons 500 --masters 10000 --appointments 20M --seed 1
+    python generate_data.py --database sqlite:///./load.db --appointments 1M
+
+По умолчанию пишет в sqlite:///./synthetic.db, salon.db не трогает.
+Id продолжают существующие, rollup аналитики и зарплата в конце перестраиваются.
+"""
+import argparse
+from datetime import date, timedelta
+import time
+
+import numpy as np
+from sqlalchemy import func, insert
+from sqlalchemy.orm import sessionmaker
+
+import migrations
+import models
+import payroll
+import rollup
+from database import build_engine
+
+SERVICES = [
+    # услуга, базовая цена, длительность (мин), доля в спросе
+    ("Стрижка", 1500, 45, 0.25),
+    ("Окрашивание", 3500, 60, 0.12),
+    ("Укладка", 1200, 30, 0.12),
+    ("Маникюр", 1800, 45, 0.18),
+    ("Педикюр", 2000, 60, 0.10),
+    ("SPA-уход", 4500, 60, 0.05),
+    ("Мелирование", 4000, 60, 0.07),
+    ("Химическая завивка", 5000, 60, 0.03),
+    ("Кератиновое выпрямление", 6000, 60, 0.08),
+]
+
+# Часовые слоты 9:00-20:00: пик в обед и после работы
+FIRST_HOUR = 9
+HOUR_WEIGHTS = np.array([3, 5, 7, 8, 7, 6, 6, 8, 10, 10, 8, 5], dtype=float)
+
+# Пн..Вс
+WEEKDAY_WEIGHTS = np.array([0.8, 0.9, 1.0, 1.0, 1.2, 1.4, 0.7])
+
+CITIES = [
+    # центр, доля салонов
+    (55.7558, 37.6173, 0.45),
+    (59.9343, 30.3351, 0.25),
+    (55.7963, 49.1088, 0.10),
+    (56.8389, 60.6057, 0.10),
+    (55.0084, 82.9357, 0.10),
+]
+
+FIRST_NAMES = ["Анна", "Мария", "Елена", "Ольга", "Татьяна", "Наталья", "Ирина", "Екатерина",
+               "Светлана", "Юлия", "Дарья", "Алиса", "София", "Виктория", "Ксения", "Полина"]
+LAST_NAMES = ["Иванова", "Петрова", "Сидорова", "Смирнова", "Козлова", "Волкова", "Соколова",
+              "Морозова", "Новикова", "Павлова", "Зайцева", "Белова", "Кузнецова", "Васильева"]
+SPECIALIZATIONS = ["Парикмахер-стилист", "Колорист", "Мастер маникюра", "Мастер педикюра",
+                   "Косметолог", "SPA-терапевт"]
+
+BATCH_DAYS = 7
+MAX_RESAMPLE_ROUNDS = 5
+
+
+def parse_count(value: str):
+    """20M, 500k, 1_000 -> int."""
+    value = value.strip().replace("_", "").lower()
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(value[-1:], 1)
+    if multiplier != 1:
+        value = value[:-1]
+    return int(float(value) * multiplier)
+
+
+def _next_id(connection, model):
+    return (connection.execute(func.max(model.id).select()).scalar() or 0) + 1
+
+
+def _write(connection, table, columns, rows, sqlite):
+    """rows — список кортежей в порядке columns."""
+    if not rows:
+        return
+    if sqlite:
+        placeholders = ", ".join("?" for _ in columns)
+        cursor = connection.connection.driver_connection.cursor()
+        cursor.executemany(
+            f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({placeholders})", rows
+        )
+        cursor.close()
+    else:
+        connection.execute(insert(table), [dict(zip(columns, row)) for row in rows])
+
+
+def _names(rng, count):
+    first = np.array(FIRST_NAMES)[rng.integers(len(FIRST_NAMES), size=count)]
+    last = np.array(LAST_NAMES)[rng.integers(len(LAST_NAMES), size=count)]
+    return [f"{a} {b}" for a, b in zip(first.tolist(), last.tolist())]
+
+
+def generate_salons(rng, count, first_id):
+    weights = np.array([city[2] for city in CITIES])
+    city = rng.choice(len(CITIES), size=count, p=weights / weights.sum())
+    centers = np.array([city[:2] for city in CITIES])[city]
+    coordinates = centers + rng.normal(0, 0.08, size=(count, 2))
+    ids = np.arange(first_id, first_id + count)
+    # Уровень цен салона: множитель к базовой цене услуги
+    price_level = np.clip(rng.lognormal(0, 0.2, size=count), 0.6, 2.0)
+    rows = [
+        (salon_id, f"Салон №{salon_id}", f"ул. Синтетическая, д. {salon_id}", lat, lon, "")
+        for salon_id, (lat, lon) in zip(ids.tolist(), coordinates.round(6).tolist())
+    ]
+    return ids, price_level, rows
+
+
+def generate_masters(rng, count, first_id, salon_ids):
+    # Крупные сети и небольшие салоны: размер салона из логнормального распределения
+    sizes = rng.lognormal(0, 0.7, size=len(salon_ids))
+    salon_index = rng.choice(len(salon_ids), size=count, p=sizes / sizes.sum())
+    ids = np.arange(first_id, first_id + count)
+    rates = np.clip(rng.normal(330, 45, size=count), 200, 600).round(-1)
+    specialization = rng.integers(len(SPECIALIZATIONS), size=count)
+    experience = rng.integers(1, 16, size=count)
+    rows = [
+        (master_id, name, int(salon_ids[salon]), SPECIALIZATIONS[spec], f"{years}+ лет", "", rate)
+        for master_id, name, salon, spec, years, rate in zip(
+            ids.tolist(), _names(rng, count), salon_index.tolist(), specialization.tolist(),
+            experience.tolist(), rates.tolist()
+        )
+    ]
+    return ids, salon_index, rows
+
+
+def generate_clients(rng, count, first_id, salon_ids):
+    ids = np.arange(first_id, first_id + count)
+    salon_index = rng.integers(len(salon_ids), size=count)
+    phones = rng.integers(0, 10 ** 9, size=count)
+    rows = [
+        (client_id, name, f"+7 (9{phone // 10 ** 7:02d}) {phone // 10 ** 4 % 1000:03d}-"
+                          f"{phone // 100 % 100:02d}-{phone % 100:02d}", int(salon_ids[salon]), None)
+        for client_id, name, salon, phone in zip(
+            ids.tolist(), _names(rng, count), salon_index.tolist(), phones.tolist()
+        )
+    ]
+    return ids, rows
+
+
+def _sample_appointments(rng, count, days, day_weights, master_weights):
+    day = rng.choice(days, size=count, p=day_weights)
+    master = rng.choice(len(master_weights), size=count, p=master_weights)
+    hour = rng.choice(len(HOUR_WEIGHTS), size=count, p=HOUR_WEIGHTS / HOUR_WEIGHTS.sum())
+    return day, master, hour
+
+
+def generate_appointment_batches(rng, total, start: date, days_count, master_ids, master_salon,
+                                 salon_price_level, client_ids, cancel_rate):
+    """Пачки записей по BATCH_DAYS дней — колонки numpy, без id.
+
+    У мастера в один час не больше одной записи — дубли отбрасываются и
+    досэмплируются, так что подтвержденные записи не пересекаются.
+    """
+    day_numbers = np.arange(days_count)
+    weekday = (np.datetime64(start, "D") + day_numbers).astype("datetime64[D]").view("int64")
+    # 1970-01-01 — четверг
+    weekday_weights = WEEKDAY_WEIGHTS[(weekday + 3) % 7]
+    master_weights = rng.lognormal(0, 0.5, size=len(master_ids))
+    master_weights /= master_weights.sum()
+    service_weights = np.array([service[3] for service in SERVICES])
+    service_weights /= service_weights.sum()
+    base_prices = np.array([service[1] for service in SERVICES], dtype=float)
+    durations = np.array([service[2] for service in SERVICES], dtype="timedelta64[m]")
+    start_day = np.datetime64(start, "m")
+    slots = len(HOUR_WEIGHTS)
+
+    for batch_start in range(0, days_count, BATCH_DAYS):
+        days = day_numbers[batch_start:batch_start + BATCH_DAYS]
+        weights = weekday_weights[days]
+        target = int(round(total * weights.sum() / weekday_weights.sum()))
+        keys = np.empty(0, dtype=np.int64)
+        for _ in range(MAX_RESAMPLE_ROUNDS):
+            missing = target - len(keys)
+            if missing <= 0:
+                break
+            day, master, hour = _sample_appointments(
+                rng, int(missing * 1.1) + 1, days, weights / weights.sum(), master_weights
+            )
+            candidates = (day.astype(np.int64) * len(master_ids) + master) * slots + hour
+            keys = np.concatenate([keys, candidates])
+            _, first = np.unique(keys, return_index=True)
+            keys = keys[np.sort(first)][:target]
+        keys.sort()
+
+        hour = keys % slots
+        master = keys // slots % len(master_ids)
+        day = keys // slots // len(master_ids)
+        count = len(keys)
+        service = rng.choice(len(SERVICES), size=count, p=service_weights)
+        level = salon_price_level[master_salon[master]]
+        price = (base_prices[service] * level * rng.lognormal(0, 0.05, size=count)).round(-1)
+        cancelled = rng.random(count) < cancel_rate
+        start_time = (
+            start_day + day.astype("timedelta64[D]") + (hour + FIRST_HOUR).astype("timedelta64[h]")
+        )
+        end_time = start_time + durations[service]
+        yield {
+            "master_id": master_ids[master],
+            "client_id": client_ids[rng.integers(len(client_ids), size=count)],
+            "start_time": start_time,
+            "end_time": end_time,
+            "service": service,
+            "price": price,
+            "cancelled": cancelled,
+        }
+
+
+def _datetime_strings(values):
+    # Формат, в котором SQLAlchemy хранит DateTime в SQLite
+    return np.char.replace(np.datetime_as_string(values, unit="us"), "T", " ").tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default="sqlite:///./synthetic.db")
+    parser.add_argument("--salons", type=parse_count, default=500)
+    parser.add_argument("--masters", type=parse_count, default=10_000)
+    parser.add_argument("--clients", type=parse_count, default=None, help="по умолчанию appointments / 20")
+    parser.add_argument("--appointments", type=parse_count, default=1_000_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--start", type=date.fromisoformat, default=None,
+                        help="первый день; по умолчанию так, чтобы последние 30 дней были в будущем")
+    parser.add_argument("--cancel-rate", type=float, default=0.12)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    start = args.start or date.today() - timedelta(days=args.days - 30)
+    clients_count = args.clients or max(1, args.appointments // 20)
+    capacity = args.masters * args.days * len(HOUR_WEIGHTS)
+    if args.appointments > capacity * 0.6:
+        raise SystemExit(
+            f"{args.appointments} записей на {args.masters} мастеров за {args.days} дней — "
+            f"больше 60% всех слотов ({capacity}); увеличьте --masters или --days"
+        )
+
+    rng = np.random.default_rng(args.seed)
+    engine = build_engine(args.database)
+    sqlite = engine.dialect.name == "sqlite"
+    migrations.upgrade(engine)
+    started = time.perf_counter()
+
+    with engine.begin() as connection:
+        if sqlite:
+            connection.exec_driver_sql("PRAGMA synchronous=OFF")
+        salon_ids, price_level, rows = generate_salons(rng, args.salons, _next_id(connection, models.Salon))
+        _write(connection, models.Salon.__table__, ("id", "name", "address", "lat", "lon", "photo_url"), rows, sqlite)
+        master_ids, master_salon, rows = generate_masters(
+            rng, args.masters, _next_id(connection, models.Master), salon_ids
+        )
+        _write(connection, models.Master.__table__, (
+            "id", "name", "salon_id", "specialization", "experience", "photo_url", "hourly_rate"
+        ), rows, sqlite)
+        client_ids, rows = generate_clients(rng, clients_count, _next_id(connection, models.Client), salon_ids)
+        _write(connection, models.Client.__table__, ("id", "name", "phone", "salon_id", "user_id"), rows, sqlite)
+        next_appointment_id = _next_id(connection, models.Appointment)
+    print(f"Салонов: {args.salons}, мастеров: {args.masters}, клиентов: {clients_count}")
+
+    service_names = np.array([service[0] for service in SERVICES], dtype=object)
+    columns = ("id", "master_id", "client_id", "start_time", "end_time", "service", "price", "status")
+    written = 0
+    for batch in generate_appointment_batches(
+        rng, args.appointments, start, args.days, master_ids, master_salon, price_level,
+        client_ids, args.cancel_rate
+    ):
+        count = len(batch["master_id"])
+        ids = range(next_appointment_id, next_appointment_id + count)
+        next_appointment_id += count
+        if sqlite:
+            start_times = _datetime_strings(batch["start_time"])
+            end_times = _datetime_strings(batch["end_time"])
+        else:
+            start_times = batch["start_time"].astype("datetime64[us]").tolist()
+            end_times = batch["end_time"].astype("datetime64[us]").tolist()
+        statuses = np.where(batch["cancelled"], "cancelled", "confirmed").tolist()
+        rows = list(zip(
+            ids, batch["master_id"].tolist(), batch["client_id"].tolist(), start_times, end_times,
+            service_names[batch["service"]].tolist(), batch["price"].tolist(), statuses
+        ))
+        with engine.begin() as connection:
+            if sqlite:
+                connection.exec_driver_sql("PRAGMA synchronous=OFF")
+            _write(connection, models.Appointment.__table__, columns, rows, sqlite)
+        written += count
+        elapsed = time.perf_counter() - started
+        print(f"\rЗаписей: {written} ({written / elapsed:.0f}/с)", end="", flush=True)
+    print()
+
+    # Вставка шла мимо ORM-событий — агрегаты считаем заново
+    with sessionmaker(bind=engine)() as db:
+        rollup.rebuild(db)
+        payroll.rebuild(db)
+    print(f"Готово за {time.perf_counter() - started:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Пространственный индекс салонов: равномерная сетка по lat/lon в памяти.
+
+Каждая ячейка CELL_DEGREES x CELL_DEGREES хранит (id, lat, lon) своих
+салонов. Поиск по радиусу и по прямоугольнику просматривает только ячейки,
+пересекающие область. Индекс перестраивается при следующем запросе после
+commit, изменившего салоны, а изменения из других воркеров ловит отпечаток
+таблицы (число строк, max(id), суммы координат), который сверяется при
+каждом запросе.
+"""
+import math
+import os
+import threading
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session, object_session
+
+import models
+
+CELL_DEGREES = float(os.getenv("GEO_CELL_DEGREES", "0.05"))
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+MAX_RADIUS_KM = 200
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GridIndex:
+    def __init__(self, points, cell_degrees=CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.cells = {}
+        for salon_id, lat, lon in points:
+            if lat is None or lon is None:
+                continue
+            self.cells.setdefault(self._cell(lat, lon), []).append((salon_id, lat, lon))
+
+    def _cell(self, lat, lon):
+        return math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees)
+
+    def _cells_in(self, min_lat, min_lon, max_lat, max_lon):
+        low_y, low_x = self._cell(min_lat, min_lon)
+        high_y, high_x = self._cell(max_lat, max_lon)
+        # Если ячеек в области больше, чем занятых, дешевле перебрать занятые
+        if (high_y - low_y + 1) * (high_x - low_x + 1) > len(self.cells):
+            for (y, x), points in self.cells.items():
+                if low_y <= y <= high_y and low_x <= x <= high_x:
+                    yield points
+            return
+        for y in range(low_y, high_y + 1):
+            for x in range(low_x, high_x + 1):
+                points = self.cells.get((y, x))
+                if points:
+                    yield points
+
+    def bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """(id, lat, lon) внутри прямоугольника; min_lon > max_lon — через антимеридиан."""
+        if min_lon > max_lon:
+            return self.bbox(min_lat, min_lon, max_lat, 180.0) + self.bbox(min_lat, -180.0, max_lat, max_lon)
+        return [
+            point
+            for points in self._cells_in(min_lat, min_lon, max_lat, max_lon)
+            for point in points
+            if min_lat <= point[1] <= max_lat and min_lon <= point[2] <= max_lon
+        ]
+
+    def nearby(self, lat, lon, radius_km):
+        """[(расстояние_км, id)] в пределах радиуса, по возрастанию расстояния."""
+        delta_lat = radius_km / KM_PER_DEGREE_LAT
+        cos_lat = math.cos(math.radians(min(abs(lat) + delta_lat, 89.9)))
+        delta_lon = min(radius_km / (KM_PER_DEGREE_LAT * cos_lat), 180.0)
+        min_lon, max_lon = lon - delta_lon, lon + delta_lon
+        if delta_lon >= 180.0:
+            min_lon, max_lon = -180.0, 180.0
+        else:
+            min_lon = min_lon + 360.0 if min_lon < -180.0 else min_lon
+            max_lon = max_lon - 360.0 if max_lon > 180.0 else max_lon
+        candidates = self.bbox(
+            max(lat - delta_lat, -90.0), min_lon, min(lat + delta_lat, 90.0), max_lon
+        )
+        found = []
+        for salon_id, salon_lat, salon_lon in candidates:
+            distance = haversine_km(lat, lon, salon_lat, salon_lon)
+            if distance <= radius_km:
+                found.append((distance, salon_id))
+        found.sort()
+        return found
+
+
+_index = None
+_version = None
+_lock = threading.Lock()
+_DIRTY = "geo_index_dirty"
+
+
+def _table_version(db: Session):
+    # Одна агрегирующая строка по небольшой таблице салонов: вставка, удаление и перенос ее меняют
+    return tuple(db.query(
+        func.count(models.Salon.id), func.max(models.Salon.id), func.sum(models.Salon.lat), func.sum(models.Salon.lon)
+    ).one())
+
+
+def get_index(db: Session):
+    global _index, _version
+    version = _table_version(db)
+    with _lock:
+        if _index is not None and _version == version:
+            return _index
+    # Запрос — вне блокировки: в async_app он отдает управление event loop, и
+    # другой запрос, ждущий _lock в том же потоке, остановил бы loop
+    index = GridIndex(db.query(models.Salon.id, models.Salon.lat, models.Salon.lon).all())
+    with _lock:
+        _index, _version = index, version
+    return index
+
+
+def invalidate():
+    global _index
+    with _lock:
+        _index = None
+
+
+@event.listens_for(models.Salon, "after_insert")
+@event.listens_for(models.Salon, "after_update")
+@event.listens_for(models.Salon, "after_delete")
+def _on_salon_write(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info[_DIRTY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    if session.info.pop(_DIRTY, False):
+        invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop(_DIRTY, None)
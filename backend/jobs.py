@@ -0,0 +1,276 @@
+"""Локальная очередь фоновых задач: большие выгрузки и отчеты.
+
+POST /jobs/ ставит задачу и сразу отвечает 202 с ее id. Задачи
+выполняются в пуле процессов (JOBS_WORKERS) — обработчики API и цикл
+событий не заняты ни чтением БД, ни сериализацией. Состояние хранится
+в таблице jobs той же БД, результат пишется в JOBS_DIR во временный файл
+и переименовывается по готовности.
+
+    POST /jobs/                {"kind": "appointments-csv", "start_date": ..., "gzip": true}
+    GET  /jobs/{id}            queued -> running -> done | failed
+    GET  /jobs/{id}/download   файл результата
+
+Задача, чей процесс умер (перезапуск сервера), при запросе статуса
+помечается failed. Готовые файлы старше JOBS_RETENTION_HOURS удаляются
+при постановке новых задач.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+import importlib.util
+import json
+import multiprocessing
+import os
+import threading
+import uuid
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+
+import analytics
+import exports
+import models
+import schemas
+from database import SessionLocal
+
+JOBS_DIR = os.getenv("JOBS_DIR", "jobs")
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "2"))
+JOBS_RETENTION_HOURS = float(os.getenv("JOBS_RETENTION_HOURS", "24"))
+
+router = APIRouter()
+
+
+class JobKind:
+    """Вид задачи: rows(start_dt, end_dt, salon_id) дает make_rows(db), write(make_rows) — блоки байт."""
+
+    def __init__(self, media_type, filename, write, rows, requires=None, compressible=True):
+        self.media_type = media_type
+        self.filename = filename
+        self.write = write
+        self.rows = rows
+        self.requires = requires
+        self.compressible = compressible
+
+
+def _appointments(rows):
+    def scoped(start_dt, end_dt, salon_id):
+        return lambda db: rows(db, start_dt, end_dt, salon_id)
+    return scoped
+
+
+def _csv(header):
+    return lambda make_rows: exports.csv_chunks(header, make_rows)
+
+
+KINDS = {
+    "appointments-csv": JobKind(
+        "text/csv", "analytics.csv",
+        _csv(exports.APPOINTMENT_EXPORT_HEADER), _appointments(exports.appointment_csv_rows)
+    ),
+    "appointments-ndjson": JobKind(
+        "application/x-ndjson", "analytics.ndjson",
+        exports.ndjson_chunks, _appointments(exports.appointment_rows)
+    ),
+    "appointments-parquet": JobKind(
+        "application/vnd.apache.parquet", "analytics.parquet",
+        exports.parquet_chunks, _appointments(exports.appointment_rows), requires="pyarrow", compressible=False
+    ),
+    "appointments-arrow": JobKind(
+        "application/vnd.apache.arrow.stream", "analytics.arrow",
+        exports.arrow_ipc_chunks, _appointments(exports.appointment_rows), requires="pyarrow", compressible=False
+    ),
+    "financial-csv": JobKind(
+        "text/csv", "financial_report.csv",
+        _csv(analytics.FINANCIAL_REPORT_HEADER), analytics.financial_report_rows
+    ),
+    "masters-csv": JobKind(
+        "text/csv", "masters_report.csv",
+        _csv(analytics.MASTERS_REPORT_HEADER), analytics.masters_report_rows
+    ),
+    "services-csv": JobKind(
+        "text/csv", "services_report.csv",
+        _csv(analytics.SERVICES_REPORT_HEADER), analytics.services_report_rows
+    ),
+}
+
+class WorkerPool:
+    """Пул процессов (spawn), который создается при первой задаче и пересоздается, если упал."""
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        with self._lock:
+            for _ in range(2):
+                if self._executor is None:
+                    # spawn: дочерний процесс не наследует потоки и соединения сервера
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                    )
+                try:
+                    return self._executor.submit(fn, *args)
+                except BrokenProcessPool:
+                    # Упавший процесс ломает весь пул — создаем новый
+                    self._executor = None
+        raise HTTPException(status_code=503, detail="Worker processes are unavailable")
+
+
+_pool = WorkerPool(JOBS_WORKERS)
+
+
+def _path(job_id):
+    return os.path.join(JOBS_DIR, job_id)
+
+
+def _alive(pid):
+    if pid is None:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _finish(db: Session, job, status, error=None, size=None):
+    job.status = status
+    job.error = error
+    job.size = size
+    job.finished_at = datetime.now()
+    db.commit()
+
+
+def run_job(job_id):
+    """Выполняет задачу; вызывается в процессе пула."""
+    db = SessionLocal()
+    part = _path(job_id) + ".part"
+    try:
+        job = db.get(models.Job, job_id)
+        job.status = "running"
+        job.pid = os.getpid()
+        job.started_at = datetime.now()
+        db.commit()
+
+        params = json.loads(job.params)
+        kind = KINDS[job.kind]
+        chunks = kind.write(kind.rows(
+            datetime.fromisoformat(params["start_date"]) if params["start_date"] else None,
+            datetime.fromisoformat(params["end_date"]) if params["end_date"] else None,
+            params["salon_id"],
+        ))
+        if params["gzip"] and kind.compressible:
+            chunks = exports.gzip_chunks(chunks)
+        size = 0
+        with open(part, "wb") as output:
+            for chunk in chunks:
+                output.write(chunk)
+                size += len(chunk)
+        os.replace(part, _path(job_id))
+        _finish(db, job, "done", size=size)
+    except Exception as error:
+        db.rollback()
+        if os.path.exists(part):
+            os.remove(part)
+        job = db.get(models.Job, job_id)
+        if job is not None:
+            _finish(db, job, "failed", error=f"{type(error).__name__}: {error}"[:1000])
+        raise
+    finally:
+        db.close()
+
+
+def _on_done(job_id, future):
+    # Процесс пула упал до того, как задача записала свой статус
+    if future.exception() is None:
+        return
+    with SessionLocal() as db:
+        job = db.get(models.Job, job_id)
+        if job is not None and job.status in ("queued", "running"):
+            _finish(db, job, "failed", error=str(future.exception())[:1000])
+
+
+def _cleanup(db: Session):
+    cutoff = datetime.now() - timedelta(hours=JOBS_RETENTION_HOURS)
+    expired = db.query(models.Job).filter(
+        models.Job.status.in_(("done", "failed")), models.Job.finished_at < cutoff
+    ).all()
+    for job in expired:
+        if os.path.exists(_path(job.id)):
+            os.remove(_path(job.id))
+        db.delete(job)
+    if expired:
+        db.commit()
+
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def _get_job(db: Session, job_id):
+    job = db.get(models.Job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status in ("queued", "running") and not _alive(job.pid):
+        _finish(db, job, "failed", error="Worker process exited")
+    return job
+
+
+@router.post("/jobs/", response_model=schemas.Job, status_code=202)
+def submit_job(request: schemas.JobCreate, db: Session = Depends(get_db)):
+    kind = KINDS.get(request.kind)
+    if kind is None:
+        raise HTTPException(status_code=400, detail=f"Unknown job kind, expected one of: {', '.join(KINDS)}")
+    if kind.requires and importlib.util.find_spec(kind.requires) is None:
+        raise HTTPException(status_code=501, detail=f"{kind.requires} is not installed")
+    try:
+        for value in (request.start_date, request.end_date):
+            if value:
+                datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start_date and end_date must be ISO dates")
+
+    _cleanup(db)
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    job = models.Job(
+        id=uuid.uuid4().hex,
+        kind=request.kind,
+        params=json.dumps(request.model_dump(exclude={"kind"})),
+        status="queued",
+        pid=os.getpid(),
+        created_at=datetime.now(),
+    )
+    db.add(job)
+    db.commit()
+    future = _pool.submit(run_job, job.id)
+    future.add_done_callback(lambda future, job_id=job.id: _on_done(job_id, future))
+    return job
+
+
+@router.get("/jobs/{job_id}", response_model=schemas.Job)
+def get_job(job_id: str, db: Session = Depends(get_db)):
+    return _get_job(db, job_id)
+
+
+@router.get("/jobs/{job_id}/download")
+def download_job(job_id: str, db: Session = Depends(get_db)):
+    job = _get_job(db, job_id)
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    if not os.path.exists(_path(job.id)):
+        raise HTTPException(status_code=410, detail="Job result has expired")
+    kind = KINDS[job.kind]
+    compressed = json.loads(job.params)["gzip"] and kind.compressible
+    return FileResponse(
+        _path(job.id),
+        media_type="application/gzip" if compressed else kind.media_type,
+        filename=kind.filename + (".gz" if compressed else ""),
+    )
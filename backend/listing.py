@@ -0,0 +1,86 @@
+"""Keyset-пагинация и проекция полей для списочных эндпоинтов.
+
+Страница: ?after_id=<последний id>&limit=N, порядок по id; без limit —
+DEFAULT_PAGE_SIZE строк. Если за страницей есть еще строки, id последней
+строки возвращается в заголовке X-Next-After-Id: весь список — это проход
+по курсору, пока заголовок не пропадет.
+Проекция: ?fields=id,name — выбираются и сериализуются только эти колонки.
+
+Строки выбираются кортежами Core и сериализуются orjson напрямую, без
+ORM-объектов и проверки каждой строки через Pydantic: плоские схемы
+ответа (schemas.Salon, Master, ...) повторяют колонки таблицы, и
+проверять то, что только что прочитано из БД, незачем. Без orjson
+сериализация идет через jsonable_encoder.
+"""
+import importlib.util
+
+from fastapi import HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-After-Id"
+HAS_ORJSON = importlib.util.find_spec("orjson") is not None
+
+
+def parse_fields(model, fields: str = None):
+    """Колонки модели для fields=...; id добавляется всегда (нужен для курсора)."""
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    available = model.__table__.columns.keys()
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    if "id" not in names:
+        names.insert(0, "id")
+    return [getattr(model, name) for name in dict.fromkeys(names)]
+
+
+def schema_columns(model, schema):
+    """Колонки модели под поля плоской схемы ответа, в порядке схемы."""
+    return [getattr(model, name) for name in schema.model_fields]
+
+
+def json_response(keys, rows, headers=None):
+    """Ответ из кортежей Core: orjson, если установлен, иначе jsonable_encoder."""
+    content = [dict(zip(keys, row)) for row in rows]
+    if HAS_ORJSON:
+        return ORJSONResponse(content=content, headers=headers)
+    return JSONResponse(content=jsonable_encoder(content), headers=headers)
+
+
+def list_page(db: Session, model, response: Response, filters=(), after_id: int = None,
+              limit: int = DEFAULT_PAGE_SIZE, fields: str = None, join=None, schema=None):
+    """Страница строк модели по id.
+
+    С fields или schema возвращает готовый ответ из кортежей Core, иначе —
+    ORM-объекты для response_model. limit=None — все строки разом, только
+    для внутренних вызовов: маршруты всегда передают размер страницы.
+    """
+    columns = parse_fields(model, fields) or (schema_columns(model, schema) if schema else None)
+    query = select(*columns) if columns else db.query(model)
+    if join is not None:
+        query = query.join(*join)
+    query = query.filter(*filters)
+    if after_id is not None:
+        query = query.filter(model.id > after_id)
+    query = query.order_by(model.id)
+    if limit is not None:
+        # Лишняя строка показывает, есть ли следующая страница
+        query = query.limit(limit + 1)
+    # Выборка колонок исполняется на уровне Core, мимо ORM-загрузчика
+    rows = db.connection().execute(query).all() if columns else query.all()
+
+    headers = {}
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        headers[NEXT_CURSOR_HEADER] = str(rows[-1].id)
+
+    if columns:
+        return json_response([column.key for column in columns], rows, headers)
+    response.headers.update(headers)
+    return rows
@@ -1,24 +1,59 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload, selectinload
 from sqlalchemy import func
 from typing import List
-from fastapi.staticfiles import StaticFiles
 import os
-import shutil
 from fastapi import UploadFile, File
 import models
 import schemas
 import database
+import migrations
+import rollup
+import payroll
+import availability
+import booking
+import listing
+import geo
+import cache
+import analytics
+import analytics_cache
+import metrics
+import profiling
+import media
 from analytics import router as analytics_router
-os.makedirs("uploads", exist_ok=True)
+from bulk import router as bulk_router
+from profiling import router as profiling_router
+from jobs import router as jobs_router
+os.makedirs(media.UPLOAD_DIR, exist_ok=True)
 
-models.Base.metadata.create_all(bind=database.engine)
+migrations.upgrade(database.engine)
+with database.SessionLocal() as _db:
+    rollup.backfill_if_empty(_db)
+    payroll.backfill_if_empty(_db)
+payroll.start_worker()
 
 app = FastAPI(title="Beauty Salon API")
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+app.mount("/uploads", media.UploadStaticFiles(directory=media.UPLOAD_DIR), name="uploads")
 
 app.include_router(analytics_router, prefix="/api", tags=["analytics"])
+app.include_router(bulk_router, tags=["bulk"])
+app.include_router(profiling_router, tags=["debug"])
+app.include_router(jobs_router, tags=["jobs"])
+
+# Кэш справочных ответов; регистрируется до CORS, чтобы CORS-заголовки не попадали в кэш
+CATALOG_CACHE_RULES = [
+    cache.ResponseCacheRule(r"/salons/", "salons"),
+    cache.ResponseCacheRule(r"/salons/(\d+)", "salon:{0}"),
+    cache.ResponseCacheRule(r"/salons/(?:nearby|bbox)", "salons"),
+    cache.ResponseCacheRule(r"/masters/", "masters"),
+    cache.ResponseCacheRule(r"/masters/(\d+)", "master:{0}"),
+    cache.ResponseCacheRule(r"/services-with-prices/", "services"),
+]
+app.middleware("http")(cache.response_cache_middleware(cache.catalog_cache, CATALOG_CACHE_RULES))
+# Метрики снаружи кэша: попадания в кэш тоже считаются запросами
+app.middleware("http")(metrics.middleware)
+app.middleware("http")(profiling.middleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -26,6 +61,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[listing.NEXT_CURSOR_HEADER, "Server-Timing"],
 )
 
 def get_db():
@@ -36,12 +72,62 @@ def get_db():
         db.close()
 
 @app.get("/salons/", response_model=List[schemas.Salon])
-def read_salons(db: Session = Depends(get_db)):
-    return db.query(models.Salon).all()
+def read_salons(
+    response: Response,
+    after_id: int = None,
+    limit: int = Query(listing.DEFAULT_PAGE_SIZE, ge=1, le=listing.MAX_PAGE_SIZE),
+    fields: str = None,
+    db: Session = Depends(get_db)
+):
+    return listing.list_page(
+        db, models.Salon, response, after_id=after_id, limit=limit, fields=fields, schema=schemas.Salon
+    )
+
+def _salons_by_ids(db: Session, ids):
+    salons = {
+        salon.id: salon
+        for salon in db.query(models.Salon).filter(models.Salon.id.in_(ids)).all()
+    }
+    return [salons[salon_id] for salon_id in ids if salon_id in salons]
+
+@app.get("/salons/nearby", response_model=List[schemas.SalonNearby])
+def read_nearby_salons(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius: float = Query(5, gt=0, le=geo.MAX_RADIUS_KM),
+    limit: int = Query(20, ge=1, le=listing.MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
+    found = geo.get_index(db).nearby(lat, lon, radius)[:limit]
+    distances = {salon_id: distance for distance, salon_id in found}
+    return [
+        schemas.SalonNearby(
+            **schemas.Salon.model_validate(salon).model_dump(),
+            distance_km=round(distances[salon.id], 3)
+        )
+        for salon in _salons_by_ids(db, [salon_id for _, salon_id in found])
+    ]
+
+@app.get("/salons/bbox", response_model=List[schemas.Salon])
+def read_salons_in_bbox(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    limit: int = Query(500, ge=1, le=listing.MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
+    if min_lat > max_lat:
+        raise HTTPException(status_code=400, detail="min_lat must not exceed max_lat")
+    points = geo.get_index(db).bbox(min_lat, min_lon, max_lat, max_lon)
+    ids = sorted(salon_id for salon_id, _, _ in points)[:limit]
+    return _salons_by_ids(db, ids)
 
 @app.get("/salons/{salon_id}", response_model=schemas.SalonWithMasters)
 def read_salon(salon_id: int, db: Session = Depends(get_db)):
-    salon = db.query(models.Salon).filter(models.Salon.id == salon_id).first()
+    salon = db.query(models.Salon).options(
+        selectinload(models.Salon.masters)
+    ).filter(models.Salon.id == salon_id).first()
     if not salon:
         raise HTTPException(status_code=404, detail="Salon not found")
     return salon
@@ -52,14 +138,22 @@ def create_salon(salon: schemas.SalonCreate, db: Session = Depends(get_db)):
     db.add(db_salon)
     db.commit()
     db.refresh(db_salon)
+    cache.catalog_cache.invalidate("salons")
     return db_salon
 
 @app.get("/masters/", response_model=List[schemas.Master])
-def read_masters(salon_id: int = None, db: Session = Depends(get_db)):
-    query = db.query(models.Master)
+def read_masters(
+    response: Response,
+    salon_id: int = None,
+    after_id: int = None,
+    limit: int = Query(listing.DEFAULT_PAGE_SIZE, ge=1, le=listing.MAX_PAGE_SIZE),
+    fields: str = None,
+    db: Session = Depends(get_db)
+):
+    filters = []
     if salon_id:
-        query = query.filter(models.Master.salon_id == salon_id)
-    return query.all()
+        filters.append(models.Master.salon_id == salon_id)
+    return listing.list_page(db, models.Master, response, filters, after_id, limit, fields, schema=schemas.Master)
 
 @app.get("/masters/{master_id}", response_model=schemas.Master)
 def read_master(master_id: int, db: Session = Depends(get_db)):
@@ -74,15 +168,29 @@ def create_master(master: schemas.MasterCreate, db: Session = Depends(get_db)):
     db.add(db_master)
     db.commit()
     db.refresh(db_master)
+    cache.catalog_cache.invalidate("masters", f"salon:{db_master.salon_id}")
     return db_master
 
 @app.get("/clients/", response_model=List[schemas.Client])
-def read_clients(db: Session = Depends(get_db)):
-    return db.query(models.Client).all()
+def read_clients(
+    response: Response,
+    salon_id: int = None,
+    after_id: int = None,
+    limit: int = Query(listing.DEFAULT_PAGE_SIZE, ge=1, le=listing.MAX_PAGE_SIZE),
+    fields: str = None,
+    db: Session = Depends(get_db)
+):
+    filters = []
+    if salon_id:
+        filters.append(models.Client.salon_id == salon_id)
+    return listing.list_page(db, models.Client, response, filters, after_id, limit, fields, schema=schemas.Client)
 
 @app.get("/clients/{client_id}", response_model=schemas.ClientProfile)
 def read_client(client_id: int, db: Session = Depends(get_db)):
-    client = db.query(models.Client).filter(models.Client.id == client_id).first()
+    # ClientProfile обходит appointments и appointment.master — грузим их заранее
+    client = db.query(models.Client).options(
+        selectinload(models.Client.appointments).joinedload(models.Appointment.master)
+    ).filter(models.Client.id == client_id).first()
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
     return client
@@ -96,19 +204,61 @@ def create_client(client: schemas.ClientCreate, db: Session = Depends(get_db)):
     return db_client
 
 @app.get("/appointments/", response_model=List[schemas.Appointment])
-def read_appointments(client_id: int = None, db: Session = Depends(get_db)):
-    query = db.query(models.Appointment)
+def read_appointments(
+    response: Response,
+    client_id: int = None,
+    master_id: int = None,
+    salon_id: int = None,
+    status: str = None,
+    start_date: str = None,
+    end_date: str = None,
+    after_id: int = None,
+    limit: int = Query(listing.DEFAULT_PAGE_SIZE, ge=1, le=listing.MAX_PAGE_SIZE),
+    fields: str = None,
+    db: Session = Depends(get_db)
+):
+    filters = []
+    join = None
     if client_id:
-        query = query.filter(models.Appointment.client_id == client_id)
-    return query.all()
+        filters.append(models.Appointment.client_id == client_id)
+    if master_id:
+        filters.append(models.Appointment.master_id == master_id)
+    if salon_id:
+        join = (models.Master, models.Appointment.master_id == models.Master.id)
+        filters.append(models.Master.salon_id == salon_id)
+    if status:
+        filters.append(models.Appointment.status == status)
+    start_dt, end_dt = analytics.parse_range(start_date, end_date)
+    if start_dt:
+        filters.append(models.Appointment.start_time >= start_dt)
+    if end_dt:
+        filters.append(models.Appointment.start_time <= end_dt)
+    return listing.list_page(
+        db, models.Appointment, response, filters, after_id, limit, fields, join=join, schema=schemas.Appointment
+    )
 
 @app.post("/appointments/", response_model=schemas.Appointment)
 def create_appointment(appointment: schemas.AppointmentCreate, db: Session = Depends(get_db)):
-    db_appointment = models.Appointment(**appointment.dict())
-    db.add(db_appointment)
-    db.commit()
-    db.refresh(db_appointment)
-    return db_appointment
+    error = availability.interval_error(appointment.start_time, appointment.end_time)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    
+    try:
+        return booking.book(db, appointment.dict())
+    except booking.SlotConflict as conflict:
+        raise HTTPException(status_code=409, detail=str(conflict))
+
+@app.put("/appointments/{appointment_id}/status", response_model=schemas.Appointment)
+def update_appointment_status(appointment_id: int, update: schemas.AppointmentStatusUpdate, db: Session = Depends(get_db)):
+    db_appointment = db.query(models.Appointment).filter(models.Appointment.id == appointment_id).first()
+    if not db_appointment:
+        raise HTTPException(status_code=404, detail="Appointment not found")
+    
+    # rollup аналитики обновляется событиями ORM в этой же транзакции
+    try:
+        return booking.change_status(db, db_appointment, update.status)
+    except booking.SlotConflict as conflict:
+        raise HTTPException(status_code=409, detail=str(conflict))
 
 @app.post("/register/", response_model=schemas.User)
 def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
@@ -186,6 +336,7 @@ def update_salon(salon_id: int, salon: schemas.SalonCreate, db: Session = Depend
     
     db.commit()
     db.refresh(db_salon)
+    cache.catalog_cache.invalidate("salons", f"salon:{salon_id}")
     return db_salon
 
 @app.put("/masters/{master_id}", response_model=schemas.Master)
@@ -194,6 +345,7 @@ def update_master(master_id: int, master: schemas.MasterCreate, db: Session = De
     if not db_master:
         raise HTTPException(status_code=404, detail="Master not found")
     
+    previous_salon_id = db_master.salon_id
     db_master.name = master.name
     db_master.salon_id = master.salon_id
     db_master.specialization = master.specialization
@@ -202,19 +354,37 @@ def update_master(master_id: int, master: schemas.MasterCreate, db: Session = De
     
     db.commit()
     db.refresh(db_master)
+    # Мастер виден в списке мастеров, в своей карточке и в карточках старого и нового салона
+    cache.catalog_cache.invalidate(
+        "masters", f"master:{master_id}", f"salon:{previous_salon_id}", f"salon:{db_master.salon_id}"
+    )
     return db_master
 
+@app.get("/cache/stats")
+def get_cache_stats():
+    return {
+        "catalog": cache.catalog_cache.info(),
+        "analytics": analytics_cache.results.info()
+    }
+
+@app.get("/metrics")
+def get_metrics():
+    caches = {"catalog": cache.catalog_cache.info(), "analytics": analytics_cache.results.info()}
+    lines = metrics.render()
+    for counter in ("hits", "misses", "evictions"):
+        lines += metrics.counter_lines(
+            f"cache_{counter}_total", f"Response cache {counter}.",
+            [(f'cache="{name}"', info[counter]) for name, info in caches.items()]
+        )
+    return Response("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 def root():
     return {"message": "Beauty Salon API is running!", "docs": "/docs"}
 
 @app.post("/upload/")
 async def upload_file(file: UploadFile = File(...)):
-    file_path = f"uploads/{file.filename}"
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    return {"filename": file.filename, "url": f"http://localhost:8080/uploads/{file.filename}"}
+    return await media.store_upload(file)
 
 @app.get("/services-with-prices/")
 def get_services_with_prices(db: Session = Depends(get_db)):
@@ -236,34 +406,73 @@ def get_services_with_prices(db: Session = Depends(get_db)):
     ]
 
 @app.get("/masters/{master_id}/available-slots")
-def get_available_slots(master_id: int, date: str, db: Session = Depends(get_db)):
-    from datetime import datetime, timedelta
+def get_available_slots(master_id: int, date: str, granularity: int = 60, duration: int = 60, db: Session = Depends(get_db)):
+    from datetime import timedelta
+    
+    if granularity <= 0 or duration <= 0:
+        raise HTTPException(status_code=400, detail="granularity and duration must be positive")
     
     # Парсим дату
-    target_date = datetime.fromisoformat(date).date()
+    target_dt, _ = analytics.parse_range(date, detail="date must be an ISO date")
+    if target_dt is None:
+        raise HTTPException(status_code=400, detail="date must be an ISO date")
+    target_date = target_dt.date()
+    
+    # Рабочие часы (9:00 - 21:00), слот свободен, если не пересекается ни с одной записью
+    slots = availability.day_slots(
+        db, master_id, target_date,
+        granularity=timedelta(minutes=granularity),
+        duration=timedelta(minutes=duration)
+    )
     
-    # Получаем все записи мастера на эту дату
-    existing_appointments = db.query(models.Appointment).filter(
-        models.Appointment.master_id == master_id,
-        func.date(models.Appointment.start_time) == target_date,
-        models.Appointment.status == "confirmed"
-    ).all()
+    return [
+        {
+            "time": start.strftime("%H:%M"),
+            "hour": start.hour,
+            "minute": start.minute,
+            "available": available
+        }
+        for start, available in slots
+    ]
+
+@app.get("/salons/{salon_id}/free-slots")
+def get_salon_free_slots(
+    salon_id: int,
+    start_date: str,
+    end_date: str = None,
+    limit: int = Query(10, ge=1, le=availability.MAX_FREE_SLOTS),
+    granularity: int = 60,
+    duration: int = 60,
+    db: Session = Depends(get_db)
+):
+    from datetime import timedelta
     
-    # Занятые часы
-    busy_hours = set()
-    for apt in existing_appointments:
-        busy_hours.add(apt.start_time.hour)
+    if granularity <= 0 or duration <= 0:
+        raise HTTPException(status_code=400, detail="granularity and duration must be positive")
     
-    # Рабочие часы (9:00 - 20:00)
-    working_hours = list(range(9, 21))  # до 20:00 включительно
+    start_dt, end_dt = analytics.parse_range(start_date, end_date)
+    if start_dt is None:
+        raise HTTPException(status_code=400, detail="start_date and end_date must be ISO dates")
+    start_day = start_dt.date()
+    end_day = end_dt.date() if end_dt else start_day
+    if end_day < start_day:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    if (end_day - start_day).days + 1 > availability.MAX_SEARCH_DAYS:
+        raise HTTPException(
+            status_code=400, detail=f"Date range must not exceed {availability.MAX_SEARCH_DAYS} days"
+        )
     
-    # Формируем все слоты
-    all_slots = []
-    for hour in working_hours:
-        all_slots.append({
-            "time": f"{hour:02d}:00",
-            "hour": hour,
-            "available": hour not in busy_hours
-        })
+    master_ids = [
+        master_id for (master_id,) in
+        db.query(models.Master.id).filter(models.Master.salon_id == salon_id).all()
+    ]
+    slots = availability.first_free_slots(
+        db, master_ids, start_day, end_day, limit,
+        granularity=timedelta(minutes=granularity),
+        duration=timedelta(minutes=duration)
+    )
     
-    return all_slots
\ No newline at end of file
+    return [
+        {"master_id": master_id, "start_time": start, "end_time": end}
+        for master_id, start, end in slots
+    ]
@@ -0,0 +1,228 @@
+"""Загрузки: хранение по содержимому, превью и WebP, раздача с Range.
+
+Файл сохраняется как uploads/<ab>/<sha256>.<ext>: одинаковые файлы
+хранятся один раз, а адрес меняется только вместе с содержимым, поэтому
+такие файлы отдаются с Cache-Control immutable на год. Для изображений
+пул процессов (MEDIA_WORKERS) строит уменьшенные копии шириной
+THUMBNAIL_WIDTHS в исходном формате и в WebP плюс полноразмерный WebP:
+
+    <sha256>_320.jpg  <sha256>_320.webp  <sha256>_800.jpg  ...  <sha256>.webp
+
+Превью требуют Pillow; без него файлы хранятся и отдаются как есть.
+Старые файлы с клиентскими именами в корне uploads/ отдаются как раньше,
+но с ревалидацией по ETag.
+"""
+import asyncio
+import hashlib
+import importlib.util
+import os
+import re
+import uuid
+
+import anyio
+from fastapi import HTTPException, UploadFile
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from jobs import WorkerPool
+
+UPLOAD_DIR = "uploads"
+UPLOADS_URL = os.getenv("UPLOADS_URL", "http://localhost:8080/uploads")
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MEDIA_WORKERS = int(os.getenv("MEDIA_WORKERS", "2"))
+THUMBNAIL_WIDTHS = [int(width) for width in os.getenv("THUMBNAIL_WIDTHS", "320,800").split(",") if width]
+
+HAS_PILLOW = importlib.util.find_spec("PIL") is not None
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp"}
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+_HASHED_NAME = re.compile(r"[0-9a-f]{64}(_\d+)?(\.[a-z0-9]+)?")
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+
+_pool = WorkerPool(MEDIA_WORKERS)
+
+
+def _extension(filename):
+    extension = os.path.splitext(filename)[1].lower()
+    return extension if re.fullmatch(r"\.[a-z0-9]{1,8}", extension) else ""
+
+
+def _url(path):
+    return f"{UPLOADS_URL}/{os.path.relpath(path, UPLOAD_DIR).replace(os.sep, '/')}"
+
+
+def _save(image, path, image_format):
+    if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    # Соседняя загрузка того же файла может строить те же превью
+    part = f"{path}.{os.getpid()}.part"
+    image.save(part, format=image_format, **({"quality": 80} if image_format in ("JPEG", "WEBP") else {}))
+    os.replace(part, path)
+
+
+def make_variants(path):
+    """Строит превью и WebP для изображения path; вызывается в процессе пула.
+
+    Возвращает [(ширина, путь)], ширина 0 — полный размер; не изображение — пустой список.
+    """
+    from PIL import Image, ImageOps
+
+    try:
+        with Image.open(path) as original:
+            image = ImageOps.exif_transpose(original).copy()
+    except (OSError, Image.DecompressionBombError):
+        return []
+
+    base, extension = os.path.splitext(path)
+    image_format = Image.registered_extensions().get(extension, "PNG")
+    outputs = {f"{base}.webp": (0, "WEBP")} if extension != ".webp" else {}
+    for width in THUMBNAIL_WIDTHS:
+        # Превью шире исходника не нужно
+        if width < image.width:
+            outputs[f"{base}_{width}{extension}"] = (width, image_format)
+            outputs[f"{base}_{width}.webp"] = (width, "WEBP")
+
+    resized = {0: image}
+    for target, (width, target_format) in outputs.items():
+        if os.path.exists(target):
+            continue
+        if width not in resized:
+            resized[width] = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        _save(resized[width], target, target_format)
+    return sorted((width, target) for target, (width, _) in outputs.items())
+
+
+def _existing_variants(path):
+    base, extension = os.path.splitext(path)
+    directory, stem = os.path.split(base)
+    variants = []
+    for name in os.listdir(directory):
+        if name.startswith(stem) and name != stem + extension:
+            match = re.fullmatch(rf"{stem}(?:_(\d+))?\.[a-z0-9]+", name)
+            if match:
+                variants.append((int(match.group(1) or 0), os.path.join(directory, name)))
+    return sorted(variants)
+
+
+async def store_upload(file: UploadFile):
+    """Сохраняет загрузку по sha256 содержимого; для изображений строит превью."""
+    filename = os.path.basename(file.filename or "")
+    if not filename:
+        raise HTTPException(status_code=400, detail="File name is required")
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    part = os.path.join(UPLOAD_DIR, f".{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        # Копирование блоками через потоки anyio: цикл событий не ждет диск
+        async with await anyio.open_file(part, "wb") as buffer:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+                size += len(chunk)
+                await buffer.write(chunk)
+        sha256 = digest.hexdigest()
+        extension = _extension(filename)
+        directory = os.path.join(UPLOAD_DIR, sha256[:2])
+        path = os.path.join(directory, sha256 + extension)
+        os.makedirs(directory, exist_ok=True)
+        deduplicated = os.path.exists(path)
+        if not deduplicated:
+            os.replace(part, path)
+    finally:
+        if os.path.exists(part):
+            os.remove(part)
+
+    variants = []
+    if extension in IMAGE_EXTENSIONS and HAS_PILLOW:
+        variants = _existing_variants(path) if deduplicated else []
+        if not variants:
+            variants = await asyncio.wrap_future(_pool.submit(make_variants, path))
+
+    return {
+        "filename": filename,
+        "url": _url(path),
+        "sha256": sha256,
+        "size": size,
+        "deduplicated": deduplicated,
+        "variants": [
+            {"width": width or None, "format": os.path.splitext(variant)[1][1:], "url": _url(variant)}
+            for width, variant in variants
+        ],
+    }
+
+
+def _byte_range(header, size):
+    """(start, end) из заголовка Range; None — отдать файл целиком, ValueError — диапазон вне файла."""
+    match = _RANGE.fullmatch(header.strip())
+    # Несколько диапазонов и прочие единицы не поддерживаем — RFC 9110 разрешает ответить 200
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+    if size == 0:
+        raise ValueError
+    first, last = match.groups()
+    if first == "":
+        length = int(last)
+        if length == 0:
+            raise ValueError
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size:
+        raise ValueError
+    if start > end:
+        return None
+    return start, end
+
+
+class RangeFileResponse(FileResponse):
+    """Ответ 206 с частью файла [start, end]."""
+
+    def __init__(self, path, start, end, stat_result, headers=None):
+        super().__init__(path, status_code=206, headers=headers, stat_result=stat_result)
+        self.start = start
+        self.end = end
+        self.headers["content-range"] = f"bytes {start}-{end}/{stat_result.st_size}"
+        self.headers["content-length"] = str(end - start + 1)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() != "HEAD":
+            async with await anyio.open_file(self.path, mode="rb") as file:
+                await file.seek(self.start)
+                remaining = self.end - self.start + 1
+                while remaining > 0:
+                    chunk = await file.read(min(self.chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+class UploadStaticFiles(StaticFiles):
+    """StaticFiles с Range-запросами и immutable-кэшем для файлов, адресованных по содержимому."""
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        request_headers = Headers(scope=scope)
+        immutable = _HASHED_NAME.fullmatch(os.path.basename(full_path)) is not None
+        headers = {"accept-ranges": "bytes", "cache-control": IMMUTABLE if immutable else "no-cache"}
+
+        response = FileResponse(full_path, status_code=status_code, headers=headers, stat_result=stat_result)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        if status_code != 200 or range_header is None or (
+            if_range is not None and if_range not in (response.headers["etag"], response.headers["last-modified"])
+        ):
+            return response
+        try:
+            byte_range = _byte_range(range_header, stat_result.st_size)
+        except ValueError:
+            return Response(status_code=416, headers={"content-range": f"bytes */{stat_result.st_size}", **headers})
+        if byte_range is None:
+            return response
+        return RangeFileResponse(full_path, *byte_range, stat_result=stat_result, headers=headers)
@@ -0,0 +1,183 @@
+"""Метрики запросов: время обработчика, число и время SQL-запросов.
+
+Middleware заводит на каждый HTTP-запрос счетчик в contextvar, а хуки
+before/after_cursor_execute всех движков пишут в него каждый SQL-запрос.
+Итог уходит в заголовок Server-Timing и в гистограммы по маршрутам,
+которые отдает GET /metrics в текстовом формате Prometheus.
+
+Запросы дольше SLOW_QUERY_MS пишутся в лог slow_queries (в файл, если
+задан SLOW_QUERY_LOG). Для потоковых ответов (выгрузки) учитывается
+время до начала отправки тела.
+"""
+from contextvars import ContextVar
+import logging
+import os
+import threading
+import time
+
+from starlette.routing import Match
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG")
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+slow_log = logging.getLogger("slow_queries")
+if SLOW_QUERY_LOG:
+    _handler = logging.FileHandler(SLOW_QUERY_LOG, encoding="utf-8")
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    slow_log.addHandler(_handler)
+    slow_log.setLevel(logging.WARNING)
+
+
+class RequestStats:
+    def __init__(self, route=""):
+        self.route = route
+        self.queries = 0
+        self.db_time = 0.0
+        self.slowest = 0.0
+
+    def add(self, duration):
+        self.queries += 1
+        self.db_time += duration
+        self.slowest = max(self.slowest, duration)
+
+
+_current = ContextVar("request_stats", default=None)
+_slow_queries = 0
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    global _slow_queries
+    duration = time.perf_counter() - conn.info["query_started"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.add(duration)
+    if duration * 1000 >= SLOW_QUERY_MS:
+        with _lock:
+            _slow_queries += 1
+        slow_log.warning(
+            "slow query %.1f ms route=%s: %s",
+            duration * 1000, stats.route if stats else "-", " ".join(statement.split())[:1000]
+        )
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        counts, total, count = self.series.get(labels, ([0] * len(self.buckets), 0.0, 0))
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+        self.series[labels] = (counts, total + value, count + 1)
+
+    def render(self, name, help_text):
+        lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for labels, (counts, total, count) in sorted(self.series.items()):
+            label_text = _labels(labels)
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{name}_bucket{{{label_text},le="{bound}"}} {bucket_count}')
+            lines.append(f'{name}_bucket{{{label_text},le="+Inf"}} {count}')
+            lines.append(f"{name}_sum{{{label_text}}} {total}")
+            lines.append(f"{name}_count{{{label_text}}} {count}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    method, route = labels
+    return f'method="{_escape(method)}",route="{_escape(route)}"'
+
+
+_lock = threading.Lock()
+_statuses = {}
+_durations = Histogram(DURATION_BUCKETS)
+_db_durations = Histogram(DURATION_BUCKETS)
+_query_counts = Histogram(QUERY_COUNT_BUCKETS)
+
+
+def observe(method, route, status_code, duration, stats: RequestStats):
+    labels = (method, route)
+    with _lock:
+        status_key = labels + (status_code,)
+        _statuses[status_key] = _statuses.get(status_key, 0) + 1
+        _durations.observe(labels, duration)
+        _db_durations.observe(labels, stats.db_time)
+        _query_counts.observe(labels, stats.queries)
+
+
+def counter_lines(name, help_text, samples):
+    """Строки счетчика Prometheus; samples — [(строка меток, значение)]."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+    lines.extend(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}" for labels, value in samples)
+    return lines
+
+
+def render():
+    with _lock:
+        lines = counter_lines(
+            "http_requests_total", "HTTP requests by route and status.",
+            [
+                (f'{_labels((method, route))},status="{status}"', count)
+                for (method, route, status), count in sorted(_statuses.items())
+            ]
+        )
+        lines += _durations.render("http_request_duration_seconds", "Time until the response starts.")
+        lines += _db_durations.render("http_request_db_seconds", "Total SQL time per request.")
+        lines += _query_counts.render("http_request_db_queries", "SQL statements per request.")
+        lines += counter_lines(
+            "db_slow_queries_total", f"SQL statements slower than {SLOW_QUERY_MS} ms.", [("", _slow_queries)]
+        )
+    return lines
+
+
+def _route_path(request):
+    """Шаблон маршрута как метка: /salons/{salon_id}, а не /salons/7."""
+    route = request.scope.get("route")
+    if route is not None:
+        return route.path
+    # Ответ из кэша не доходит до роутера — ищем маршрут сами
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "unmatched")
+    return "unmatched"
+
+
+def _server_timing(stats: RequestStats, duration):
+    parts = [f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"']
+    if stats.queries:
+        parts.append(f"db-slowest;dur={stats.slowest * 1000:.1f}")
+    parts.append(f"app;dur={duration * 1000:.1f}")
+    return ", ".join(parts)
+
+
+async def middleware(request, call_next):
+    """Для app.middleware("http"): считает запросы к БД и время обработки."""
+    stats = RequestStats(request.url.path)
+    token = _current.set(stats)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        _current.reset(token)
+    duration = time.perf_counter() - started
+    stats.route = _route_path(request)
+    observe(request.method, stats.route, response.status_code, duration, stats)
+    response.headers["Server-Timing"] = _server_timing(stats, duration)
+    return response
@@ -0,0 +1,114 @@
+"""Миграции схемы БД.
+
+create_all создает только недостающие таблицы: новый индекс или колонку
+в существующую базу он не добавит. Поэтому схема меняется нумерованными
+шагами из MIGRATIONS; примененные записываются в schema_migrations, а
+недостающие выполняются по порядку при старте приложения и из CLI:
+
+    python migrations.py            # применить недостающие
+    python migrations.py status     # что применено, что ожидает
+
+Воркеры uvicorn стартуют одновременно, поэтому каждый шаг выполняется под
+блокировкой записи: остальные ждут и затем видят шаг уже примененным.
+"""
+from datetime import datetime
+import sys
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, insert, select, text
+
+import models
+from database import engine as default_engine
+
+schema_migrations = Table(
+    "schema_migrations", MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String),
+    Column("applied_at", DateTime),
+)
+
+
+def _create_tables(connection):
+    models.Base.metadata.create_all(bind=connection)
+
+
+def _create_indexes(*names):
+    def migrate(connection):
+        indexes = {
+            index.name: index
+            for table in models.Base.metadata.tables.values()
+            for index in table.indexes
+        }
+        for name in names:
+            indexes[name].create(bind=connection, checkfirst=True)
+    return migrate
+
+
+# (версия, описание, функция(connection)); новые шаги — только в конец
+MIGRATIONS = [
+    (1, "create tables", _create_tables),
+    (2, "appointments: master_id + start_time", _create_indexes("ix_appointments_master_start")),
+    (3, "indexes for listing, booking and analytics queries", _create_indexes(
+        "ix_appointments_client_id",
+        "ix_appointments_start_status",
+        "ix_masters_salon_id",
+        "ix_clients_salon_id",
+        "ix_clients_user_id",
+    )),
+]
+
+
+# Ключ advisory-блокировки PostgreSQL для миграций
+_LOCK_KEY = 7352801
+
+
+def _lock(connection):
+    if connection.dialect.name == "sqlite":
+        # pysqlite сам не открывает транзакцию до DML; IMMEDIATE сразу берет блокировку записи
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+    elif connection.dialect.name == "postgresql":
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _LOCK_KEY})
+
+
+def _applied(connection):
+    return {version for (version,) in connection.execute(select(schema_migrations.c.version))}
+
+
+def upgrade(engine=default_engine):
+    """Применяет недостающие миграции, возвращает список примененных версий."""
+    done = []
+    for version, name, migrate in MIGRATIONS:
+        with engine.begin() as connection:
+            _lock(connection)
+            schema_migrations.create(bind=connection, checkfirst=True)
+            if version in _applied(connection):
+                continue
+            migrate(connection)
+            connection.execute(insert(schema_migrations).values(
+                version=version, name=name, applied_at=datetime.now()
+            ))
+        done.append(version)
+    return done
+
+
+def status(engine=default_engine):
+    """[(версия, описание, когда применена или None)]."""
+    with engine.begin() as connection:
+        _lock(connection)
+        schema_migrations.create(bind=connection, checkfirst=True)
+        applied = dict(connection.execute(
+            select(schema_migrations.c.version, schema_migrations.c.applied_at)
+        ).all())
+    return [(version, name, applied.get(version)) for version, name, _ in MIGRATIONS]
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "upgrade"
+    if command == "upgrade":
+        done = upgrade()
+        print(f"Применено миграций: {len(done)}" + (f" ({', '.join(map(str, done))})" if done else ""))
+    elif command == "status":
+        for version, name, applied_at in status():
+            print(f"{version:>4}  {'+' if applied_at else ' '}  {name}" + (f"  ({applied_at:%Y-%m-%d %H:%M})" if applied_at else ""))
+    else:
+        print("Использование: python migrations.py [upgrade|status]")
+        sys.exit(2)
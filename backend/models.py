@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float, Date, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -28,7 +28,7 @@ class Master(Base):
     __tablename__ = "masters"
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String)
-    salon_id = Column(Integer, ForeignKey("salons.id"))
+    salon_id = Column(Integer, ForeignKey("salons.id"), index=True)
     specialization = Column(String, default="Парикмахер")
     experience = Column(String, default="3+ года")
     photo_url = Column(String, default="")
@@ -42,8 +42,8 @@ class Client(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String)
     phone = Column(String)
-    salon_id = Column(Integer, ForeignKey("salons.id"))
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    salon_id = Column(Integer, ForeignKey("salons.id"), index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
 
     salon = relationship("Salon", back_populates="clients")
     appointments = relationship("Appointment", back_populates="client")
@@ -51,6 +51,14 @@ class Client(Base):
 
 class Appointment(Base):
     __tablename__ = "appointments"
+    __table_args__ = (
+        # Занятость и зарплата мастера за период
+        Index("ix_appointments_master_start", "master_id", "start_time"),
+        # Записи клиента (rowid в конце индекса дает порядок по id без сортировки)
+        Index("ix_appointments_client_id", "client_id"),
+        # Периоды в аналитике, выгрузках и фильтре дат; статус проверяется по индексу
+        Index("ix_appointments_start_status", "start_time", "status"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     master_id = Column(Integer, ForeignKey("masters.id"))
     client_id = Column(Integer, ForeignKey("clients.id"))
@@ -61,4 +69,54 @@ class Appointment(Base):
     status = Column(String, default="confirmed")
 
     master = relationship("Master", back_populates="appointments")
-    client = relationship("Client", back_populates="appointments")
\ No newline at end of file
+    client = relationship("Client", back_populates="appointments")
+
+class AppointmentDailyRollup(Base):
+    """Предагрегированные записи: (день, салон, мастер, услуга, статус) -> количество/выручка."""
+    __tablename__ = "appointment_daily_rollup"
+    __table_args__ = (
+        UniqueConstraint("day", "salon_id", "master_id", "service", "status", name="uq_rollup_key"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, index=True)
+    salon_id = Column(Integer, index=True)
+    master_id = Column(Integer, index=True)
+    service = Column(String)
+    status = Column(String)
+    appointments_count = Column(Integer, default=0)
+    revenue = Column(Float, default=0.0)
+
+class MasterPayroll(Base):
+    """Материализованная зарплата: (день, мастер) -> подтвержденные записи, минуты работы, начислено."""
+    __tablename__ = "master_payroll"
+    __table_args__ = (
+        UniqueConstraint("day", "master_id", name="uq_payroll_key"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, index=True)
+    master_id = Column(Integer, index=True)
+    appointments_count = Column(Integer, default=0)
+    worked_minutes = Column(Float, default=0.0)
+    revenue = Column(Float, default=0.0)
+    earnings = Column(Float, default=0.0)
+
+class PayrollDirty(Base):
+    """Очередь пересчета зарплаты: (мастер, день); day = NULL — все дни мастера."""
+    __tablename__ = "payroll_dirty"
+    id = Column(Integer, primary_key=True)
+    master_id = Column(Integer)
+    day = Column(Date, nullable=True)
+
+class Job(Base):
+    """Фоновая задача (выгрузка, отчет): параметры в JSON, результат — файл в JOBS_DIR."""
+    __tablename__ = "jobs"
+    id = Column(String, primary_key=True)
+    kind = Column(String)
+    params = Column(String)
+    status = Column(String, default="queued", index=True)
+    pid = Column(Integer)
+    created_at = Column(DateTime)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    size = Column(Integer)
+    error = Column(String)
@@ -0,0 +1,350 @@
+"""Зарплата мастеров по фактической длительности записей.
+
+Начислено = часы подтвержденных записей (end_time - start_time) * ставка
+мастера. Результат материализован в master_payroll по ключу (день, мастер):
+зарплата за любой период — сумма дней плюс неполные крайние дни из сырой
+таблицы, как у rollup.
+
+Запись, ее удаление или смена ставки мастера помечают затронутые
+(мастер, день) в payroll_dirty в той же транзакции. Фоновый поток после
+commit пересчитывает только помеченное; чтение, заставшее пометки,
+дожидается пересчета, так что устаревших цифр не бывает. Вставки мимо ORM
+(bulk) помечают сами через mark_dirty(). PAYROLL_WORKER=0 отключает поток —
+тогда пересчет идет при чтении.
+
+    python payroll.py rebuild
+    python payroll.py check
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+import logging
+import os
+import sys
+import threading
+
+from sqlalchemy import case, delete, event, func, inspect, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, object_session
+
+import models
+import rollup
+from database import SessionLocal, engine
+
+Payroll = models.MasterPayroll
+Dirty = models.PayrollDirty
+
+PAYROLL_STATUSES = ("confirmed",)
+PAYROLL_WORKER = os.getenv("PAYROLL_WORKER", "1") not in ("0", "false", "False")
+
+log = logging.getLogger("payroll")
+
+_PENDING = "payroll_pending"
+_refresh_lock = threading.Lock()
+_wake = threading.Event()
+_worker = None
+
+
+def _as_date(value):
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value))
+
+
+def _minutes(dialect_name):
+    start, end = models.Appointment.start_time, models.Appointment.end_time
+    if dialect_name == "sqlite":
+        # julianday дает доли суток; округление убирает хвосты вроде 59.9999999
+        minutes = func.round((func.julianday(end) - func.julianday(start)) * 1440, 3)
+    else:
+        minutes = func.extract("epoch", end - start) / 60
+    return case((minutes > 0, minutes), else_=0.0)
+
+
+def _live_query(dialect_name, filters, by_day=True):
+    """(день?, мастер, записей, минут, выручка, начислено) по сырой таблице."""
+    minutes = func.coalesce(func.sum(_minutes(dialect_name)), 0.0)
+    keys = [models.Appointment.master_id]
+    if by_day:
+        keys.insert(0, func.date(models.Appointment.start_time))
+    return select(
+        *keys,
+        func.count(models.Appointment.id),
+        minutes,
+        func.coalesce(func.sum(models.Appointment.price), 0.0),
+        minutes / 60 * func.coalesce(models.Master.hourly_rate, 0.0),
+    ).select_from(models.Appointment).join(
+        models.Master, models.Appointment.master_id == models.Master.id
+    ).where(
+        models.Appointment.status.in_(PAYROLL_STATUSES), *filters
+    ).group_by(*keys, models.Master.hourly_rate)
+
+
+def _payroll_rows(rows):
+    return [
+        {
+            "day": _as_date(day),
+            "master_id": master_id,
+            "appointments_count": count,
+            "worked_minutes": minutes,
+            "revenue": revenue,
+            "earnings": earnings,
+        }
+        for day, master_id, count, minutes, revenue, earnings in rows
+    ]
+
+
+def _recompute(connection, keys):
+    """Пересчитывает master_payroll для {(мастер, день)}; день None — все дни мастера."""
+    whole = {master_id for master_id, day in keys if day is None}
+    by_day = defaultdict(set)
+    for master_id, day in keys:
+        if day is not None and master_id not in whole:
+            by_day[day].add(master_id)
+
+    scopes = []
+    if whole:
+        scopes.append(([Payroll.master_id.in_(whole)], [models.Appointment.master_id.in_(whole)]))
+    for day, masters in sorted(by_day.items()):
+        day_start = datetime.combine(day, time.min)
+        scopes.append((
+            [Payroll.day == day, Payroll.master_id.in_(masters)],
+            [
+                models.Appointment.master_id.in_(masters),
+                models.Appointment.start_time >= day_start,
+                models.Appointment.start_time < day_start + timedelta(days=1),
+            ],
+        ))
+    for stale, filters in scopes:
+        connection.execute(delete(Payroll).where(*stale))
+        rows = connection.execute(_live_query(connection.dialect.name, filters)).all()
+        if rows:
+            connection.execute(insert(Payroll), _payroll_rows(rows))
+
+
+def mark_dirty(connection, keys):
+    """Помечает {(мастер, день)} к пересчету в текущей транзакции."""
+    keys = {(master_id, day) for master_id, day in keys if master_id is not None}
+    if keys:
+        connection.execute(insert(Dirty), [{"master_id": master_id, "day": day} for master_id, day in keys])
+
+
+def refresh():
+    """Пересчитывает все помеченные (мастер, день); возвращает число ключей."""
+    with _refresh_lock, engine.begin() as connection:
+        marks = connection.execute(select(Dirty.id, Dirty.master_id, Dirty.day)).all()
+        if not marks:
+            return 0
+        keys = {(master_id, day) for _, master_id, day in marks}
+        _recompute(connection, keys)
+        # Пометки, появившиеся после чтения, получили id больше и дождутся следующего прохода
+        connection.execute(delete(Dirty).where(Dirty.id <= max(mark_id for mark_id, _, _ in marks)))
+    return len(keys)
+
+
+def _run_worker():
+    while True:
+        _wake.wait()
+        _wake.clear()
+        try:
+            refresh()
+        except SQLAlchemyError:
+            # Пометки остались в таблице — их подберет следующий проход или чтение
+            log.exception("payroll refresh failed")
+
+
+def start_worker():
+    """Запускает фоновый пересчет (один поток на процесс)."""
+    global _worker
+    if not PAYROLL_WORKER or _worker is not None:
+        return
+    _worker = threading.Thread(target=_run_worker, name="payroll", daemon=True)
+    _worker.start()
+    # Пометки, оставшиеся от прошлого запуска
+    _wake.set()
+
+
+def wake():
+    if _worker is not None:
+        _wake.set()
+
+
+def totals(db: Session, start_dt=None, end_dt=None, salon_id=None):
+    """{master_id: [записей, минут, выручка, начислено]} за период [start_dt, end_dt]."""
+    first_day, last_day, edges, use_table = rollup.plan_range(start_dt, end_dt)
+    result = defaultdict(lambda: [0, 0.0, 0.0, 0.0])
+
+    if use_table:
+        if db.query(Dirty.id).first() is not None:
+            refresh()
+        query = db.query(
+            Payroll.master_id,
+            func.sum(Payroll.appointments_count),
+            func.sum(Payroll.worked_minutes),
+            func.sum(Payroll.revenue),
+            func.sum(Payroll.earnings),
+        )
+        if first_day is not None:
+            query = query.filter(Payroll.day >= first_day)
+        if last_day is not None:
+            query = query.filter(Payroll.day <= last_day)
+        if salon_id is not None:
+            query = query.join(models.Master, Payroll.master_id == models.Master.id).filter(
+                models.Master.salon_id == salon_id
+            )
+        for master_id, *values in query.group_by(Payroll.master_id).all():
+            entry = result[master_id]
+            for index, value in enumerate(values):
+                entry[index] += value or 0
+
+    dialect_name = db.get_bind().dialect.name
+    for filters in edges:
+        if salon_id is not None:
+            filters = filters + [models.Master.salon_id == salon_id]
+        for master_id, *values in db.execute(_live_query(dialect_name, filters, by_day=False)).all():
+            entry = result[master_id]
+            for index, value in enumerate(values):
+                entry[index] += value or 0
+
+    return {master_id: value for master_id, value in result.items() if value[0]}
+
+
+def rebuild(db: Session):
+    """Перестраивает master_payroll из сырой таблицы appointments."""
+    db.execute(delete(Payroll))
+    db.execute(delete(Dirty))
+    rows = db.execute(_live_query(db.get_bind().dialect.name, [])).all()
+    if rows:
+        db.execute(insert(Payroll), _payroll_rows(rows))
+    db.commit()
+    return len(rows)
+
+
+def backfill_if_empty(db: Session):
+    """Заполняет master_payroll при первом запуске на уже существующей базе."""
+    if db.query(Payroll.id).first() is not None:
+        return 0
+    if db.query(models.Appointment.id).filter(models.Appointment.status.in_(PAYROLL_STATUSES)).first() is None:
+        return 0
+    return rebuild(db)
+
+
+def check_consistency(db: Session, tolerance=0.01):
+    """Сравнивает master_payroll с живым расчетом, возвращает список расхождений."""
+    live = {
+        (_as_date(day), master_id): (count, minutes, earnings)
+        for day, master_id, count, minutes, _, earnings
+        in db.execute(_live_query(db.get_bind().dialect.name, [])).all()
+    }
+    stored = {
+        (row.day, row.master_id): (row.appointments_count, row.worked_minutes, row.earnings)
+        for row in db.query(Payroll).all()
+    }
+    mismatches = []
+    for key in sorted(set(live) | set(stored), key=repr):
+        live_value = live.get(key, (0, 0.0, 0.0))
+        stored_value = stored.get(key, (0, 0.0, 0.0))
+        if live_value[0] != stored_value[0] or any(
+            abs(a - b) > tolerance for a, b in zip(live_value[1:], stored_value[1:])
+        ):
+            mismatches.append({
+                "key": {"day": key[0], "master_id": key[1]},
+                "live": dict(zip(("count", "minutes", "earnings"), live_value)),
+                "payroll": dict(zip(("count", "minutes", "earnings"), stored_value)),
+            })
+    return mismatches
+
+
+def _touch(connection, target, keys):
+    mark_dirty(connection, keys)
+    session = object_session(target)
+    if session is not None:
+        session.info[_PENDING] = True
+
+
+def _appointment_key(master_id, start_time, status):
+    if start_time is None or status not in PAYROLL_STATUSES:
+        return None
+    return (master_id, start_time.date())
+
+
+def _old_value(state, name):
+    history = state.attrs[name].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(state.obj(), name)
+
+
+@event.listens_for(models.Appointment, "after_insert")
+def _on_appointment_insert(mapper, connection, target):
+    key = _appointment_key(target.master_id, target.start_time, target.status)
+    if key is not None:
+        _touch(connection, target, {key})
+
+
+@event.listens_for(models.Appointment, "after_update")
+def _on_appointment_update(mapper, connection, target):
+    state = inspect(target)
+    tracked = ("start_time", "end_time", "master_id", "status", "price")
+    if not any(state.attrs[name].history.has_changes() for name in tracked):
+        return
+    keys = {
+        _appointment_key(_old_value(state, "master_id"), _old_value(state, "start_time"), _old_value(state, "status")),
+        _appointment_key(target.master_id, target.start_time, target.status),
+    }
+    keys.discard(None)
+    if keys:
+        _touch(connection, target, keys)
+
+
+@event.listens_for(models.Appointment, "after_delete")
+def _on_appointment_delete(mapper, connection, target):
+    state = inspect(target)
+    key = _appointment_key(
+        _old_value(state, "master_id"), _old_value(state, "start_time"), _old_value(state, "status")
+    )
+    if key is not None:
+        _touch(connection, target, {key})
+
+
+@event.listens_for(models.Master, "after_update")
+def _on_master_update(mapper, connection, target):
+    # Новая ставка меняет начисления за все дни мастера
+    if inspect(target).attrs.hourly_rate.history.has_changes():
+        _touch(connection, target, {(target.id, None)})
+
+
+@event.listens_for(models.Master, "after_delete")
+def _on_master_delete(mapper, connection, target):
+    _touch(connection, target, {(target.id, None)})
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    if session.info.pop(_PENDING, False):
+        wake()
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop(_PENDING, None)
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "check"
+    import migrations
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    try:
+        if command == "rebuild":
+            print(f"Зарплата пересчитана: {rebuild(db)} строк")
+        elif command == "check":
+            mismatches = check_consistency(db)
+            for mismatch in mismatches:
+                print(mismatch)
+            print(f"Расхождений: {len(mismatches)}")
+            sys.exit(1 if mismatches else 0)
+        else:
+            print("Использование: python payroll.py [rebuild|check]")
+            sys.exit(2)
+    finally:
+        db.close()
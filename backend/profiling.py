@@ -0,0 +1,214 @@
+"""Профилирование живых обработчиков без передеплоя.
+
+Статистический профайлер: отдельный поток раз в PROFILE_INTERVAL_MS снимает
+стеки всех потоков процесса (цикл событий, пул потоков с синхронными
+обработчиками), поэтому в профиль попадают SQLAlchemy и сериализация ответа.
+Ожидающие потоки отбрасываются.
+
+Включается только при заданном PROFILING_TOKEN, токен передается
+заголовком X-Profile-Token:
+
+    GET /api/analytics/master-earnings?__profile=1            один запрос
+    GET /api/analytics/master-earnings?__profile=1&__profile_format=html
+    GET /debug/profile?seconds=30&format=collapsed            окно в N секунд
+
+Вместо ответа возвращается профиль: collapsed stacks (flamegraph.pl,
+speedscope) или HTML с flame graph. В профиль попадают все запросы,
+идущие в это время в процессе; при нескольких воркерах — только тот,
+куда попал запрос.
+"""
+import asyncio
+from collections import Counter
+import functools
+import hmac
+import html
+import os
+import sys
+import threading
+import time
+
+from fastapi import APIRouter, Header, HTTPException, Query
+from starlette.responses import HTMLResponse, PlainTextResponse
+
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+MAX_PROFILE_SECONDS = 300
+PROFILE_PARAM = "__profile"
+FORMAT_PARAM = "__profile_format"
+FORMATS = ("collapsed", "html")
+
+# Листовые функции потоков, которые ждут работы, а не работают
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+}
+
+router = APIRouter()
+_running = threading.Lock()
+
+
+@functools.lru_cache(maxsize=4096)
+def _short_path(filename):
+    marker = "site-packages" + os.sep
+    if marker in filename:
+        return filename.rsplit(marker, 1)[1]
+    return os.path.basename(filename)
+
+
+def _stack(frame):
+    code = frame.f_code
+    if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+        return None
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        # co_qualname появился в Python 3.11
+        frames.append(f"{_short_path(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}")
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+
+class Sampler:
+    """Счетчик сэмплов по стекам; start()/stop() вокруг профилируемого участка."""
+
+    def __init__(self, interval=PROFILE_INTERVAL_MS / 1000):
+        self.interval = interval
+        self.stacks = Counter()
+        self.started = self.stopped = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.stopped = time.perf_counter()
+        return self
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = _stack(frame)
+                if stack:
+                    self.stacks[stack] += 1
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def html(self, title):
+        root = {"children": {}, "value": 0}
+        for stack, count in self.stacks.items():
+            node = root
+            node["value"] += count
+            for name in stack.split(";"):
+                node = node["children"].setdefault(name, {"children": {}, "value": 0})
+                node["value"] += count
+        total = root["value"] or 1
+        body = "".join(_flame_nodes(root, total))
+        return HTML_TEMPLATE.format(
+            title=html.escape(title),
+            summary=f"{root['value']} сэмплов за {self.stopped - self.started:.2f} с, шаг {self.interval * 1000:g} мс",
+            body=body,
+        )
+
+
+def _flame_nodes(node, total):
+    # Узлы меньше 0.1% не рисуются: в HTML они не видны, а страницу раздувают
+    for name, child in sorted(node["children"].items(), key=lambda item: -item[1]["value"]):
+        if child["value"] * 1000 < total:
+            continue
+        share = child["value"] / node["value"] * 100
+        label = html.escape(name)
+        title = f"{label} — {child['value']} ({child['value'] / total * 100:.1f}%)"
+        yield f'<div class="node" style="width:{share:.3f}%"><div class="frame" title="{title}">{label}</div>'
+        yield '<div class="children">'
+        yield from _flame_nodes(child, total)
+        yield "</div></div>"
+
+
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title><style>
+body {{ font: 12px monospace; margin: 16px; }}
+.children {{ display: flex; }}
+.node {{ overflow: hidden; }}
+.frame {{ background: #f5b971; border: 1px solid #fff; padding: 1px 2px; white-space: nowrap;
+  overflow: hidden; text-overflow: ellipsis; }}
+.frame:hover {{ background: #f08a24; }}
+</style></head><body><h3>{title}</h3><p>{summary}</p><div class="children">{body}</div></body></html>
+"""
+
+
+def render(sampler: Sampler, output_format, title):
+    if output_format == "html":
+        return HTMLResponse(sampler.html(title))
+    return PlainTextResponse(sampler.collapsed())
+
+
+def _authorized(token):
+    return PROFILING_TOKEN is not None and token is not None and hmac.compare_digest(token, PROFILING_TOKEN)
+
+
+async def middleware(request, call_next):
+    """Для app.middleware("http"): ?__profile=1 возвращает профиль вместо ответа."""
+    if PROFILING_TOKEN is None or PROFILE_PARAM not in request.query_params:
+        return await call_next(request)
+    if not _authorized(request.headers.get("x-profile-token")):
+        return PlainTextResponse("Invalid profiling token", status_code=403)
+    output_format = request.query_params.get(FORMAT_PARAM, "collapsed")
+    if output_format not in FORMATS:
+        return PlainTextResponse(f"{FORMAT_PARAM} must be one of {', '.join(FORMATS)}", status_code=400)
+    if not _running.acquire(blocking=False):
+        return PlainTextResponse("Profiling already running", status_code=409)
+
+    # Обработчик получает запрос без служебных параметров
+    request.scope["query_string"] = b"&".join(
+        pair for pair in request.scope["query_string"].split(b"&")
+        if pair.split(b"=", 1)[0].decode("latin-1") not in (PROFILE_PARAM, FORMAT_PARAM)
+    )
+    try:
+        sampler = Sampler().start()
+        try:
+            response = await call_next(request)
+            # Тело дочитывается под профайлером: потоковые ответы и сериализация тоже в профиле
+            async for _ in response.body_iterator:
+                pass
+        finally:
+            sampler.stop()
+    finally:
+        _running.release()
+    profile = render(sampler, output_format, f"{request.method} {request.url.path}")
+    profile.headers["X-Profiled-Status"] = str(response.status_code)
+    return profile
+
+
+@router.get("/debug/profile")
+async def get_profile(
+    seconds: float = Query(10, gt=0, le=MAX_PROFILE_SECONDS),
+    format: str = Query("collapsed", pattern="^(collapsed|html)$"),
+    x_profile_token: str = Header(None),
+):
+    """Профиль всего процесса за seconds секунд."""
+    if PROFILING_TOKEN is None:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if not _authorized(x_profile_token):
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+    if not _running.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="Profiling already running")
+    try:
+        sampler = Sampler().start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            sampler.stop()
+    finally:
+        _running.release()
+    return render(sampler, format, f"Профиль процесса за {seconds:g} с")
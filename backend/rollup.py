@@ -0,0 +1,414 @@
+"""Дневной rollup записей для аналитики.
+
+Таблица appointment_daily_rollup хранит count/sum(price) по ключу
+(день, салон, мастер, услуга, статус). Она обновляется инкрементально
+через ORM-события Appointment/Master в той же транзакции, что и сама запись,
+и может быть полностью перестроена из сырой таблицы:
+
+    python rollup.py rebuild
+    python rollup.py check
+"""
+import sys
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import and_, bindparam, delete, event, func, inspect, insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal, engine
+
+Rollup = models.AppointmentDailyRollup
+
+KEY_COLUMNS = ("day", "salon_id", "master_id", "service", "status")
+
+
+def _key_conditions(key):
+    conditions = []
+    for name, value in zip(KEY_COLUMNS, key):
+        column = getattr(Rollup, name)
+        conditions.append(column.is_(None) if value is None else column == value)
+    return conditions
+
+
+# С этого числа ключей дельты применяются пакетом (массовая загрузка)
+BATCH_THRESHOLD = 8
+
+# Диалекты с INSERT ... ON CONFLICT DO UPDATE
+_UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def _can_upsert(connection, key):
+    # NULL в ключе уникальный индекс не ловит — такие строки идут через UPDATE/INSERT
+    return connection.dialect.name in _UPSERT_INSERTS and None not in key
+
+
+def _upsert(connection, rows):
+    """Прибавляет count/revenue к строкам ключа одним запросом, создавая недостающие.
+
+    Две транзакции, первыми пишущие один ключ, не падают на uq_rollup_key:
+    вторая ждет первую и прибавляет к ее строке.
+    """
+    statement = _UPSERT_INSERTS[connection.dialect.name](Rollup)
+    statement = statement.on_conflict_do_update(
+        index_elements=list(KEY_COLUMNS),
+        set_={
+            "appointments_count": Rollup.appointments_count + statement.excluded.appointments_count,
+            "revenue": Rollup.revenue + statement.excluded.revenue,
+        },
+    )
+    connection.execute(statement, rows)
+
+
+def apply_deltas(connection, deltas):
+    """Применяет {ключ: [count, revenue]} к rollup-таблице."""
+    deltas = {key: value for key, value in deltas.items() if value[0] or value[1]}
+    if len(deltas) >= BATCH_THRESHOLD:
+        _apply_deltas_batch(connection, deltas)
+        return
+    for key, (count, revenue) in deltas.items():
+        conditions = _key_conditions(key)
+        if _can_upsert(connection, key):
+            _upsert(connection, [{**dict(zip(KEY_COLUMNS, key)), "appointments_count": count, "revenue": revenue}])
+            if count < 0:
+                connection.execute(delete(Rollup).where(*conditions, Rollup.appointments_count <= 0))
+            continue
+        result = connection.execute(
+            update(Rollup)
+            .where(*conditions)
+            .values(
+                appointments_count=Rollup.appointments_count + count,
+                revenue=Rollup.revenue + revenue,
+            )
+        )
+        if result.rowcount == 0:
+            connection.execute(
+                insert(Rollup).values(
+                    **dict(zip(KEY_COLUMNS, key)),
+                    appointments_count=count,
+                    revenue=revenue,
+                )
+            )
+        elif count < 0:
+            connection.execute(
+                delete(Rollup).where(*conditions, Rollup.appointments_count <= 0)
+            )
+
+
+def _apply_deltas_batch(connection, deltas):
+    # Существующие строки — одним запросом по дням, дальше executemany
+    days = {key[0] for key in deltas}
+    day_conditions = [Rollup.day.in_([day for day in days if day is not None])]
+    if None in days:
+        day_conditions.append(Rollup.day.is_(None))
+    existing = {
+        tuple(row[1:]): row[0]
+        for row in connection.execute(
+            select(Rollup.id, *(getattr(Rollup, name) for name in KEY_COLUMNS)).where(or_(*day_conditions))
+        )
+    }
+    updates, inserts, upserts, shrinking = [], [], [], []
+    for key, (count, revenue) in deltas.items():
+        row_id = existing.get(key)
+        if row_id is None:
+            # Ключ может появиться в соседней транзакции после чтения existing
+            row = {**dict(zip(KEY_COLUMNS, key)), "appointments_count": count, "revenue": revenue}
+            (upserts if _can_upsert(connection, key) else inserts).append(row)
+        else:
+            updates.append({"row_id": row_id, "delta_count": count, "delta_revenue": revenue})
+            if count < 0:
+                shrinking.append(row_id)
+    if updates:
+        connection.execute(
+            update(Rollup)
+            .where(Rollup.id == bindparam("row_id"))
+            .values(
+                appointments_count=Rollup.appointments_count + bindparam("delta_count"),
+                revenue=Rollup.revenue + bindparam("delta_revenue"),
+            ),
+            updates
+        )
+    if inserts:
+        connection.execute(insert(Rollup), inserts)
+    if upserts:
+        _upsert(connection, upserts)
+    if shrinking:
+        connection.execute(
+            delete(Rollup).where(Rollup.id.in_(shrinking), Rollup.appointments_count <= 0)
+        )
+
+
+def _master_salon_id(connection, master_id):
+    if master_id is None:
+        return None
+    return connection.execute(
+        select(models.Master.salon_id).where(models.Master.id == master_id)
+    ).scalar()
+
+
+def _appointment_key(connection, start_time, master_id, service, status):
+    day = start_time.date() if start_time is not None else None
+    return (day, _master_salon_id(connection, master_id), master_id, service, status)
+
+
+def _old_value(state, name):
+    history = state.attrs[name].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(state.obj(), name)
+
+
+@event.listens_for(models.Appointment, "after_insert")
+def _on_appointment_insert(mapper, connection, target):
+    key = _appointment_key(
+        connection, target.start_time, target.master_id, target.service, target.status
+    )
+    apply_deltas(connection, {key: [1, target.price or 0.0]})
+
+
+@event.listens_for(models.Appointment, "after_update")
+def _on_appointment_update(mapper, connection, target):
+    state = inspect(target)
+    tracked = ("start_time", "master_id", "service", "status", "price")
+    if not any(state.attrs[name].history.has_changes() for name in tracked):
+        return
+    old = {name: _old_value(state, name) for name in tracked}
+    old_key = _appointment_key(
+        connection, old["start_time"], old["master_id"], old["service"], old["status"]
+    )
+    new_key = _appointment_key(
+        connection, target.start_time, target.master_id, target.service, target.status
+    )
+    deltas = defaultdict(lambda: [0, 0.0])
+    deltas[old_key][0] -= 1
+    deltas[old_key][1] -= old["price"] or 0.0
+    deltas[new_key][0] += 1
+    deltas[new_key][1] += target.price or 0.0
+    apply_deltas(connection, deltas)
+
+
+@event.listens_for(models.Appointment, "after_delete")
+def _on_appointment_delete(mapper, connection, target):
+    old = {
+        name: _old_value(inspect(target), name)
+        for name in ("start_time", "master_id", "service", "status", "price")
+    }
+    key = _appointment_key(
+        connection, old["start_time"], old["master_id"], old["service"], old["status"]
+    )
+    apply_deltas(connection, {key: [-1, -(old["price"] or 0.0)]})
+
+
+@event.listens_for(models.Master, "after_update")
+def _on_master_update(mapper, connection, target):
+    # Мастер перешел в другой салон — переносим его агрегаты
+    if not inspect(target).attrs.salon_id.history.has_changes():
+        return
+    connection.execute(
+        update(Rollup)
+        .where(Rollup.master_id == target.id)
+        .values(salon_id=target.salon_id)
+    )
+
+
+def _live_query(db: Session, columns, *filters):
+    """Агрегат по сырой таблице appointments с теми же ключами, что и rollup."""
+    expressions = {
+        "day": func.date(models.Appointment.start_time),
+        "salon_id": models.Master.salon_id,
+        "master_id": models.Appointment.master_id,
+        "service": models.Appointment.service,
+        "status": models.Appointment.status,
+    }
+    group = [expressions[name] for name in columns]
+    return db.query(
+        *group,
+        func.count(models.Appointment.id),
+        func.coalesce(func.sum(models.Appointment.price), 0.0),
+    ).outerjoin(
+        models.Master, models.Appointment.master_id == models.Master.id
+    ).filter(*filters).group_by(*group)
+
+
+def _as_date(value):
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value))
+
+
+def rebuild(db: Session):
+    """Перестраивает rollup из сырой таблицы appointments."""
+    db.execute(delete(Rollup))
+    rows = _live_query(db, KEY_COLUMNS).all()
+    if rows:
+        db.execute(
+            insert(Rollup),
+            [
+                {
+                    "day": _as_date(day),
+                    "salon_id": salon_id,
+                    "master_id": master_id,
+                    "service": service,
+                    "status": status,
+                    "appointments_count": count,
+                    "revenue": revenue,
+                }
+                for day, salon_id, master_id, service, status, count, revenue in rows
+            ],
+        )
+    db.commit()
+    return len(rows)
+
+
+def backfill_if_empty(db: Session):
+    """Заполняет rollup при первом запуске на уже существующей базе."""
+    if db.query(Rollup.id).first() is not None:
+        return 0
+    if db.query(models.Appointment.id).first() is None:
+        return 0
+    return rebuild(db)
+
+
+def check_consistency(db: Session, tolerance=0.01):
+    """Сравнивает rollup с живым запросом, возвращает список расхождений."""
+    live = {
+        (_as_date(day), salon_id, master_id, service, status): (count, revenue)
+        for day, salon_id, master_id, service, status, count, revenue
+        in _live_query(db, KEY_COLUMNS).all()
+    }
+    stored = {
+        (row.day, row.salon_id, row.master_id, row.service, row.status):
+            (row.appointments_count, row.revenue or 0.0)
+        for row in db.query(Rollup).filter(Rollup.appointments_count != 0).all()
+    }
+    mismatches = []
+    for key in sorted(set(live) | set(stored), key=repr):
+        live_count, live_revenue = live.get(key, (0, 0.0))
+        stored_count, stored_revenue = stored.get(key, (0, 0.0))
+        if live_count != stored_count or abs(live_revenue - stored_revenue) > tolerance:
+            mismatches.append({
+                "key": dict(zip(KEY_COLUMNS, key)),
+                "live": {"count": live_count, "revenue": live_revenue},
+                "rollup": {"count": stored_count, "revenue": stored_revenue},
+            })
+    return mismatches
+
+
+def _naive(value):
+    if value is not None and value.tzinfo is not None:
+        return value.replace(tzinfo=None)
+    return value
+
+
+def plan_range(start_dt, end_dt):
+    """Делит [start_dt, end_dt] на целые дни (из rollup) и края (из сырой таблицы).
+
+    Возвращает (first_day, last_day, edges, use_rollup): None в first_day/last_day
+    означает открытую границу, use_rollup = False — в диапазоне нет целых суток.
+    """
+    start_dt, end_dt = _naive(start_dt), _naive(end_dt)
+    first_day = last_day = None
+    edges = []
+
+    if start_dt is not None:
+        first_day = start_dt.date()
+        if start_dt.time() != time.min:
+            first_day += timedelta(days=1)
+    if end_dt is not None:
+        last_day = end_dt.date()
+        if end_dt.time() != time.max:
+            last_day -= timedelta(days=1)
+
+    if first_day is not None and last_day is not None and first_day > last_day:
+        filters = []
+        if start_dt is not None:
+            filters.append(models.Appointment.start_time >= start_dt)
+        filters.append(models.Appointment.start_time <= end_dt)
+        return None, None, [filters], False
+
+    if start_dt is not None and start_dt.time() != time.min:
+        edges.append([
+            models.Appointment.start_time >= start_dt,
+            models.Appointment.start_time < datetime.combine(first_day, time.min),
+        ])
+    if end_dt is not None and end_dt.time() != time.max:
+        edges.append([
+            models.Appointment.start_time >= datetime.combine(end_dt.date(), time.min),
+            models.Appointment.start_time <= end_dt,
+        ])
+    return first_day, last_day, edges, True
+
+
+def aggregate(db: Session, group_by=(), start_dt=None, end_dt=None, statuses=None, salon_id=None):
+    """Возвращает {ключ группировки: [count, revenue]} за период [start_dt, end_dt].
+
+    Целые дни берутся из rollup, неполные крайние дни — из appointments.
+    salon_id ограничивает выборку одним салоном.
+    """
+    group_by = tuple(group_by)
+    first_day, last_day, edges, use_rollup = plan_range(start_dt, end_dt)
+    totals = defaultdict(lambda: [0, 0.0])
+
+    if use_rollup:
+        group = [getattr(Rollup, name) for name in group_by]
+        query = db.query(
+            *group,
+            func.sum(Rollup.appointments_count),
+            func.coalesce(func.sum(Rollup.revenue), 0.0),
+        )
+        if first_day is not None:
+            query = query.filter(Rollup.day >= first_day)
+        if last_day is not None:
+            query = query.filter(Rollup.day <= last_day)
+        if statuses is not None:
+            query = query.filter(Rollup.status.in_(statuses))
+        if salon_id is not None:
+            query = query.filter(Rollup.salon_id == salon_id)
+        for row in query.group_by(*group).all():
+            entry = totals[tuple(row[:-2])]
+            entry[0] += row[-2] or 0
+            entry[1] += row[-1] or 0.0
+
+    for filters in edges:
+        if statuses is not None:
+            filters = filters + [models.Appointment.status.in_(statuses)]
+        if salon_id is not None:
+            filters = filters + [models.Master.salon_id == salon_id]
+        for row in _live_query(db, group_by, and_(*filters)).all():
+            key = tuple(row[:-2])
+            if "day" in group_by:
+                index = group_by.index("day")
+                key = key[:index] + (_as_date(key[index]),) + key[index + 1:]
+            entry = totals[key]
+            entry[0] += row[-2]
+            entry[1] += row[-1] or 0.0
+
+    return {key: value for key, value in totals.items() if value[0]}
+
+
+def total(db: Session, start_dt=None, end_dt=None, statuses=None):
+    """Итоговые (count, revenue) без группировки."""
+    count, revenue = aggregate(db, (), start_dt, end_dt, statuses).get((), (0, 0.0))
+    return count, revenue
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "check"
+    import migrations
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    try:
+        if command == "rebuild":
+            print(f"Rollup перестроен: {rebuild(db)} строк")
+        elif command == "check":
+            mismatches = check_consistency(db)
+            for mismatch in mismatches:
+                print(mismatch)
+            print(f"Расхождений: {len(mismatches)}")
+            sys.exit(1 if mismatches else 0)
+        else:
+            print("Использование: python rollup.py [rebuild|check]")
+            sys.exit(2)
+    finally:
+        db.close()
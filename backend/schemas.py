@@ -64,6 +64,12 @@ class Appointment(AppointmentBase):
     class Config:
         from_attributes = True
 
+class AppointmentStatusUpdate(BaseModel):
+    status: str
+
+class SalonNearby(Salon):
+    distance_km: float
+
 class SalonWithMasters(Salon):
     masters: List[Master] = []
 
@@ -89,4 +95,24 @@ class User(UserBase):
 
 class UserLogin(BaseModel):
     username: str
-    password: str
\ No newline at end of file
+    password: str
+
+class JobCreate(BaseModel):
+    kind: str
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    salon_id: Optional[int] = None
+    gzip: bool = False
+
+class Job(BaseModel):
+    id: str
+    kind: str
+    status: str
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    size: Optional[int] = None
+    error: Optional[str] = None
+
+    class Config:
+        from_attributes = True
@@ -1,10 +1,12 @@
 from sqlalchemy.orm import Session
 from database import SessionLocal, engine
+import migrations
 import models
+import rollup  # подключает обновление rollup-таблицы аналитики при создании записей
 from datetime import datetime, timedelta
 import random
 
-models.Base.metadata.create_all(bind=engine)
+migrations.upgrade(engine)
 
 def seed_database():
     db = SessionLocal()
@@ -0,0 +1,75 @@
+"""Общие фикстуры: приложение на копии salon.db во временном каталоге.
+
+DATABASE_URL читается при импорте database, поэтому копия базы подставляется
+до импорта модулей приложения. Тесты пишут записи в собственные дни далеко в
+будущем (free_day, своя неделя на тест) и не мешают друг другу.
+"""
+from datetime import date, datetime, time, timedelta
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix="salon-tests-")
+shutil.copy(os.path.join(BACKEND_DIR, "salon.db"), os.path.join(WORKDIR, "salon.db"))
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORKDIR, 'salon.db')}"
+# Пересчет зарплаты — при чтении, без фонового потока
+os.environ["PAYROLL_WORKER"] = "0"
+sys.path.insert(0, BACKEND_DIR)
+# Загрузки и результаты задач пишутся по относительным путям
+os.chdir(WORKDIR)
+os.makedirs("uploads", exist_ok=True)
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+import analytics_cache  # noqa: E402
+import cache  # noqa: E402
+import database  # noqa: E402
+import main as api  # noqa: E402
+
+_weeks = itertools.count()
+
+
+@pytest.fixture(scope="session")
+def client():
+    return TestClient(api.app)
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    cache.catalog_cache.clear()
+    analytics_cache.invalidate_all()
+
+
+@pytest.fixture(scope="session")
+def ids():
+    """Id мастера, его салона и клиента из тестовой базы."""
+    with database.engine.connect() as connection:
+        master_id, salon_id = connection.execute(text("SELECT id, salon_id FROM masters ORDER BY id LIMIT 1")).one()
+        client_id = connection.execute(text("SELECT MIN(id) FROM clients")).scalar()
+    return {"master_id": master_id, "salon_id": salon_id, "client_id": client_id}
+
+
+@pytest.fixture
+def free_day():
+    """Первый день недели, в которую у мастеров еще нет записей."""
+    return date(2031, 1, 1) + timedelta(weeks=next(_weeks))
+
+
+@pytest.fixture
+def appointment(ids):
+    """Тело AppointmentCreate на [start, start + hours) в день day."""
+    def build(day, start, hours=1, **fields):
+        start_time = datetime.combine(day, time()) + timedelta(hours=start)
+        return {
+            "master_id": ids["master_id"], "client_id": ids["client_id"], "service": "Стрижка", "price": 1500.0,
+            "start_time": start_time.isoformat(), "end_time": (start_time + timedelta(hours=hours)).isoformat(),
+            "status": "confirmed", **fields,
+        }
+
+    return build
@@ -0,0 +1,51 @@
+def test_overlapping_booking_is_rejected(client, appointment, free_day):
+    assert client.post("/appointments/", json=appointment(free_day, 10)).status_code == 200
+    assert client.post("/appointments/", json=appointment(free_day, 10.5)).status_code == 409
+    # Соседний интервал не пересекается
+    assert client.post("/appointments/", json=appointment(free_day, 11)).status_code == 200
+
+
+def test_other_master_is_not_blocked(client, appointment, free_day):
+    with_other = dict(appointment(free_day, 10))
+    assert client.post("/appointments/", json=with_other).status_code == 200
+    other_master = client.get("/masters/", params={"limit": 2}).json()[1]["id"]
+    with_other["master_id"] = other_master
+    assert client.post("/appointments/", json=with_other).status_code == 200
+
+
+def test_cancelled_appointment_does_not_block(client, appointment, free_day):
+    assert client.post("/appointments/", json=appointment(free_day, 10, status="cancelled")).status_code == 200
+    assert client.post("/appointments/", json=appointment(free_day, 10)).status_code == 200
+
+
+def test_reconfirming_into_a_taken_slot_conflicts(client, appointment, free_day):
+    first = client.post("/appointments/", json=appointment(free_day, 10)).json()
+    cancelled = client.put(f"/appointments/{first['id']}/status", json={"status": "cancelled"})
+    assert cancelled.status_code == 200
+    assert client.post("/appointments/", json=appointment(free_day, 10)).status_code == 200
+    assert client.put(f"/appointments/{first['id']}/status", json={"status": "confirmed"}).status_code == 409
+
+
+def test_long_appointment_is_rejected(client, appointment, free_day):
+    # Запись длиннее MAX_APPOINTMENT_DURATION не видна проверке пересечений
+    assert client.post("/appointments/", json=appointment(free_day, 0, hours=23)).status_code == 400
+    assert client.post("/appointments/", json=appointment(free_day, 0, hours=12)).status_code == 200
+    assert client.post("/appointments/", json=appointment(free_day, 11)).status_code == 409
+
+
+def test_empty_interval_is_rejected(client, appointment, free_day):
+    assert client.post("/appointments/", json=appointment(free_day, 10, hours=0)).status_code == 400
+
+
+def test_bulk_rejects_long_and_overlapping_rows(client, appointment, free_day):
+    assert client.post("/appointments/", json=appointment(free_day, 9)).status_code == 200
+    response = client.post("/appointments/bulk", json=[
+        appointment(free_day, 0, hours=23),
+        appointment(free_day, 12),
+        appointment(free_day, 12.5),
+        appointment(free_day, 9.5),
+    ])
+    assert response.status_code == 200
+    result = response.json()
+    assert result["inserted"] == 1
+    assert [error["index"] for error in result["errors"]] == [0, 2, 3]
@@ -0,0 +1,48 @@
+"""Кэш справочников (ETag, 304) и кэш аналитики сбрасываются записью."""
+from datetime import timedelta
+
+import analytics_cache
+
+
+def test_etag_revalidates_until_the_catalog_changes(client):
+    first = client.get("/salons/")
+    etag = first.headers["ETag"]
+    assert client.get("/salons/", headers={"If-None-Match": etag}).status_code == 304
+
+    created = client.post("/salons/", json={"name": "Новый салон", "address": "ул. Тестовая, 1"})
+    assert created.status_code == 200
+    # Список изменился — старый ETag больше не подходит
+    after = client.get("/salons/", headers={"If-None-Match": etag})
+    assert after.status_code == 200
+    assert after.headers["ETag"] != etag
+
+
+def test_master_update_invalidates_its_card(client, ids):
+    master = client.post("/masters/", json={"name": "До", "salon_id": ids["salon_id"]}).json()
+    etag = client.get(f"/masters/{master['id']}").headers["ETag"]
+    client.put(f"/masters/{master['id']}", json={"name": "После", "salon_id": ids["salon_id"]})
+    response = client.get(f"/masters/{master['id']}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["name"] == "После"
+
+
+def test_analytics_cache_is_dropped_by_a_booking_in_range(client, appointment, free_day):
+    params = {"start_date": free_day.isoformat(), "end_date": (free_day + timedelta(days=1)).isoformat()}
+    before = client.get("/api/analytics/filtered-overview", params=params).json()
+    hits = analytics_cache.results.stats["hits"]
+    assert client.get("/api/analytics/filtered-overview", params=params).json() == before
+    assert analytics_cache.results.stats["hits"] == hits + 1
+
+    assert client.post("/appointments/", json=appointment(free_day, 10, price=1000.0)).status_code == 200
+    after = client.get("/api/analytics/filtered-overview", params=params).json()
+    assert after["total_appointments"] == before["total_appointments"] + 1
+    assert after["total_revenue"] == before["total_revenue"] + 1000.0
+
+
+def test_booking_outside_the_range_keeps_the_entry(client, appointment, free_day):
+    params = {"start_date": free_day.isoformat(), "end_date": (free_day + timedelta(hours=23)).isoformat()}
+    client.get("/api/analytics/filtered-overview", params=params)
+    client.post("/appointments/", json=appointment(free_day + timedelta(days=1), 10))
+    hits = analytics_cache.results.stats["hits"]
+    client.get("/api/analytics/filtered-overview", params=params)
+    assert analytics_cache.results.stats["hits"] == hits + 1
@@ -0,0 +1,36 @@
+"""Rollup выручки и таблица зарплаты совпадают с живым расчетом после изменений."""
+import database
+import payroll
+import rollup
+
+
+def assert_consistent():
+    with database.SessionLocal() as db:
+        payroll.refresh()
+        assert rollup.check_consistency(db) == []
+        assert payroll.check_consistency(db) == []
+
+
+def test_consistent_after_bookings_and_status_changes(client, appointment, free_day):
+    created = client.post("/appointments/", json=appointment(free_day, 10)).json()
+    client.post("/appointments/", json=appointment(free_day, 12, status="cancelled"))
+    client.put(f"/appointments/{created['id']}/status", json={"status": "cancelled"})
+    client.put(f"/appointments/{created['id']}/status", json={"status": "confirmed"})
+    assert_consistent()
+
+
+def test_consistent_after_bulk_insert(client, appointment, free_day):
+    response = client.post("/appointments/bulk", json=[
+        appointment(free_day, hour, status="confirmed" if hour % 2 else "cancelled") for hour in range(9, 15)
+    ])
+    assert response.json()["inserted"] == 6
+    assert_consistent()
+
+
+def test_consistent_after_master_moves_to_another_salon(client, ids, appointment, free_day):
+    master = client.post("/masters/", json={"name": "Переводимый", "salon_id": ids["salon_id"]}).json()
+    client.post("/appointments/", json=appointment(free_day, 10, master_id=master["id"]))
+    other_salon = next(salon["id"] for salon in client.get("/salons/").json() if salon["id"] != ids["salon_id"])
+    moved = client.put(f"/masters/{master['id']}", json={"name": master["name"], "salon_id": other_salon})
+    assert moved.status_code == 200
+    assert_consistent()
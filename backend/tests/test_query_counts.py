@@ -0,0 +1,97 @@
+"""Число SQL-запросов на эндпоинт (защита от N+1).
+
+Каждый эндпоинт вызывается дважды: на копии базы и после того, как у
+клиента 1 и салона 1 появилось много записей и мастеров. Число запросов не
+должно расти вместе с данными и превышать бюджет.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func, insert, select
+
+import analytics_cache
+import cache
+import database
+import models
+import payroll
+import rollup
+
+# Эндпоинт -> максимально допустимое число запросов
+BUDGETS = {
+    "/salons/": 1,
+    "/salons/1": 2,
+    "/masters/": 1,
+    "/masters/1": 1,
+    "/clients/": 1,
+    "/clients/1": 2,
+    "/appointments/?client_id=1": 1,
+    "/appointments/?salon_id=1&limit=100": 1,
+    "/users/2/client": 1,
+    "/masters/1/available-slots?date=2025-12-01": 1,
+    "/salons/1/free-slots?start_date=2025-12-01&end_date=2025-12-07&limit=20": 2,
+    "/api/analytics/overview": 1,
+    "/api/analytics/dashboard": 6,
+    "/api/analytics/filtered-overview?start_date=2025-11-01T10:00:00&end_date=2025-12-01T18:00:00": 3,
+    "/api/analytics/filtered-revenue-by-salon?start_date=2025-11-01&end_date=2025-12-01": 3,
+    "/api/analytics/filtered-revenue-by-service?start_date=2025-11-01&end_date=2025-12-01": 2,
+    "/api/analytics/filtered-master-earnings?start_date=2025-11-01&end_date=2025-12-01": 4,
+    "/api/analytics/timeseries?granularity=week&metric=revenue&group_by=master&start_date=2025-11-01T10:00:00&end_date=2025-12-01T18:00:00": 4,
+    "/api/analytics/timeseries?granularity=hour&metric=count&group_by=salon&start_date=2025-11-15&end_date=2025-11-20": 2,
+}
+
+EXTRA_ROWS = 50
+
+
+def grow(engine):
+    """Добавляет мастеров салону 1 и записи клиенту 1 у каждого из них."""
+    with engine.begin() as connection:
+        first_id = (connection.execute(select(func.max(models.Master.id))).scalar() or 0) + 1
+        connection.execute(insert(models.Master), [
+            {"id": first_id + index, "name": f"Extra {index}", "salon_id": 1}
+            for index in range(EXTRA_ROWS)
+        ])
+        start = datetime(2025, 11, 15, 9)
+        connection.execute(insert(models.Appointment), [
+            {
+                "master_id": first_id + index, "client_id": 1,
+                "start_time": start + timedelta(days=index % 20, hours=index % 10),
+                "end_time": start + timedelta(days=index % 20, hours=index % 10 + 1),
+                "service": "Стрижка", "price": 1500.0, "status": "confirmed",
+            }
+            for index in range(EXTRA_ROWS)
+        ])
+
+
+def test_query_counts_stay_flat_and_within_budget(client):
+    counter = {"statements": 0}
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith("PRAGMA"):
+            counter["statements"] += 1
+
+    def measure():
+        # Считаем запросы самих обработчиков, а не попадания в кэш
+        cache.catalog_cache.clear()
+        analytics_cache.invalidate_all()
+        result = {}
+        for path in BUDGETS:
+            counter["statements"] = 0
+            response = client.get(path)
+            assert response.status_code == 200, path
+            result[path] = counter["statements"]
+        return result
+
+    event.listen(database.engine, "before_cursor_execute", count)
+    try:
+        before = measure()
+        grow(database.engine)
+        with database.SessionLocal() as db:
+            rollup.rebuild(db)
+            payroll.rebuild(db)
+        after = measure()
+    finally:
+        event.remove(database.engine, "before_cursor_execute", count)
+
+    growing = {path: (before[path], after[path]) for path in BUDGETS if after[path] > before[path]}
+    assert not growing, f"растет с данными (N+1): {growing}"
+    over = {path: after[path] for path, budget in BUDGETS.items() if after[path] > budget}
+    assert not over, f"превышен бюджет: {over}"
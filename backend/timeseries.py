@@ -0,0 +1,198 @@
+"""Временные ряды аналитики: гранулярность, метрика и разрез — параметрами.
+
+    GET /api/analytics/timeseries?granularity=week&metric=revenue&group_by=salon
+        &start_date=2025-09-01&end_date=2025-12-01T23:59:59
+
+Бакеты day/week/month собираются из дневного rollup (целые дни) и сырой
+таблицы (неполные крайние дни) — как у остальной аналитики. Бакеты hour —
+один запрос к appointments: период задается диапазоном по start_time, так
+что индекс по времени применим, а функция над колонкой остается только в
+GROUP BY. Пустые бакеты заполняются нулями.
+
+Метрики: count — все записи; revenue — выручка подтвержденных;
+avg_check — выручка / подтвержденные; cancellation_rate — отмененные / все.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import models
+import rollup
+
+GRANULARITIES = ("hour", "day", "week", "month")
+METRICS = ("count", "revenue", "avg_check", "cancellation_rate")
+GROUP_BY = {"salon": "salon_id", "master": "master_id", "service": "service"}
+MAX_BUCKETS = 5000
+
+# Период по умолчанию, если не задано начало
+DEFAULT_SPAN = {
+    "hour": timedelta(days=2),
+    "day": timedelta(days=30),
+    "week": timedelta(weeks=26),
+    "month": timedelta(days=365),
+}
+
+
+def bucket_start(moment, granularity):
+    """Начало бакета, в который попадает moment (datetime или date)."""
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    day = moment.date() if isinstance(moment, datetime) else moment
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _next_bucket(bucket, granularity):
+    if granularity == "hour":
+        return bucket + timedelta(hours=1)
+    if granularity == "week":
+        return bucket + timedelta(weeks=1)
+    if granularity == "month":
+        return (bucket.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return bucket + timedelta(days=1)
+
+
+def buckets(start_dt, end_dt, granularity):
+    """Все бакеты, пересекающие [start_dt, end_dt], по порядку."""
+    bucket = bucket_start(start_dt, granularity)
+    last = bucket_start(end_dt, granularity)
+    result = []
+    while bucket <= last:
+        result.append(bucket)
+        if len(result) > MAX_BUCKETS:
+            raise HTTPException(
+                status_code=400, detail=f"Too many buckets, at most {MAX_BUCKETS}: use a coarser granularity"
+            )
+        bucket = _next_bucket(bucket, granularity)
+    return result
+
+
+def _naive(value):
+    if value is not None and value.tzinfo is not None:
+        return value.replace(tzinfo=None)
+    return value
+
+
+def _as_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def _hourly(db: Session, column, start_dt, end_dt, salon_id=None):
+    """{(час, разрез, статус): [count, revenue]} по сырой таблице."""
+    start_time = models.Appointment.start_time
+    if db.get_bind().dialect.name == "sqlite":
+        hour = func.strftime("%Y-%m-%d %H:00:00", start_time)
+    else:
+        hour = func.date_trunc("hour", start_time)
+    expressions = {
+        "salon_id": models.Master.salon_id,
+        "master_id": models.Appointment.master_id,
+        "service": models.Appointment.service,
+    }
+    group = [hour] + ([expressions[column]] if column else []) + [models.Appointment.status]
+    query = db.query(
+        *group,
+        func.count(models.Appointment.id),
+        func.coalesce(func.sum(models.Appointment.price), 0.0),
+    ).outerjoin(
+        models.Master, models.Appointment.master_id == models.Master.id
+    ).filter(start_time >= start_dt, start_time <= end_dt)
+    if salon_id is not None:
+        query = query.filter(models.Master.salon_id == salon_id)
+
+    result = {}
+    for row in query.group_by(*group).all():
+        result[(_as_datetime(row[0]),) + tuple(row[1:-2])] = [row[-2], row[-1] or 0.0]
+    return result
+
+
+def _labels(db: Session, group_by, keys):
+    if group_by == "salon":
+        return dict(db.query(models.Salon.id, models.Salon.name).filter(models.Salon.id.in_(keys)).all())
+    if group_by == "master":
+        return dict(db.query(models.Master.id, models.Master.name).filter(models.Master.id.in_(keys)).all())
+    return {key: key for key in keys}
+
+
+def _value(metric, stats):
+    total, confirmed, revenue, cancelled = stats
+    if metric == "count":
+        return total
+    if metric == "revenue":
+        return round(revenue, 2)
+    if metric == "avg_check":
+        return round(revenue / confirmed, 2) if confirmed else 0
+    return round(cancelled / total, 4) if total else 0
+
+
+def series(db: Session, granularity, start_dt, end_dt, group_by=None, salon_id=None):
+    """{бакет: {ключ разреза: [всего, подтвержденных, выручка, отмененных]}} за [start_dt, end_dt].
+
+    Без группировки ключ разреза — None. Для day/week/month границы можно не задавать.
+    """
+    column = GROUP_BY[group_by] if group_by else None
+    if granularity == "hour":
+        breakdown = _hourly(db, column, start_dt, end_dt, salon_id)
+    else:
+        group = ("day", column, "status") if column else ("day", "status")
+        breakdown = rollup.aggregate(db, group, start_dt, end_dt, salon_id=salon_id)
+
+    result = defaultdict(lambda: defaultdict(lambda: [0, 0, 0.0, 0]))
+    for key, (count, revenue) in breakdown.items():
+        moment, status = key[0], key[-1]
+        stats = result[bucket_start(moment, granularity)][key[1] if column else None]
+        stats[0] += count
+        if status == "confirmed":
+            stats[1] += count
+            stats[2] += revenue
+        elif status == "cancelled":
+            stats[3] += count
+    return result
+
+
+def timeseries(db: Session, granularity, metric, start_dt=None, end_dt=None, group_by=None, salon_id=None):
+    """Ответ /analytics/timeseries: бакеты и ряды значений, пустые бакеты — нули."""
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of: {', '.join(GRANULARITIES)}")
+    if metric not in METRICS:
+        raise HTTPException(status_code=400, detail=f"metric must be one of: {', '.join(METRICS)}")
+    if group_by is not None and group_by not in GROUP_BY:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of: {', '.join(GROUP_BY)}")
+
+    end_dt = _naive(end_dt) or datetime.now()
+    start_dt = _naive(start_dt) or end_dt - DEFAULT_SPAN[granularity]
+    if start_dt > end_dt:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+    bucket_list = buckets(start_dt, end_dt, granularity)
+
+    data = series(db, granularity, start_dt, end_dt, group_by, salon_id)
+    keys = sorted({key for groups in data.values() for key in groups}, key=lambda key: (key is None, key))
+    if group_by is None:
+        keys = [None]
+    labels = _labels(db, group_by, [key for key in keys if key is not None]) if group_by else {}
+
+    empty = [0, 0, 0.0, 0]
+    return {
+        "granularity": granularity,
+        "metric": metric,
+        "group_by": group_by,
+        "start": start_dt.isoformat(),
+        "end": end_dt.isoformat(),
+        "buckets": [bucket.isoformat() for bucket in bucket_list],
+        "series": [
+            {
+                "key": key,
+                "label": labels.get(key),
+                "values": [_value(metric, data.get(bucket, {}).get(key, empty)) for bucket in bucket_list],
+            }
+            for key in keys
+        ],
+    }
@@ -1,7 +1,31 @@
 const BASE_URL = "http://localhost:8080";
+const PAGE_SIZE = 1000;
+
+// Списки отдаются страницами: идем по курсору X-Next-After-Id до конца
+const fetchAllPages = async (url, errorMessage) => {
+  const rows = [];
+  let afterId = null;
+  do {
+    const pageUrl = new URL(url);
+    pageUrl.searchParams.set("limit", PAGE_SIZE);
+    if (afterId !== null) pageUrl.searchParams.set("after_id", afterId);
+    const res = await fetch(pageUrl);
+    if (!res.ok) throw new Error(errorMessage);
+    rows.push(...(await res.json()));
+    afterId = res.headers.get("X-Next-After-Id");
+  } while (afterId !== null);
+  return rows;
+};
 
 export const fetchSalons = async () => {
-  const res = await fetch(`${BASE_URL}/salons/`);
+  return fetchAllPages(`${BASE_URL}/salons/`, "Ошибка при получении салонов");
+};
+
+export const fetchSalonsInBbox = async ([minLat, minLon, maxLat, maxLon], signal) => {
+  const params = new URLSearchParams({
+    min_lat: minLat, min_lon: minLon, max_lat: maxLat, max_lon: maxLon,
+  });
+  const res = await fetch(`${BASE_URL}/salons/bbox?${params}`, { signal });
   if (!res.ok) throw new Error("Ошибка при получении салонов");
   return res.json();
 };
@@ -16,9 +40,7 @@ export const fetchMasters = async (salonId = null) => {
   const url = salonId 
     ? `${BASE_URL}/masters/?salon_id=${salonId}` 
     : `${BASE_URL}/masters/`;
-  const res = await fetch(url);
-  if (!res.ok) throw new Error("Ошибка при получении мастеров");
-  return res.json();
+  return fetchAllPages(url, "Ошибка при получении мастеров");
 };
 
 export const fetchMasterById = async (id) => {
@@ -41,9 +63,7 @@ export const fetchAppointments = async (clientId = null) => {
   const url = clientId 
     ? `${BASE_URL}/appointments/?client_id=${clientId}` 
     : `${BASE_URL}/appointments/`;
-  const res = await fetch(url);
-  if (!res.ok) throw new Error("Ошибка при получении записей");
-  return res.json();
+  return fetchAllPages(url, "Ошибка при получении записей");
 };
 
 export const createClient = async (clientData) => {
@@ -67,4 +87,11 @@ export const fetchClientByUserId = async (userId) => {
   const res = await fetch(`${BASE_URL}/users/${userId}/client`);
   if (!res.ok) throw new Error("Ошибка при получении клиента");
   return res.json();
-};
\ No newline at end of file
+};
+// Загрузки хранятся как /uploads/<ab>/<sha256>.<ext>, превью — <sha256>_<ширина>.webp
+const HASHED_UPLOAD = /^(.*\/uploads\/[0-9a-f]{2}\/[0-9a-f]{64})\.[a-z0-9]+$/;
+
+export const thumbnailUrl = (url, width) => {
+  const match = url && url.match(HASHED_UPLOAD);
+  return match ? `${match[1]}_${width}.webp` : url;
+};
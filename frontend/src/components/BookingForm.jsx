@@ -115,6 +115,9 @@ const BookingForm = ({ master, onClose, onSuccess }) => {
         alert("Запись успешно создана!");
         onSuccess();
         onClose();
+      } else if (response.status === 409) {
+        alert("Это время уже занято, выберите другой слот");
+        loadAvailableSlots();
       } else {
         alert("Ошибка при создании записи");
       }
@@ -1,9 +1,35 @@
-import React from "react";
+import React, { useEffect, useRef, useState } from "react";
 import { Map, Marker } from "pigeon-maps";
 import { useNavigate } from "react-router-dom";
+import { fetchSalonsInBbox } from "../api/api";
+
+const clamp = (value, limit) => Math.max(-limit, Math.min(limit, value));
+// Долгота за пределами [-180, 180) — та же точка на следующем обороте карты
+const wrapLon = (lon) => ((((lon + 180) % 360) + 360) % 360) - 180;
 
 const SalonMap = ({ salons }) => {
   const navigate = useNavigate();
+  // Салоны в видимой области карты; до первой загрузки показываем переданные
+  const [visibleSalons, setVisibleSalons] = useState(null);
+  // Запрос для предыдущей области отменяется: его ответ не должен затереть текущий
+  const requestRef = useRef(null);
+
+  useEffect(() => () => requestRef.current?.abort(), []);
+
+  const handleBoundsChanged = ({ bounds }) => {
+    const { ne, sw } = bounds;
+    // Область шире оборота карты — все долготы; иначе min_lon > max_lon — через антимеридиан
+    const [minLon, maxLon] = ne[1] - sw[1] >= 360 ? [-180, 180] : [wrapLon(sw[1]), wrapLon(ne[1])];
+
+    requestRef.current?.abort();
+    const controller = new AbortController();
+    requestRef.current = controller;
+    fetchSalonsInBbox([clamp(sw[0], 90), minLon, clamp(ne[0], 90), maxLon], controller.signal)
+      .then(setVisibleSalons)
+      .catch(err => {
+        if (err.name !== "AbortError") console.error(err);
+      });
+  };
   
   return (
     <div style={{ height: "500px", borderRadius: "15px", overflow: "hidden", marginBottom: "40px" }}>
@@ -11,8 +37,9 @@ const SalonMap = ({ salons }) => {
         defaultCenter={[55.751574, 37.573856]} 
         defaultZoom={11}
         height={500}
+        onBoundsChanged={handleBoundsChanged}
       >
-        {salons.map((salon) => (
+        {(visibleSalons || salons).map((salon) => (
           <Marker
             key={salon.id}
             anchor={[salon.lat || 55.751574, salon.lon || 37.573856]}
@@ -95,19 +95,15 @@ const AdminDashboard = () => {
       if (end) params.append('end_date', end);
       const queryString = params.toString();
 
-      const [overviewRes, financialRes, revenueSalonRes, revenueServiceRes, earningsRes] = await Promise.all([
-        fetch(`http://localhost:8080/api/analytics/overview`),
-        fetch(`http://localhost:8080/api/analytics/filtered-overview?${queryString}`),
-        fetch(`http://localhost:8080/api/analytics/filtered-revenue-by-salon?${queryString}`),
-        fetch(`http://localhost:8080/api/analytics/filtered-revenue-by-service?${queryString}`),
-        fetch(`http://localhost:8080/api/analytics/filtered-master-earnings?${queryString}`)
-      ]);
+      const res = await fetch(`http://localhost:8080/api/analytics/dashboard?${queryString}`);
+      if (!res.ok) throw new Error("Ошибка загрузки аналитики");
+      const dashboard = await res.json();
 
-      setOverview(await overviewRes.json());
-      setFinancialOverview(await financialRes.json());
-      setRevenueBySalon(await revenueSalonRes.json());
-      setRevenueByService(await revenueServiceRes.json());
-      setMasterEarnings(await earningsRes.json());
+      setOverview(dashboard.overview);
+      setFinancialOverview(dashboard.financial);
+      setRevenueBySalon(dashboard.revenue_by_salon);
+      setRevenueByService(dashboard.revenue_by_service);
+      setMasterEarnings(dashboard.master_earnings);
     } catch (err) {
       console.error("Ошибка загрузки аналитики:", err);
       alert("Ошибка при загрузке данных аналитики");
@@ -447,6 +443,7 @@ const AdminDashboard = () => {
                   <th style={{padding: '15px', textAlign: 'left', color: '#28a745'}}>Салон</th>
                   <th style={{padding: '15px', textAlign: 'right', color: '#28a745'}}>Ставка/час</th>
                   <th style={{padding: '15px', textAlign: 'right', color: '#28a745'}}>Записей</th>
+                  <th style={{padding: '15px', textAlign: 'right', color: '#28a745'}}>Часов</th>
                   <th style={{padding: '15px', textAlign: 'right', color: '#28a745'}}>Выручка</th>
                   <th style={{padding: '15px', textAlign: 'right', color: '#28a745'}}>Зарплата</th>
                 </tr>
@@ -461,6 +458,7 @@ const AdminDashboard = () => {
                     <td style={{padding: '15px', color: '#666'}}>{master.salon_name}</td>
                     <td style={{padding: '15px', textAlign: 'right'}}>{master.hourly_rate}  </td>
                     <td style={{padding: '15px', textAlign: 'right'}}>{master.appointments_count}</td>
+                    <td style={{padding: '15px', textAlign: 'right'}}>{master.worked_hours}</td>
                     <td style={{padding: '15px', textAlign: 'right', fontWeight: 'bold', color: '#28a745'}}>
                       {master.total_revenue.toLocaleString()}  
                     </td>
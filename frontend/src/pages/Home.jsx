@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from "react";
 import { Link } from "react-router-dom";
-import { fetchSalons } from "../api/api";
+import { fetchSalons, thumbnailUrl } from "../api/api";
 import Header from "../components/Header";
 import Footer from "../components/Footer";
 import SalonMap from "../components/Map";
@@ -167,8 +167,12 @@ const Home = () => {
             {salons.map(salon => (
               <div key={salon.id} className="card">
                 <img 
-                  src={salon.photo_url || "https://med-rzn.ru/wp-content/uploads/2021/09/no_image-800x600-1.jpg"}
+                  src={thumbnailUrl(salon.photo_url, 800) || "https://med-rzn.ru/wp-content/uploads/2021/09/no_image-800x600-1.jpg"}
                   alt={salon.name}
+                  onError={(e) => {
+                    // Превью нет (маленький исходник или сервер без Pillow) — берем оригинал
+                    if (salon.photo_url && e.target.src !== salon.photo_url) e.target.src = salon.photo_url;
+                  }}
                   style={{
                     width: '100%',
                     height: '150px',
@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from "react";
 import { useParams, Link } from "react-router-dom";
-import { fetchSalonById } from "../api/api";
+import { fetchSalonById, thumbnailUrl } from "../api/api";
 import Header from "../components/Header";
 import Footer from "../components/Footer";
 
@@ -108,7 +108,7 @@ const SalonPage = () => {
                   }}>
                     {master.photo_url ? (
                       <img 
-                        src={master.photo_url} 
+                        src={thumbnailUrl(master.photo_url, 320)} 
                         alt={master.name}
                         style={{
                           width: '100%',
@@ -116,6 +116,10 @@ const SalonPage = () => {
                           objectFit: 'cover'
                         }}
                         onError={(e) => {
+                          if (e.target.src !== master.photo_url) {
+                            e.target.src = master.photo_url;
+                            return;
+                          }
                           e.target.style.display = 'none';
                           e.target.parentElement.innerHTML = '<div style="width:100%;height:100%;display:flex;align-items:center;justify-content:center;font-size:3rem;">👤</div>';
                         }}